@@ -5,10 +5,123 @@ except ImportError:
     HAS_GENAI = False
 
 import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
 from dotenv import load_dotenv
+from .cover_solver import format_plan
 
 load_dotenv()
 
+# Model answers are reused while their inputs are unchanged
+AI_CACHE_TTL = int(os.getenv("AI_CACHE_TTL", "3600"))
+AI_CACHE_MAX_ENTRIES = int(os.getenv("AI_CACHE_MAX_ENTRIES", "256"))
+# Optional SQLite file so answers survive restarts (unset = memory only)
+AI_CACHE_PATH = os.getenv("AI_CACHE_PATH")
+
+class ResponseCache:
+    """
+    Content-addressed cache of model responses.
+
+    The key is a hash of the canonicalised prompt inputs, so any change to
+    the absence, day, cover plan or report figures produces a new
+    key. invalidate() also drops everything when schedules or covers are
+    written. Entries expire after ttl seconds and the least recently used
+    are evicted beyond max_entries, both in memory and on disk.
+    """
+
+    def __init__(self, ttl=AI_CACHE_TTL, max_entries=AI_CACHE_MAX_ENTRIES, path=AI_CACHE_PATH):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires_at, text)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._disk = None
+        if path:
+            try:
+                self._disk = sqlite3.connect(path, check_same_thread=False)
+                self._disk.execute(
+                    "CREATE TABLE IF NOT EXISTS ai_responses "
+                    "(key TEXT PRIMARY KEY, text TEXT, expires_at REAL, used_at REAL)"
+                )
+                self._disk.commit()
+            except Exception as e:
+                print(f"AI cache: persistence disabled ({e})")
+                self._disk = None
+
+    @staticmethod
+    def key(kind, *inputs):
+        payload = json.dumps([kind, inputs], sort_keys=True, default=str, separators=(",", ":"))
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None and self._disk is not None:
+                row = self._disk.execute("SELECT expires_at, text FROM ai_responses WHERE key = ?", (key,)).fetchone()
+                if row:
+                    item = (row[0], row[1])
+                    self._entries[key] = item
+            if item is not None and item[0] > now:
+                self._entries.move_to_end(key)
+                if self._disk is not None:
+                    self._disk.execute("UPDATE ai_responses SET used_at = ? WHERE key = ?", (now, key))
+                    self._disk.commit()
+                self.hits += 1
+                return item[1]
+            if item is not None:
+                self._drop(key)
+            self.misses += 1
+            return None
+
+    def put(self, key, text):
+        now = time.time()
+        with self._lock:
+            self._entries[key] = (now + self.ttl, text)
+            self._entries.move_to_end(key)
+            evicted = []
+            while len(self._entries) > self.max_entries:
+                evicted.append(self._entries.popitem(last=False)[0])
+            if self._disk is not None:
+                self._disk.execute(
+                    "INSERT OR REPLACE INTO ai_responses (key, text, expires_at, used_at) VALUES (?, ?, ?, ?)",
+                    (key, text, now + self.ttl, now)
+                )
+                self._disk.execute("DELETE FROM ai_responses WHERE expires_at <= ?", (now,))
+                self._disk.execute(
+                    "DELETE FROM ai_responses WHERE key NOT IN "
+                    "(SELECT key FROM ai_responses ORDER BY used_at DESC LIMIT ?)", (self.max_entries,)
+                )
+                self._disk.commit()
+
+    def _drop(self, key):
+        self._entries.pop(key, None)
+        if self._disk is not None:
+            self._disk.execute("DELETE FROM ai_responses WHERE key = ?", (key,))
+            self._disk.commit()
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+            if self._disk is not None:
+                self._disk.execute("DELETE FROM ai_responses")
+                self._disk.commit()
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+response_cache = ResponseCache()
+
+def _canonical_text(text):
+    return re.sub(r"\s+", " ", str(text)).strip()
+
 # Global config helper
 def configure_genai():
     if not HAS_GENAI:
@@ -24,9 +137,11 @@ def configure_genai():
     return False
 
 class RotaAI:
-    def __init__(self):
+    def __init__(self, cache=None):
         self.model = None
         self._initialized = False
+        # Shared by default: the Firestore app builds a RotaAI per request
+        self.cache = cache if cache is not None else response_cache
 
     def _ensure_model(self):
         """Lazy initialization of the Gemini model."""
@@ -49,38 +164,68 @@ class RotaAI:
         self._initialized = True
         return self.model
 
-    def suggest_cover(self, absent_staff, day, periods, available_staff_profiles):
-        if not HAS_GENAI:
-            return "Error: AI SDK (google-generativeai) is not installed. Please contact administrator to fix deployment size issues."
-        if not os.getenv("GOOGLE_AI_KEY"):
-            return "Error: GOOGLE_AI_KEY not found in environment."
+    def _explain_request(self, absent_staff, day, plan):
+        """(summary, prompt, cache key); prompt is None when the model can't be used."""
+        summary = format_plan(absent_staff, day, plan)
+        if not HAS_GENAI or not os.getenv("GOOGLE_AI_KEY"):
+            return summary, None, None
 
         prompt = f"""
         Internal School Cover System:
-        
-        Teacher Absent: {absent_staff}
-        Day: {day}
-        Periods Required: {periods}
-        
-        Available Staff and their specialty/priority/schedule:
-        {available_staff_profiles}
-        
-        Goal: Pick the best cover for each period.
-        Constraints:
-        1. Claire and dedicated cover staff (is_priority) are first port of call.
-        2. Specialist teachers/Non-form teachers (is_specialist: True, e.g., Billy, Jinny) should be considered next as they don't have their own forms.
-        3. Match specialties (e.g., Music for Music) where possible.
-        4. ANALYSIS OF BUSY TIMES:
-           - 'busy_periods' shows their regular timetable (e.g. "Year 4 Lesson"). These are usually hard to move.
-           - 'calendar_events' shows Outlook/ICS events (e.g. "Meeting with Head").
-           - If no one is 'free', look at these busy activities. If an activity looks like a meeting that could be cancelled or a non-essential task (e.g., "Planning", "Meeting"), you can suggest that person but explicitly mention the meeting title and suggest they cancel/move it.
-           - DO NOT suggest pulling someone from "Class Teaching" or "Year X Lesson" unless absolutely desperate.
-        5. CRITICAL: Staff with 'can_cover_periods': False (e.g. TAs) CANNOT cover teaching periods (1-8). They can ONLY cover Duties (Morning, Lunch, Break, After School). Do not suggest them for classes.
-        6. Explain WHY you chose them, mentioning any meetings they might have to move.
-        
-        Output format: Concise text explaining the selection per period.
+
+        The following cover plan for {absent_staff} on {day} was chosen by the rota rules
+        (priority staff first, specialists next, no TAs for periods 1-8, meetings penalised):
+
+        {summary}
+
+        Goal: Explain this plan to the cover coordinator in a few concise lines per period.
+        Do not change the assignments. Mention any meetings that would need to be moved.
         """
-        
+        return summary, prompt, ResponseCache.key("explain_cover", summary)
+
+    def explain_cover(self, absent_staff, day, plan):
+        """
+        Explains a plan produced by backend.cover_solver. The assignment itself
+        is already decided; if the model is unavailable the plan's own text
+        summary is returned instead.
+        """
+        summary, prompt, key = self._explain_request(absent_staff, day, plan)
+        if prompt is None:
+            return summary
+        text = self._generate(prompt, "AI content", key)
+        if text.startswith("Error:"):
+            return summary
+        return text
+
+    async def stream_explain_cover(self, absent_staff, day, plan):
+        """explain_cover as an async stream of text chunks."""
+        summary, prompt, key = self._explain_request(absent_staff, day, plan)
+        if prompt is None:
+            yield summary
+            return
+        first = True
+        async for chunk in self._stream(prompt, "AI content", key):
+            if first and chunk.startswith("Error:"):
+                yield summary
+                return
+            first = False
+            yield chunk
+
+    async def explain_cover_async(self, absent_staff, day, plan):
+        return "".join([chunk async for chunk in self.stream_explain_cover(absent_staff, day, plan)])
+
+    def _generate(self, prompt, label, cache_key=None):
+        if cache_key is not None:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+        text = self._generate_uncached(prompt, label)
+        if cache_key is not None and not text.startswith("Error:"):
+            self.cache.put(cache_key, text)
+        return text
+
+    def _generate_uncached(self, prompt, label):
         model = self._ensure_model()
         if not model:
             return "Error: AI model failed to initialize."
@@ -100,46 +245,110 @@ class RotaAI:
                     return response.text + "\n\n(Note: Generated using fallback model)"
                 except Exception as fallback_e:
                     return f"Error: Both primary and fallback models failed. {str(fallback_e)}"
-            return f"Error: Failed to generate AI content. {error_str}"
+            return f"Error: Failed to generate {label}. {error_str}"
 
-    def generate_report(self, query, data_context):
+    async def _stream(self, prompt, label, cache_key=None):
+        """
+        Async counterpart of _generate: yields the response as it arrives,
+        without holding a worker thread. A cached answer comes back as one
+        chunk, and a complete answer is cached at the end of the stream.
+        """
+        if cache_key is not None:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                yield cached
+                return
+
+        model = self._ensure_model()
+        if not model:
+            yield "Error: AI model failed to initialize."
+            return
+
+        parts = []
+        try:
+            async for chunk in _stream_model(model, prompt):
+                parts.append(chunk)
+                yield chunk
+        except Exception as e:
+            error_str = str(e)
+            print(f"AI Generation Error: {error_str}")
+            if parts:
+                yield f"\n\nError: Response interrupted. {error_str}"
+                return
+            if "404" not in error_str and "not found" not in error_str.lower():
+                yield f"Error: Failed to generate {label}. {error_str}"
+                return
+            print("Attempting fallback to gemini-pro-latest...")
+            try:
+                async for chunk in _stream_model(genai.GenerativeModel('gemini-pro-latest'), prompt):
+                    parts.append(chunk)
+                    yield chunk
+            except Exception as fallback_e:
+                if parts:
+                    yield f"\n\nError: Response interrupted. {str(fallback_e)}"
+                else:
+                    yield f"Error: Both primary and fallback models failed. {str(fallback_e)}"
+                return
+            note = "\n\n(Note: Generated using fallback model)"
+            parts.append(note)
+            yield note
+
+        if cache_key is not None and parts:
+            self.cache.put(cache_key, "".join(parts))
+
+    def _report_request(self, query, data_context):
+        """(error, prompt, cache key); error is set when the model can't be used."""
         if not HAS_GENAI:
-            return "Error: AI SDK (google-generativeai) is not installed."
+            return "Error: AI SDK (google-generativeai) is not installed.", None, None
         if not os.getenv("GOOGLE_AI_KEY"):
-            return "Error: GOOGLE_AI_KEY not found in environment."
+            return "Error: GOOGLE_AI_KEY not found in environment.", None, None
 
         prompt = f"""
         Internal School Rota AI Report Generator:
         
-        You are an assistant for a school cover system. You have access to the following historical data:
+        You are an assistant for a school cover system. You have access to the following pre-computed figures
+        (exact counts from the database, for the date window shown):
         
         {data_context}
         
         User Query: {query}
         
         Goal: Provide a concise and accurate report based on the data provided. 
-        If a user asks for counts (e.g., "how many times..."), be specific.
+        If a user asks for counts (e.g., "how many times..."), quote the figures above rather than estimating.
         If the data doesn't contain information to answer the query, say so politely.
         
         Output format: Concise, professional text or a small table if appropriate.
         """
-        
-        model = self._ensure_model()
-        if not model:
-            return "Error: AI model failed to initialize."
+        key = ResponseCache.key("generate_report", _canonical_text(query).lower(), data_context)
+        return None, prompt, key
 
+    def generate_report(self, query, data_context):
+        error, prompt, key = self._report_request(query, data_context)
+        if error:
+            return error
+        return self._generate(prompt, "report", key)
+
+    async def stream_report(self, query, data_context):
+        """generate_report as an async stream of text chunks."""
+        error, prompt, key = self._report_request(query, data_context)
+        if error:
+            yield error
+            return
+        async for chunk in self._stream(prompt, "report", key):
+            yield chunk
+
+    async def generate_report_async(self, query, data_context):
+        return "".join([chunk async for chunk in self.stream_report(query, data_context)])
+
+
+async def _stream_model(model, prompt):
+    """Text chunks from the SDK's async streaming call."""
+    response = await model.generate_content_async(prompt, stream=True)
+    async for chunk in response:
         try:
-            response = model.generate_content(prompt)
-            return response.text
-        except Exception as e:
-            error_str = str(e)
-            print(f"AI Report Generation Error: {error_str}")
-            if "404" in error_str or "not found" in error_str.lower():
-                print("Attempting fallback to gemini-pro-latest...")
-                try:
-                    fallback_model = genai.GenerativeModel('gemini-pro-latest')
-                    response = fallback_model.generate_content(prompt)
-                    return response.text + "\n\n(Note: Generated using fallback model)"
-                except Exception as fallback_e:
-                    return f"Error: Both primary and fallback models failed. {str(fallback_e)}"
-            return f"Error: Failed to generate report. {error_str}"
+            text = chunk.text
+        except ValueError:
+            # Chunk without text (e.g. only safety metadata)
+            continue
+        if text:
+            yield text
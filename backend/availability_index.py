@@ -0,0 +1,188 @@
+import threading
+import time
+from sqlalchemy import event
+
+from .database import Staff, Schedule, Setting
+
+# Setting row bumped whenever a timetable changes, so every API process
+# notices imports that ran elsewhere (e.g. normalize.py as a script).
+SCHEDULE_VERSION_KEY = "schedule_version"
+
+# Activities that mean "nothing is happening" rather than "class doing X"
+IDLE_ACTIVITIES = ('free', 'none', 'available', '')
+
+
+def iter_slots(bits):
+    """Yields the set bit positions of an int bitset in ascending order."""
+    while bits:
+        low = bits & -bits
+        yield low.bit_length() - 1
+        bits ^= low
+
+
+def bump_schedule_version(db):
+    """
+    Marks the timetable (or the staff list) as changed. Caller is responsible
+    for committing; the local index is dropped again once the commit lands,
+    so a rebuild that raced the write cannot outlive it.
+    """
+    setting = db.query(Setting).filter(Setting.key == SCHEDULE_VERSION_KEY).first()
+    value = repr(time.time())
+    if setting:
+        setting.value = value
+    else:
+        db.add(Setting(key=SCHEDULE_VERSION_KEY, value=value))
+    availability_index.invalidate()
+    event.listen(db, "after_commit", lambda session: availability_index.invalidate(), once=True)
+
+
+class IndexSnapshot:
+    """
+    One immutable build of the bitset index over the weekly timetable.
+
+    Every staff member gets a slot (bit position). For each (day, period) we
+    keep two ints used as bitsets over those slots:
+      - free:  the timetable marks the period as free
+      - freed: free only because the class is with a specialist ("6RG Music")
+    A lookup for a set of periods is then a handful of ANDs over these ints.
+    Nothing here changes after construction, so readers need no lock.
+    """
+
+    def __init__(self, staff, cells, free, freed, active_mask, cover_mask, specialist_mask, version):
+        self.staff = staff                  # slot -> staff dict (tuple)
+        self.cells = cells                  # (day, period) -> {slot: (activity, is_free)}
+        self.free = free                    # (day, period) -> bitset
+        self.freed = freed
+        self.active_mask = active_mask
+        self.cover_mask = cover_mask
+        self.specialist_mask = specialist_mask
+        self.version = version
+
+    @classmethod
+    def build(cls, db, version):
+        slot_of = {}
+        staff = []
+        active_mask = cover_mask = specialist_mask = 0
+        staff_rows = db.query(
+            Staff.id, Staff.name, Staff.profile, Staff.is_priority, Staff.is_specialist,
+            Staff.is_active, Staff.can_cover_periods, Staff.calendar_url
+        ).order_by(Staff.id).all()
+
+        for slot, s in enumerate(staff_rows):
+            slot_of[s.id] = slot
+            staff.append({
+                "id": s.id,
+                "name": s.name,
+                "profile": s.profile,
+                "is_priority": s.is_priority,
+                "is_specialist": s.is_specialist,
+                "calendar_url": s.calendar_url,
+            })
+            bit = 1 << slot
+            if s.is_active:
+                active_mask |= bit
+            if s.can_cover_periods:
+                cover_mask |= bit
+            if s.is_specialist:
+                specialist_mask |= bit
+
+        schedule_rows = db.query(
+            Schedule.staff_id, Schedule.day_of_week, Schedule.period, Schedule.activity, Schedule.is_free
+        ).order_by(Schedule.id).all()
+
+        # Later rows win for duplicate (staff, day, period), as in the ORM walk
+        cells = {}
+        for row in schedule_rows:
+            slot = slot_of.get(row.staff_id)
+            if slot is None or not row.day_of_week:
+                continue
+            key = (row.day_of_week.lower(), row.period)
+            cells.setdefault(key, {})[slot] = (row.activity, bool(row.is_free))
+
+        free_map, freed_map = {}, {}
+        for key, entries in cells.items():
+            free = freed = 0
+            for slot, (activity, is_free) in entries.items():
+                bit = 1 << slot
+                if is_free:
+                    free |= bit
+                    if activity and activity.lower() not in IDLE_ACTIVITIES:
+                        freed |= bit
+            free_map[key] = free
+            freed_map[key] = freed
+
+        print(f"AvailabilityIndex: built for {len(staff)} staff, {len(schedule_rows)} schedule rows")
+        return cls(tuple(staff), cells, free_map, freed_map,
+                   active_mask, cover_mask, specialist_mask, version)
+
+    def entry(self, day, period, slot):
+        """Returns (activity, is_free) for a slot, or None if no timetable row exists."""
+        return self.cells.get((day.lower(), period), {}).get(slot)
+
+    def candidates(self, day, period_list, teaching=False):
+        """
+        Returns (free_bits, busy_specialist_bits) for the requested periods.
+        free_bits are eligible staff whose timetable is free in every period.
+        """
+        day = day.lower()
+        eligible = self.active_mask
+        if teaching:
+            eligible &= self.cover_mask
+
+        free_bits = eligible
+        for p in period_list:
+            free_bits &= self.free.get((day, p), 0)
+        busy_specialists = eligible & self.specialist_mask & ~free_bits
+        return free_bits, busy_specialists
+
+    def freed_bits(self, day, period_list):
+        """Staff free in any of the periods only because their class has a specialist."""
+        day = day.lower()
+        bits = 0
+        for p in period_list:
+            bits |= self.freed.get((day, p), 0)
+        return bits
+
+
+class AvailabilityIndex:
+    """
+    Holds the current IndexSnapshot. A rebuild makes a whole new snapshot
+    under the lock and publishes it with one reference assignment, so a
+    request that already has a snapshot never sees a half-built one.
+    """
+
+    # Seconds between checks of the schedule_version setting
+    VERSION_CHECK_INTERVAL = 5.0
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._last_check = 0.0
+
+    def invalidate(self):
+        self._snapshot = None
+
+    def _stored_version(self, db):
+        setting = db.query(Setting.value).filter(Setting.key == SCHEDULE_VERSION_KEY).first()
+        return setting[0] if setting else None
+
+    def ensure_fresh(self, db):
+        """
+        Returns the current snapshot, building it on first use or when another
+        process bumped the version. Callers read only the returned snapshot.
+        """
+        snapshot = self._snapshot
+        now = time.monotonic()
+        if snapshot is not None and now - self._last_check < self.VERSION_CHECK_INTERVAL:
+            return snapshot
+        with self._lock:
+            snapshot = self._snapshot
+            version = self._stored_version(db)
+            if snapshot is None or version != snapshot.version:
+                snapshot = IndexSnapshot.build(db, version)
+                self._snapshot = snapshot
+            self._last_check = now
+        return snapshot
+
+
+availability_index = AvailabilityIndex()
@@ -1,7 +1,11 @@
 import requests
 from icalendar import Calendar
 import recurring_ical_events
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
 from datetime import datetime, time, timedelta
+import threading
+import time as _time
 import os
 
 # Period timings as derived from Claire's calendar
@@ -16,7 +20,82 @@ PERIOD_TIMINGS = {
     8: (time(14, 30), time(15, 10)),
 }
 
+# How long a fetched calendar is trusted before we revalidate it (seconds)
+CALENDAR_CACHE_TTL = int(os.getenv("CALENDAR_CACHE_TTL", "900"))
+CALENDAR_CACHE_SIZE = int(os.getenv("CALENDAR_CACHE_SIZE", "128"))
+# Expanded dates kept per calendar
+CALENDAR_CACHE_DATES = 60
+
+# Batch fetching: worker count and overall deadline for one batch (seconds)
+CALENDAR_FETCH_WORKERS = int(os.getenv("CALENDAR_FETCH_WORKERS", "8"))
+CALENDAR_FETCH_DEADLINE = float(os.getenv("CALENDAR_FETCH_DEADLINE", "8"))
+
+# Shared pooled HTTP session
+_session = requests.Session()
+_session.mount("https://", requests.adapters.HTTPAdapter(pool_maxsize=CALENDAR_FETCH_WORKERS))
+_session.mount("http://", requests.adapters.HTTPAdapter(pool_maxsize=CALENDAR_FETCH_WORKERS))
+
+# Fetches still running, by (URL, date). Each batch gets its own worker pool; fetches
+# that miss a batch deadline keep running there and still land in the cache,
+# and a later batch waits on the same future instead of queueing behind them.
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+
+class CalendarCache:
+    """
+    LRU cache of parsed calendars keyed by URL (or local path).
+
+    Each entry keeps the parsed Calendar, the HTTP validators (ETag /
+    Last-Modified, or mtime for local files) and a per-date map of expanded
+    busy periods. Within the TTL nothing is fetched or parsed; after it we
+    send a conditional request and only re-parse if the calendar changed.
+    """
+
+    def __init__(self, max_entries=CALENDAR_CACHE_SIZE, ttl=CALENDAR_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_busy(self, entry, target_date):
+        with self._lock:
+            busy = entry["busy"].get(target_date)
+            if busy is not None:
+                entry["busy"].move_to_end(target_date)
+            return busy
+
+    def put_busy(self, entry, target_date, busy):
+        with self._lock:
+            entry["busy"][target_date] = busy
+            while len(entry["busy"]) > CALENDAR_CACHE_DATES:
+                entry["busy"].popitem(last=False)
+
+    def is_fresh(self, entry):
+        return _time.monotonic() - entry["checked_at"] < self.ttl
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
 class CalendarService:
+    cache = CalendarCache()
+
     @staticmethod
     def get_calendar_data(url_or_path):
         """Fetches ICS data from a URL or local path."""
@@ -37,59 +116,214 @@ class CalendarService:
                 return None
         return None
 
+    @staticmethod
+    def _fetch(url_or_path, entry):
+        """
+        Conditionally fetches a calendar. Returns (status, data, validators) where
+        status is 'changed', 'not_modified' or 'error'.
+        """
+        if url_or_path.startswith(('http://', 'https://')):
+            headers = {}
+            if entry:
+                if entry.get("etag"):
+                    headers["If-None-Match"] = entry["etag"]
+                if entry.get("last_modified"):
+                    headers["If-Modified-Since"] = entry["last_modified"]
+            try:
+                response = _session.get(url_or_path, headers=headers, timeout=10)
+                if response.status_code == 304 and entry:
+                    return "not_modified", None, {}
+                response.raise_for_status()
+                return "changed", response.content, {
+                    "etag": response.headers.get("ETag"),
+                    "last_modified": response.headers.get("Last-Modified"),
+                }
+            except Exception as e:
+                print(f"Error fetching calendar from URL: {e}")
+                return "error", None, {}
+        elif os.path.exists(url_or_path):
+            try:
+                mtime = os.path.getmtime(url_or_path)
+                if entry and entry.get("mtime") == mtime:
+                    return "not_modified", None, {}
+                with open(url_or_path, 'rb') as f:
+                    return "changed", f.read(), {"mtime": mtime}
+            except Exception as e:
+                print(f"Error reading local calendar file: {e}")
+                return "error", None, {}
+        return "error", None, {}
+
+    @staticmethod
+    def _load(calendar_url):
+        """Returns a cache entry for the calendar, fetching/parsing only when needed."""
+        cache = CalendarService.cache
+        entry = cache.get(calendar_url)
+        if entry is not None and cache.is_fresh(entry):
+            return entry
+
+        status, data, validators = CalendarService._fetch(calendar_url, entry)
+        if status == "not_modified" or (status == "error" and entry is not None):
+            # Unchanged, or temporarily unreachable: keep serving what we have
+            entry["checked_at"] = _time.monotonic()
+            return entry
+        if status == "error":
+            return None
+
+        try:
+            cal = Calendar.from_ical(data)
+        except Exception as e:
+            print(f"Error processing calendar: {e}")
+            return entry
+
+        entry = {
+            "calendar": cal,
+            "busy": OrderedDict(),
+            "checked_at": _time.monotonic(),
+            **validators,
+        }
+        cache.put(calendar_url, entry)
+        return entry
+
+    @staticmethod
+    def _expand_busy_periods(cal, target_date):
+        """Expands the calendar for one date into {period_num: summary}."""
+        # Handle recurring events for the specific day
+        events = recurring_ical_events.of(cal).at(target_date)
+
+        busy_map = {}
+
+        for event in events:
+            # X-MICROSOFT-CDO-BUSYSTATUS can be BUSY, TENTATIVE, FREE, OOF
+            busy_status = str(event.get('X-MICROSOFT-CDO-BUSYSTATUS', 'BUSY')).upper()
+            if busy_status == 'FREE':
+                continue
+
+            summary = str(event.get('SUMMARY', 'Busy'))
+            start = event.get('dtstart').dt
+            end = event.get('dtend').dt
+
+            # If it's a date object (all day event), treat as busy for all periods
+            if not isinstance(start, datetime):
+                for p in PERIOD_TIMINGS.keys():
+                    if p not in busy_map:
+                        busy_map[p] = []
+                    busy_map[p].append(summary)
+                continue
+
+            # Ensure we are working with the time part
+            event_start_time = start.time()
+            event_end_time = end.time()
+
+            for period, (p_start, p_end) in PERIOD_TIMINGS.items():
+                # Check for overlap: event starts before period ends AND event ends after period starts
+                if event_start_time < p_end and event_end_time > p_start:
+                    if period not in busy_map:
+                        busy_map[period] = []
+                    busy_map[period].append(summary)
+
+        # Combine multiple summaries for the same period
+        return {p: " & ".join(summaries) for p, summaries in busy_map.items()}
+
+    @staticmethod
+    def _busy_periods(calendar_url, target_date):
+        """Like get_busy_periods, but raises instead of returning {} on failure."""
+        entry = CalendarService._load(calendar_url)
+        if not entry:
+            raise LookupError(f"Calendar unavailable: {calendar_url}")
+
+        cached = CalendarService.cache.get_busy(entry, target_date)
+        if cached is not None:
+            return dict(cached)
+
+        result = CalendarService._expand_busy_periods(entry["calendar"], target_date)
+        CalendarService.cache.put_busy(entry, target_date, result)
+        return dict(result)
+
     @staticmethod
     def get_busy_periods(calendar_url, target_date):
         """
         Parses the calendar and returns a dictionary {period_num: summary}
         where the staff member is busy on the target_date.
+        Results are served from CalendarService.cache when possible.
         """
-        data = CalendarService.get_calendar_data(calendar_url)
-        if not data:
-            return {}
-
         try:
-            cal = Calendar.from_ical(data)
-            # Handle recurring events for the specific day
-            events = recurring_ical_events.of(cal).at(target_date)
-            
-            busy_map = {}
-            
-            for event in events:
-                # X-MICROSOFT-CDO-BUSYSTATUS can be BUSY, TENTATIVE, FREE, OOF
-                busy_status = str(event.get('X-MICROSOFT-CDO-BUSYSTATUS', 'BUSY')).upper()
-                if busy_status == 'FREE':
-                    continue
-
-                summary = str(event.get('SUMMARY', 'Busy'))
-                start = event.get('dtstart').dt
-                end = event.get('dtend').dt
-
-                # If it's a date object (all day event), treat as busy for all periods
-                if not isinstance(start, datetime):
-                    for p in PERIOD_TIMINGS.keys():
-                        if p not in busy_map:
-                            busy_map[p] = []
-                        busy_map[p].append(summary)
-                    continue
-
-                # Ensure we are working with the time part
-                event_start_time = start.time()
-                event_end_time = end.time()
-
-                for period, (p_start, p_end) in PERIOD_TIMINGS.items():
-                    # Check for overlap: event starts before period ends AND event ends after period starts
-                    if event_start_time < p_end and event_end_time > p_start:
-                        if period not in busy_map:
-                            busy_map[period] = []
-                        busy_map[period].append(summary)
-            
-            # Combine multiple summaries for the same period
-            result = {p: " & ".join(summaries) for p, summaries in busy_map.items()}
-            return result
+            return CalendarService._busy_periods(calendar_url, target_date)
+        except LookupError:
+            return {}
         except Exception as e:
             print(f"Error processing calendar: {e}")
             return {}
 
+    @staticmethod
+    def _cached_busy_periods(calendar_url, target_date):
+        """Busy periods from a fresh cache entry, or None if the calendar needs fetching."""
+        entry = CalendarService.cache.get(calendar_url)
+        if entry is None or not CalendarService.cache.is_fresh(entry):
+            return None
+        return CalendarService._busy_periods(calendar_url, target_date)
+
+    @staticmethod
+    def _submit(pool, calendar_url, target_date):
+        """Future for a calendar fetch, joining one already in flight for the same URL and date."""
+        key = (calendar_url, target_date)
+        with _inflight_lock:
+            future = _inflight.get(key)
+            if future is None:
+                future = pool.submit(CalendarService._busy_periods, calendar_url, target_date)
+                _inflight[key] = future
+                future.add_done_callback(lambda f: CalendarService._finished(key, f))
+            return future
+
+    @staticmethod
+    def _finished(key, future):
+        with _inflight_lock:
+            if _inflight.get(key) is future:
+                del _inflight[key]
+
+    @staticmethod
+    def get_busy_periods_many(calendar_urls, target_date, deadline=CALENDAR_FETCH_DEADLINE):
+        """
+        Batch version of get_busy_periods. Calendars with a fresh cache entry
+        are answered inline; only misses and stale entries are fetched, on a
+        worker pool for this batch, so a cold batch takes about as long as the
+        slowest calendar, capped at `deadline` seconds.
+        Returns ({url: {period_num: summary}}, [{"url": url, "error": msg}, ...]).
+        """
+        results = {}
+        failures = []
+        misses = []
+        for url in dict.fromkeys(u for u in calendar_urls if u):
+            try:
+                busy = CalendarService._cached_busy_periods(url, target_date)
+            except Exception as e:
+                failures.append({"url": url, "error": str(e)})
+                continue
+            if busy is None:
+                misses.append(url)
+            else:
+                results[url] = busy
+
+        if misses:
+            pool = ThreadPoolExecutor(max_workers=min(CALENDAR_FETCH_WORKERS, len(misses)),
+                                      thread_name_prefix="calendar")
+            futures = {CalendarService._submit(pool, url, target_date): url for url in misses}
+            # Stragglers finish on this pool's threads; nothing else waits for them
+            pool.shutdown(wait=False)
+
+            done, pending = wait(futures, timeout=deadline)
+            for future in done:
+                url = futures[future]
+                try:
+                    results[url] = future.result()
+                except Exception as e:
+                    failures.append({"url": url, "error": str(e)})
+            for future in pending:
+                failures.append({"url": futures[future], "error": f"Timed out after {deadline}s"})
+
+        if failures:
+            print(f"Calendar batch: {len(results)} ok, {len(failures)} failed")
+        return results, failures
+
 if __name__ == "__main__":
     # Test with local file
     service = CalendarService()
@@ -0,0 +1,253 @@
+"""
+Deterministic cover assignment.
+
+Applies the rules from ROTA_RULES.md and the cover prompt mechanically:
+priority staff first, specialists next, no TAs for teaching periods 1-8,
+calendar meetings and movable busy periods penalised, and load spread
+across the day. Nobody is pulled from their own class unless the caller
+passes allow_teaching=True; otherwise such slots stay unassigned and the
+teachers who could be pulled are listed in the plan's notes. Assignment is solved exactly as a min-cost flow:
+
+    source -> slot -> (staff, period) -> staff -> sink
+
+Each (staff, period) node has capacity 1 so nobody covers two things at
+once, and each staff -> sink unit costs LOAD_STEP more than the previous
+one, which makes the load penalty convex and keeps the solution optimal.
+"""
+
+from collections import deque
+
+TEACHING_PERIODS = range(1, 9)
+
+# Score weights (points, higher is better)
+WEIGHTS = {
+    "free": 100,            # timetable free, no calendar clash
+    "calendar_meeting": 40, # timetable free but a calendar event could be moved
+    "busy_meeting": 20,     # timetabled meeting/planning that could be moved
+    "busy_teaching": 1,     # pulled from their own class: only with allow_teaching
+    "priority": 40,
+    "specialist": 20,
+    "specialty_match": 10,
+}
+LOAD_STEP = 15  # penalty for each extra period the same person covers
+# Fairness across the week (cover_stats): a small, capped tie-breaker
+WEEK_LOAD_STEP = 3
+WEEK_LOAD_CAP = 15
+
+MOVABLE_ACTIVITIES = ("meeting", "planning", "ppa", "admin", "marking", "training", "cpd")
+
+
+def _is_movable(activity):
+    a = (activity or "").lower()
+    return any(k in a for k in MOVABLE_ACTIVITIES)
+
+
+def score_candidate(profile, period, activity=None):
+    """
+    Scores one staff member for one period. Returns (score, breakdown, notes),
+    or None if they cannot take it.
+    """
+    if period in TEACHING_PERIODS and not profile.get("can_cover_periods", True):
+        return None
+
+    free_periods = set(profile.get("free_periods") or [])
+    busy_periods = {int(p): a for p, a in (profile.get("busy_periods") or {}).items()}
+    calendar_events = {int(p): a for p, a in (profile.get("calendar_events") or {}).items()}
+
+    breakdown = {}
+    notes = []
+    if period in free_periods:
+        breakdown["free"] = WEIGHTS["free"]
+    elif period in calendar_events and period not in busy_periods:
+        breakdown["calendar_meeting"] = WEIGHTS["calendar_meeting"]
+        notes.append(f"would need to move '{calendar_events[period]}'")
+    elif period in busy_periods:
+        busy = busy_periods[period]
+        if _is_movable(busy):
+            breakdown["busy_meeting"] = WEIGHTS["busy_meeting"]
+            notes.append(f"would need to move '{busy}'")
+        else:
+            breakdown["busy_teaching"] = WEIGHTS["busy_teaching"]
+            notes.append(f"desperate: pulled from '{busy}'")
+    else:
+        # No timetable entry for this period: treat as unavailable
+        return None
+
+    if profile.get("is_priority"):
+        breakdown["priority"] = WEIGHTS["priority"]
+    if profile.get("is_specialist"):
+        breakdown["specialist"] = WEIGHTS["specialist"]
+    if activity and profile.get("profile"):
+        words = {w for w in activity.lower().replace("/", " ").split() if len(w) > 2}
+        if words & set(profile["profile"].lower().split()):
+            breakdown["specialty_match"] = WEIGHTS["specialty_match"]
+    week_load = profile.get("week_cover_periods") or 0
+    if week_load:
+        breakdown["week_load"] = -min(WEEK_LOAD_STEP * week_load, WEEK_LOAD_CAP)
+
+    return sum(breakdown.values()), breakdown, notes
+
+
+class _MinCostFlow:
+    """Successive shortest paths (SPFA) on a small integer-cost graph."""
+
+    def __init__(self, n):
+        self.n = n
+        self.graph = [[] for _ in range(n)]
+
+    def add_edge(self, u, v, cap, cost):
+        self.graph[u].append([v, cap, cost, len(self.graph[v])])
+        self.graph[v].append([u, 0, -cost, len(self.graph[u]) - 1])
+
+    def run(self, s, t):
+        while True:
+            dist = [None] * self.n
+            in_queue = [False] * self.n
+            prev = [None] * self.n
+            dist[s] = 0
+            queue = deque([s])
+            while queue:
+                u = queue.popleft()
+                in_queue[u] = False
+                for i, (v, cap, cost, _) in enumerate(self.graph[u]):
+                    if cap > 0 and (dist[v] is None or dist[u] + cost < dist[v]):
+                        dist[v] = dist[u] + cost
+                        prev[v] = (u, i)
+                        if not in_queue[v]:
+                            in_queue[v] = True
+                            queue.append(v)
+            if dist[t] is None:
+                return
+            v = t
+            while v != s:
+                u, i = prev[v]
+                edge = self.graph[u][i]
+                edge[1] -= 1
+                self.graph[v][edge[3]][1] += 1
+                v = u
+
+
+def solve_slots(slots, profiles, existing_load=None, allow_teaching=False):
+    """
+    Assigns staff to cover slots.
+
+    slots: list of dicts with "key", "period" and optional "activity".
+    profiles: staff profile dicts (see suggest_cover in backend/main.py).
+    existing_load: {name: periods already covered today}, for fairness.
+    allow_teaching: let the solver pull people from their own classes.
+
+    Returns {"assignments": {key: {...}}, "unassigned": [key, ...],
+    "notes": {key: [...]}, "total_score": int}. notes lists, for unassigned
+    slots, the teachers who could only take them by leaving their class.
+    """
+    existing_load = existing_load or {}
+    candidates = {}  # slot index -> [(staff index, score, breakdown, notes)]
+    teaching = {}    # slot index -> ["Name ('Year 4 Lesson')", ...] left out of candidates
+    for si, slot in enumerate(slots):
+        options = []
+        for pi, profile in enumerate(profiles):
+            scored = score_candidate(profile, slot["period"], slot.get("activity"))
+            if not scored:
+                continue
+            if "busy_teaching" in scored[1] and not allow_teaching:
+                activity = {int(p): a for p, a in (profile.get("busy_periods") or {}).items()}[slot["period"]]
+                teaching.setdefault(si, []).append(f"{profile['name']} ('{activity}')")
+                continue
+            options.append((pi, *scored))
+        candidates[si] = options
+
+    # Offset so every slot edge costs > 0: the flow first covers as many
+    # slots as possible, then maximises the total score among those plans
+    base = sum(WEIGHTS.values()) + 1
+
+    node_count = 2
+    slot_node = {}
+    for si in range(len(slots)):
+        slot_node[si] = node_count
+        node_count += 1
+    staff_period_node = {}
+    staff_node = {}
+    for si, options in candidates.items():
+        period = slots[si]["period"]
+        for pi, *_ in options:
+            if (pi, period) not in staff_period_node:
+                staff_period_node[(pi, period)] = node_count
+                node_count += 1
+            if pi not in staff_node:
+                staff_node[pi] = node_count
+                node_count += 1
+
+    source, sink = 0, 1
+    flow = _MinCostFlow(node_count)
+    for si, options in candidates.items():
+        flow.add_edge(source, slot_node[si], 1, 0)
+        for pi, score, _, _ in options:
+            flow.add_edge(slot_node[si], staff_period_node[(pi, slots[si]["period"])], 1, base - score)
+    units = {}
+    for (pi, _), node in staff_period_node.items():
+        flow.add_edge(node, staff_node[pi], 1, 0)
+        units[pi] = units.get(pi, 0) + 1
+    for pi, node in staff_node.items():
+        already = existing_load.get(profiles[pi]["name"], 0)
+        for k in range(units[pi]):
+            flow.add_edge(node, sink, 1, LOAD_STEP * (already + k))
+    flow.run(source, sink)
+
+    staff_of_node = {node: pi for (pi, _), node in staff_period_node.items()}
+    chosen = {}
+    for si, options in candidates.items():
+        for v, cap, cost, _ in flow.graph[slot_node[si]]:
+            if v in staff_of_node and cap == 0:
+                pi = staff_of_node[v]
+                chosen[si] = next(o for o in options if o[0] == pi)
+                break
+
+    # Attribute the load penalty to each person's later periods
+    load = dict(existing_load)
+    assignments = {}
+    total = 0
+    for si in sorted(chosen, key=lambda i: (slots[i]["period"], i)):
+        pi, score, breakdown, notes = chosen[si]
+        name = profiles[pi]["name"]
+        breakdown = dict(breakdown)
+        penalty = LOAD_STEP * load.get(name, 0)
+        if penalty:
+            breakdown["load"] = -penalty
+        load[name] = load.get(name, 0) + 1
+        assignments[slots[si]["key"]] = {
+            "period": slots[si]["period"],
+            "name": name,
+            "score": score - penalty,
+            "breakdown": breakdown,
+            "notes": notes,
+        }
+        total += score - penalty
+
+    unassigned = [slots[si]["key"] for si in range(len(slots)) if si not in chosen]
+    notes = {
+        slots[si]["key"]: ["only by pulling from class: " + ", ".join(teaching[si])]
+        for si in range(len(slots)) if si not in chosen and si in teaching
+    }
+    return {"assignments": assignments, "unassigned": unassigned, "notes": notes, "total_score": total}
+
+
+def suggest_cover(periods, available_staff_profiles, period_activities=None, allow_teaching=False):
+    """Optimal per-period cover for a single absence."""
+    period_activities = period_activities or {}
+    slots = [{"key": p, "period": p, "activity": period_activities.get(p)} for p in periods]
+    return solve_slots(slots, available_staff_profiles, allow_teaching=allow_teaching)
+
+
+def format_plan(absent_staff, day, plan):
+    """Plain-text summary of a plan, in the same spirit as the AI output."""
+    lines = [f"Cover for {absent_staff} ({day}):"]
+    for key, a in sorted(plan["assignments"].items(), key=lambda kv: (kv[1]["period"], str(kv[0]))):
+        reasons = ", ".join(f"{k} {v:+d}" for k, v in a["breakdown"].items())
+        line = f"- Period {a['period']}: {a['name']} (score {a['score']}: {reasons})"
+        if a["notes"]:
+            line += f" - {'; '.join(a['notes'])}"
+        lines.append(line)
+    for key in plan["unassigned"]:
+        notes = plan.get("notes", {}).get(key)
+        lines.append(f"- {key}: no eligible staff found" + (f" ({'; '.join(notes)})" if notes else ""))
+    return "\n".join(lines)
@@ -0,0 +1,107 @@
+"""
+Materialised cover load.
+
+cover_stats holds one row per staff member per week (weeks start on Monday):
+absences covered, periods covered and the latest cover date. Every write to
+covers calls refresh_cover_stats() for the staff and dates it touched, which
+recomputes just those rows with one DELETE and one INSERT ... SELECT, so
+fairness lookups read a few rows instead of scanning the cover history.
+"""
+
+import datetime
+from sqlalchemy import func, distinct, or_, select, insert, delete
+
+from .database import Absence, Cover, CoverStat
+
+# How many recent weeks "recent load" covers (reports)
+RECENT_WEEKS = 4
+
+
+def week_start(d):
+    """Monday of the week containing d."""
+    return d - datetime.timedelta(days=d.weekday())
+
+
+def _week_of(column):
+    # SQLite: 'weekday 0' moves to the coming Sunday (or stays), -6 days is its Monday
+    return func.date(column, 'weekday 0', '-6 days')
+
+
+def refresh_cover_stats(db, staff_ids=None, dates=None):
+    """
+    Recomputes cover_stats for the given staff IDs (None = everyone) in the
+    weeks containing the given dates (None = every week). Runs in the
+    caller's transaction; the caller commits.
+    """
+    stale = delete(CoverStat).execution_options(synchronize_session=False)
+    week = _week_of(Absence.date)
+    source = (
+        select(
+            Cover.covering_staff_id, week,
+            func.count(distinct(Cover.absence_id)), func.count(Cover.id), func.max(Absence.date)
+        )
+        .select_from(Cover)
+        .join(Absence, Cover.absence_id == Absence.id)
+        .where(Cover.covering_staff_id.is_not(None), Absence.date.is_not(None))
+        .group_by(Cover.covering_staff_id, week)
+    )
+    if staff_ids is not None:
+        staff_ids = sorted({i for i in staff_ids if i is not None})
+        if not staff_ids:
+            return
+        stale = stale.where(CoverStat.staff_id.in_(staff_ids))
+        source = source.where(Cover.covering_staff_id.in_(staff_ids))
+    if dates is not None:
+        weeks = sorted({week_start(d) for d in dates if d})
+        if not weeks:
+            return
+        stale = stale.where(CoverStat.week_start.in_(weeks))
+        source = source.where(or_(*[
+            Absence.date.between(w, w + datetime.timedelta(days=6)) for w in weeks
+        ]))
+
+    db.execute(stale)
+    db.execute(insert(CoverStat).from_select(
+        ["staff_id", "week_start", "covers", "periods", "last_cover_date"], source
+    ))
+
+
+def covers_touched(db, covers):
+    """(staff_ids, dates) for Cover rows about to change, for refresh_cover_stats."""
+    absence_ids = {c.absence_id for c in covers}
+    if not absence_ids:
+        return set(), set()
+    dates = {d for (d,) in db.query(Absence.date).filter(Absence.id.in_(absence_ids)).all()}
+    return {c.covering_staff_id for c in covers}, dates
+
+
+def ensure_cover_stats(db):
+    """Builds cover_stats from scratch if it is empty but covers exist (first run after upgrade)."""
+    if db.query(CoverStat.id).first() is None and db.query(Cover.id).first() is not None:
+        refresh_cover_stats(db)
+        db.commit()
+        return True
+    return False
+
+
+def week_loads(db, day):
+    """{staff_id: periods covered} for the week containing day. One indexed lookup."""
+    rows = db.query(CoverStat.staff_id, CoverStat.periods).filter(CoverStat.week_start == week_start(day)).all()
+    return dict(rows)
+
+
+def cover_loads(db, start, end):
+    """
+    {staff_id: {"covers", "periods", "last_cover_date"}} summed over the
+    weeks from the one containing start to the one containing end.
+    """
+    rows = (
+        db.query(CoverStat.staff_id, func.sum(CoverStat.covers), func.sum(CoverStat.periods), func.max(CoverStat.last_cover_date))
+        .filter(CoverStat.week_start >= week_start(start), CoverStat.week_start <= week_start(end))
+        .group_by(CoverStat.staff_id)
+        .all()
+    )
+    return {
+        staff_id: {"covers": covers, "periods": periods, "last_cover_date": last}
+        for staff_id, covers, periods, last in rows
+    }
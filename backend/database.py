@@ -1,10 +1,31 @@
-from sqlalchemy import create_engine, Column, Integer, String, Boolean, ForeignKey, Date, Text
+import os
+from sqlalchemy import create_engine, event, Column, Integer, String, Boolean, ForeignKey, Date, Text, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
 
 SQLALCHEMY_DATABASE_URL = "sqlite:///./rota.db"
 
+# WAL lets the API keep reading while an import or cover assignment writes.
+# SQLITE_JOURNAL_MODE=DELETE restores the old rollback journal.
+SQLITE_PRAGMAS = {
+    "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": "NORMAL",           # safe with WAL, far fewer fsyncs
+    "busy_timeout": os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"),
+    "cache_size": "-20000",            # ~20 MB page cache per connection
+    "temp_store": "MEMORY",
+}
+
 engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+
+@event.listens_for(engine, "connect")
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in SQLITE_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+    finally:
+        cursor.close()
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
@@ -38,6 +59,11 @@ class Schedule(Base):
 
     staff = relationship("Staff", back_populates="schedules")
 
+    __table_args__ = (
+        # Timetable lookups: a staff member's day, or one (day, period) slot
+        Index("ix_schedules_staff_day_period", "staff_id", "day_of_week", "period"),
+    )
+
 class Absence(Base):
     __tablename__ = "absences"
 
@@ -51,6 +77,11 @@ class Absence(Base):
     staff = relationship("Staff", back_populates="absences")
     covers = relationship("Cover", back_populates="absence")
 
+    __table_args__ = (
+        # Daily rota, reports and absence checks all start from a date
+        Index("ix_absences_date", "date"),
+    )
+
 class Cover(Base):
     __tablename__ = "covers"
 
@@ -64,9 +95,54 @@ class Cover(Base):
     absence = relationship("Absence", back_populates="covers")
     covering_staff = relationship("Staff")
 
+    __table_args__ = (
+        # Covers of an absence (per period), and a colleague's cover load
+        Index("ix_covers_absence_period", "absence_id", "period"),
+        Index("ix_covers_covering_staff", "covering_staff_id"),
+    )
+
+class CoverStat(Base):
+    """Cover load per staff member per week, kept in step with covers (backend/cover_stats.py)."""
+    __tablename__ = "cover_stats"
+
+    id = Column(Integer, primary_key=True, index=True)
+    staff_id = Column(Integer, ForeignKey("staff.id"))
+    week_start = Column(Date)  # Monday
+    covers = Column(Integer, default=0)  # distinct absences covered
+    periods = Column(Integer, default=0)  # periods covered
+    last_cover_date = Column(Date, nullable=True)
+
+    __table_args__ = (
+        Index("ix_cover_stats_staff_week", "staff_id", "week_start", unique=True),
+        Index("ix_cover_stats_week", "week_start"),
+    )
+
 class Setting(Base):
     __tablename__ = "settings"
 
     id = Column(Integer, primary_key=True, index=True)
     key = Column(String, unique=True, index=True)
     value = Column(Text)
+
+
+def migrate_indexes(bind=None):
+    """
+    Adds the indexes declared above to a database created before they
+    existed (create_all skips tables that are already there). Safe to run
+    repeatedly. Returns the names of the indexes it created.
+    """
+    bind = bind or engine
+    created = []
+    with bind.begin() as conn:
+        existing = {row[0] for row in conn.exec_driver_sql("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        tables = {row[0] for row in conn.exec_driver_sql("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        for table in (Schedule.__table__, Absence.__table__, Cover.__table__, CoverStat.__table__):
+            if table.name not in tables:
+                continue  # create_all builds it with its indexes
+            for index in sorted(table.indexes, key=lambda i: i.name):
+                if index.name not in existing:
+                    index.create(bind=conn)
+                    created.append(index.name)
+        if created:
+            conn.exec_driver_sql("ANALYZE")
+    return created
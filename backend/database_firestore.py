@@ -1,13 +1,87 @@
 import os
 import re
 import json
+import copy
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
 # Global variables
 _db = None
 
+# Seconds a cached read stays valid, per collection. Staff and timetables
+# change a few times a term; absences/covers change throughout the day.
+CACHE_TTLS = {
+    "staff": 300,
+    "schedules": 300,
+    "absences": 30,
+}
+CACHE_MAX_ENTRIES = 512
+
+class ReadCache:
+    """
+    Process-local read-through cache for FirestoreDB reads.
+
+    Entries are grouped by collection so writes can drop everything that may
+    depend on them. Values are deep-copied in and out so callers can never
+    mutate a cached result.
+    """
+
+    def __init__(self, ttls, max_entries=CACHE_MAX_ENTRIES):
+        self.ttls = ttls
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # (collection, key) -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = {name: 0 for name in ttls}
+        self.misses = {name: 0 for name in ttls}
+
+    def get(self, collection, key):
+        with self._lock:
+            item = self._entries.get((collection, key))
+            if item is not None and item[0] > time.monotonic():
+                self._entries.move_to_end((collection, key))
+                self.hits[collection] += 1
+                return True, copy.deepcopy(item[1])
+            if item is not None:
+                del self._entries[(collection, key)]
+            self.misses[collection] += 1
+            return False, None
+
+    def put(self, collection, key, value):
+        with self._lock:
+            self._entries[(collection, key)] = (time.monotonic() + self.ttls[collection], copy.deepcopy(value))
+            self._entries.move_to_end((collection, key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, *collections):
+        with self._lock:
+            if not collections:
+                self._entries.clear()
+                return
+            for k in [k for k in self._entries if k[0] in collections]:
+                del self._entries[k]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": dict(self.hits),
+                "misses": dict(self.misses),
+            }
+
+cache = ReadCache(CACHE_TTLS)
+
 def reset_db():
-    global _db
+    global _db, _mirror
     _db = None
+    cache.invalidate()
+    # Listeners belong to the old client; the mirror restarts on next use
+    if _mirror is not None:
+        _mirror.stop()
+        _mirror = None
     print("FIRESTORE: Connection cleared for reset.")
 
 def get_db(force_refresh=False):
@@ -73,9 +147,230 @@ def get_db(force_refresh=False):
         print(f"FIRESTORE CRITICAL ERROR: {str(e)}")
         return None
 
+# Fields copied from the parent absence onto each cover document so that all
+# covers for a set of absences can be read with one collection-group query.
+COVER_LINK_FIELDS = ("absence_id", "date", "absent_staff_id")
+
+def cover_links(absence_id, absence):
+    return {
+        "absence_id": str(absence_id),
+        "date": absence.get("date"),
+        "absent_staff_id": absence.get("staff_id"),
+    }
+
+# "Today" for the mirror's absence/cover listeners is the school's date, not the server's.
+# The school is on UTC+7 (see .github/workflows/keep_alive.yml); absences arrive from 05:00 local.
+SCHOOL_TIMEZONE = os.getenv("SCHOOL_TIMEZONE", "Asia/Bangkok")
+try:
+    SCHOOL_TZ = ZoneInfo(SCHOOL_TIMEZONE)
+except ZoneInfoNotFoundError:
+    print(f"FIRESTORE MIRROR: Unknown SCHOOL_TIMEZONE {SCHOOL_TIMEZONE!r}, using server local time.")
+    SCHOOL_TZ = None
+
+def school_today(now=None):
+    """Today's date (YYYY-MM-DD) in the school's timezone. now: aware datetime, for tests."""
+    now = now or datetime.now(SCHOOL_TZ)
+    return (now.astimezone(SCHOOL_TZ) if SCHOOL_TZ else now).strftime('%Y-%m-%d')
+
+class FirestoreMirror:
+    """
+    In-process copy of staff, schedules and today's absences/covers, kept
+    current by Firestore on_snapshot listeners.
+
+    Each listener marks its part of the mirror warm once the initial snapshot
+    has arrived; until then FirestoreDB reads fall back to direct queries.
+    Takes the client as an argument so it can run against the emulator or a
+    local fake that implements on_snapshot (see check_firestore_mirror.py).
+    """
+
+    def __init__(self, database):
+        self.database = database
+        self.staff = {}        # staff_id -> doc
+        self.schedules = {}    # staff_id -> {doc_id: doc}
+        self.absences = {}     # absence_id -> doc
+        self.covers = {}       # absence_id -> {doc_id: doc}
+        self.absence_date = None
+        self._warm = set()
+        self._watches = {}     # name -> (token, watch)
+        self._lock = threading.RLock()
+
+    def start(self):
+        self._watch("staff", self.database.collection("staff"), self._on_staff)
+        self._watch("schedules", self.database.collection_group("schedules"), self._on_schedules)
+        self._watch_day(school_today())
+        print("FIRESTORE MIRROR: Listeners attached.")
+        return self
+
+    def stop(self):
+        with self._lock:
+            for name in list(self._watches):
+                self._unwatch(name)
+            self._warm.clear()
+
+    def _unwatch(self, name):
+        """Detaches a listener. Caller holds the lock."""
+        _, watch = self._watches.pop(name, (None, None))
+        if watch is not None:
+            try: watch.unsubscribe()
+            except Exception: pass
+
+    def _watch(self, name, query, handler):
+        token = object()
+        def callback(snapshot, changes, read_time):
+            with self._lock:
+                # A replaced or stopped listener can still deliver a late batch
+                if self._watches.get(name, (None,))[0] is not token:
+                    return
+                for change in changes:
+                    handler(change.type.name, change.document)
+                self._warm.add(name)
+        with self._lock:
+            self._unwatch(name)
+            self._watches[name] = (token, None)
+            self._watches[name] = (token, query.on_snapshot(callback))
+
+    def _watch_day(self, day):
+        with self._lock:
+            # Old listeners go first, so nothing refills yesterday after the clear
+            self._unwatch("absences")
+            self._unwatch("covers")
+            self._warm.discard("absences")
+            self._warm.discard("covers")
+            self.absences.clear()
+            self.covers.clear()
+            self.absence_date = day
+            self._watch("absences", self.database.collection("absences").where("date", "==", day), self._on_absence)
+            self._watch("covers", self.database.collection_group("covers").where("date", "==", day), self._on_cover)
+
+    def _on_staff(self, kind, doc):
+        if kind == "REMOVED":
+            self.staff.pop(doc.id, None)
+        else:
+            self.staff[doc.id] = {**doc.to_dict(), "id": doc.id}
+
+    def _on_schedules(self, kind, doc):
+        staff_ref = doc.reference.parent.parent
+        if staff_ref is None or staff_ref.parent.id != "staff":
+            return
+        if kind == "REMOVED":
+            self.schedules.get(staff_ref.id, {}).pop(doc.id, None)
+        else:
+            self.schedules.setdefault(staff_ref.id, {})[doc.id] = doc.to_dict()
+
+    def _on_absence(self, kind, doc):
+        if kind == "REMOVED":
+            self.absences.pop(doc.id, None)
+        else:
+            self.absences[doc.id] = {**doc.to_dict(), "id": doc.id}
+
+    def _on_cover(self, kind, doc):
+        absence_ref = doc.reference.parent.parent
+        if absence_ref is None or absence_ref.parent.id != "absences":
+            return
+        if kind == "REMOVED":
+            self.covers.get(absence_ref.id, {}).pop(doc.id, None)
+        else:
+            data = doc.to_dict()
+            for field in COVER_LINK_FIELDS:
+                data.pop(field, None)
+            self.covers.setdefault(absence_ref.id, {})[doc.id] = data
+
+    def is_warm(self, *names):
+        return all(n in self._warm for n in names)
+
+    # Readers return deep copies, or None when the mirror can't answer
+
+    def read_staff(self):
+        with self._lock:
+            if not self.is_warm("staff"): return None
+            return copy.deepcopy(list(self.staff.values()))
+
+    def read_staff_member(self, staff_id=None, name=None):
+        with self._lock:
+            if not self.is_warm("staff"): return None
+            if staff_id:
+                return copy.deepcopy(self.staff.get(staff_id))
+            return copy.deepcopy(next((s for s in self.staff.values() if s.get("name") == name), None))
+
+    def read_schedules(self, staff_id=None, day=None):
+        """Schedules for one staff member (list) or everyone ({staff_id: list})."""
+        with self._lock:
+            if not self.is_warm("schedules"): return None
+            def pick(docs):
+                return [copy.deepcopy(d) for d in docs.values() if not day or d.get("day_of_week") == day]
+            if staff_id is not None:
+                return pick(self.schedules.get(staff_id, {}))
+            grouped = {sid: pick(docs) for sid, docs in self.schedules.items()}
+            return {sid: docs for sid, docs in grouped.items() if docs}
+
+    def read_absences(self, date, staff_id=None):
+        today = school_today()
+        with self._lock:
+            if self.absence_date != today:
+                self._watch_day(today)
+            if date != self.absence_date or not self.is_warm("absences", "covers"): return None
+            result = []
+            for a in self.absences.values():
+                if staff_id and a.get("staff_id") != staff_id: continue
+                result.append({**copy.deepcopy(a), "covers": copy.deepcopy(list(self.covers.get(a["id"], {}).values()))})
+            return result
+
+    def read_absence(self, absence_id):
+        with self._lock:
+            if not self.is_warm("absences", "covers"): return None
+            a = self.absences.get(str(absence_id))
+            if a is None: return None
+            return {**copy.deepcopy(a), "covers": copy.deepcopy(list(self.covers.get(a["id"], {}).values()))}
+
+# Set FIRESTORE_MIRROR=1 to serve reads from the listener-backed mirror
+MIRROR_ENABLED = os.getenv("FIRESTORE_MIRROR", "").lower() in ("1", "true", "yes")
+_mirror = None
+_mirror_lock = threading.Lock()
+
+def start_mirror(database=None):
+    """Attaches the listeners. Reads use the mirror once it is warm."""
+    global _mirror
+    with _mirror_lock:
+        if _mirror is not None:
+            return _mirror
+        database = database or get_db()
+        if not database:
+            return None
+        try:
+            _mirror = FirestoreMirror(database).start()
+        except Exception as e:
+            print(f"FIRESTORE MIRROR ERROR: {e}")
+            _mirror = None
+        return _mirror
+
+def stop_mirror():
+    global _mirror
+    with _mirror_lock:
+        if _mirror is not None:
+            _mirror.stop()
+            _mirror = None
+
+def get_mirror():
+    if _mirror is None and MIRROR_ENABLED:
+        start_mirror()
+    return _mirror
+
 class FirestoreDB:
+    @staticmethod
+    def cache_stats():
+        return cache.stats()
+
+    @staticmethod
+    def invalidate_cache(*collections):
+        cache.invalidate(*collections)
+
     @staticmethod
     def get_staff():
+        mirror = get_mirror()
+        mirrored = mirror.read_staff() if mirror else None
+        if mirrored is not None: return mirrored
+        hit, cached = cache.get("staff", "all")
+        if hit: return cached
         database = get_db()
         if not database: return []
         try:
@@ -86,6 +381,7 @@ class FirestoreDB:
                 data = doc.to_dict()
                 data["id"] = doc.id
                 staff_list.append(data)
+            cache.put("staff", "all", staff_list)
             return staff_list
         except Exception as e:
             msg = str(e)
@@ -98,31 +394,112 @@ class FirestoreDB:
     # Other methods simplified for safety
     @staticmethod
     def get_staff_member(staff_id=None, name=None):
+        mirror = get_mirror()
+        if mirror and mirror.is_warm("staff"):
+            return mirror.read_staff_member(staff_id=staff_id, name=name)
+        key = ("member", staff_id, name)
+        hit, cached = cache.get("staff", key)
+        if hit: return cached
         database = get_db()
         if not database: return None
         try:
+            member = None
             if staff_id:
                 doc = database.collection("staff").document(staff_id).get()
-                return {**doc.to_dict(), "id": doc.id} if doc.exists else None
-            if name:
+                member = {**doc.to_dict(), "id": doc.id} if doc.exists else None
+            elif name:
                 docs = database.collection("staff").where("name", "==", name).limit(1).stream()
                 for doc in docs:
-                    return {**doc.to_dict(), "id": doc.id}
+                    member = {**doc.to_dict(), "id": doc.id}
+                    break
+            cache.put("staff", key, member)
+            return member
         except: pass
         return None
 
     @staticmethod
     def get_schedules(staff_id, day=None):
+        mirror = get_mirror()
+        mirrored = mirror.read_schedules(staff_id=staff_id, day=day) if mirror else None
+        if mirrored is not None: return mirrored
+        key = ("staff", staff_id, day)
+        hit, cached = cache.get("schedules", key)
+        if hit: return cached
         database = get_db()
         if not database: return []
         try:
             query = database.collection("staff").document(staff_id).collection("schedules")
             if day: query = query.where("day_of_week", "==", day)
-            return [doc.to_dict() for doc in query.stream()]
+            schedules = [doc.to_dict() for doc in query.stream()]
+            cache.put("schedules", key, schedules)
+            return schedules
         except: return []
 
+    @staticmethod
+    def _get_covers_grouped(database, date=None, staff_id=None):
+        """
+        Reads the covers of every matching absence in one collection-group query.
+        Needs the covers index from firestore.indexes.json, and covers written
+        before the link fields existed only show up after migrate_cover_links.py.
+        """
+        query = database.collection_group("covers")
+        if date: query = query.where("date", "==", date)
+        if staff_id: query = query.where("absent_staff_id", "==", staff_id)
+        grouped = {}
+        for doc in query.stream():
+            absence_ref = doc.reference.parent.parent
+            if absence_ref is None or absence_ref.parent.id != "absences":
+                continue
+            data = doc.to_dict()
+            for field in COVER_LINK_FIELDS:
+                data.pop(field, None)
+            grouped.setdefault(absence_ref.id, []).append(data)
+        return grouped
+
+    @staticmethod
+    def _get_covers_each(database, absence_ids):
+        """Fallback for _get_covers_grouped: one absences/{id}/covers read per absence."""
+        grouped = {}
+        for absence_id in absence_ids:
+            for doc in database.collection("absences").document(absence_id).collection("covers").stream():
+                data = doc.to_dict()
+                for field in COVER_LINK_FIELDS:
+                    data.pop(field, None)
+                grouped.setdefault(absence_id, []).append(data)
+        return grouped
+
+    @staticmethod
+    def get_all_schedules(day=None):
+        """Returns {staff_id: [schedule, ...]} for every staff member in one collection-group query."""
+        mirror = get_mirror()
+        mirrored = mirror.read_schedules(day=day) if mirror else None
+        if mirrored is not None: return mirrored
+        key = ("all", day)
+        hit, cached = cache.get("schedules", key)
+        if hit: return cached
+        database = get_db()
+        if not database: return {}
+        try:
+            query = database.collection_group("schedules")
+            if day: query = query.where("day_of_week", "==", day)
+            grouped = {}
+            for doc in query.stream():
+                staff_ref = doc.reference.parent.parent
+                if staff_ref is None or staff_ref.parent.id != "staff":
+                    continue
+                grouped.setdefault(staff_ref.id, []).append(doc.to_dict())
+            cache.put("schedules", key, grouped)
+            return grouped
+        except: return {}
+
     @staticmethod
     def get_absences(date=None, staff_id=None):
+        mirror = get_mirror()
+        mirrored = mirror.read_absences(date, staff_id=staff_id) if mirror and date else None
+        if mirrored is not None: return mirrored
+        key = ("list", date, staff_id)
+        hit, cached = cache.get("absences", key)
+        if hit: return cached
         database = get_db()
         if not database: return []
         try:
@@ -133,10 +510,77 @@ class FirestoreDB:
             for doc in query.stream():
                 data = doc.to_dict()
                 data["id"] = doc.id
-                data["covers"] = [c.to_dict() for c in database.collection("absences").document(doc.id).collection("covers").stream()]
                 absences.append(data)
-            return absences
         except: return []
+        try:
+            covers = FirestoreDB._get_covers_grouped(database, date=date, staff_id=staff_id)
+        except Exception as e:
+            # e.g. FAILED_PRECONDITION when firestore.indexes.json has not been deployed
+            print(f"Firestore covers group query failed, reading per absence: {e}")
+            try:
+                covers = FirestoreDB._get_covers_each(database, [a["id"] for a in absences])
+            except Exception as e:
+                print(f"Firestore get_absences covers Error: {e}")
+                return []
+        for a in absences:
+            a["covers"] = covers.get(a["id"], [])
+        cache.put("absences", key, absences)
+        return absences
+
+    @staticmethod
+    def get_absence(absence_id):
+        mirror = get_mirror()
+        mirrored = mirror.read_absence(absence_id) if mirror else None
+        if mirrored is not None: return mirrored
+        key = ("one", str(absence_id))
+        hit, cached = cache.get("absences", key)
+        if hit: return cached
+        database = get_db()
+        if not database: return None
+        try:
+            doc = database.collection("absences").document(str(absence_id)).get()
+            if not doc.exists: return None
+            data = doc.to_dict()
+            data["id"] = doc.id
+            data["covers"] = []
+            for c in doc.reference.collection("covers").stream():
+                cover = c.to_dict()
+                for field in COVER_LINK_FIELDS:
+                    cover.pop(field, None)
+                data["covers"].append(cover)
+            cache.put("absences", key, data)
+            return data
+        except: return None
+
+    @staticmethod
+    def backfill_cover_links():
+        """
+        One-off migration: copies absence_id/date/absent_staff_id onto covers
+        written before those fields existed. Safe to re-run.
+        """
+        database = get_db()
+        if not database: return 0
+        updated = 0
+        batch = database.batch()
+        pending = 0
+        for abs_doc in database.collection("absences").stream():
+            links = cover_links(abs_doc.id, abs_doc.to_dict())
+            for c in abs_doc.reference.collection("covers").stream():
+                data = c.to_dict()
+                if all(data.get(k) == v for k, v in links.items()):
+                    continue
+                batch.update(c.reference, links)
+                pending += 1
+                updated += 1
+                # Firestore batches are capped at 500 writes
+                if pending == 450:
+                    batch.commit()
+                    batch = database.batch()
+                    pending = 0
+        if pending:
+            batch.commit()
+        cache.invalidate("absences")
+        return updated
 
     @staticmethod
     def add_absence(staff_id, staff_name, date, start_period, end_period):
@@ -151,6 +595,7 @@ class FirestoreDB:
                 "start_period": start_period,
                 "end_period": end_period
             })
+            cache.invalidate("absences")
             return doc_ref.id
         except: return None
 
@@ -165,11 +610,17 @@ class FirestoreDB:
                 plist = periods
                 
             parent_ref = database.collection("absences").document(absence_id)
+            parent = parent_ref.get()
+            links = cover_links(absence_id, parent.to_dict() if parent.exists else {})
+            batch = database.batch()
             for p in plist:
-                parent_ref.collection("covers").document(str(p)).set({
+                batch.set(parent_ref.collection("covers").document(str(p)), {
                     "period": p,
-                    "staff_name": staff_name
+                    "staff_name": staff_name,
+                    **links
                 })
+            batch.commit()
+            cache.invalidate("absences")
             return True
         except: return False
 
@@ -184,6 +635,7 @@ class FirestoreDB:
                 c.reference.delete()
             # Delete the absence itself
             database.collection("absences").document(absence_id).delete()
+            cache.invalidate("absences")
             return True
         except: return False
 
@@ -193,6 +645,7 @@ class FirestoreDB:
         if not database: return False
         try:
             database.collection("absences").document(absence_id).collection("covers").document(str(period)).delete()
+            cache.invalidate("absences")
             return True
         except: return False
 
@@ -208,6 +661,7 @@ class FirestoreDB:
                 "activity": activity,
                 "is_free": is_free
             })
+            cache.invalidate("schedules")
             return True
         except: return False
 
@@ -217,5 +671,6 @@ class FirestoreDB:
         if not database: return False
         try:
             database.collection("staff").document(staff_id).update(data)
+            cache.invalidate("staff")
             return True
         except: return False
@@ -1,90 +1,93 @@
-import sys
-import os
-from sqlalchemy import func
-from .database import Staff, Schedule, Absence, Cover
+from sqlalchemy import text
+from .database import Staff
+from .staff_names import StaffNameResolver, MERGE_RULES
+from .cover_stats import refresh_cover_stats
+from .availability_index import bump_schedule_version
 
-def clean_staff_name(name):
-    if not name: return ""
-    n = str(name).strip()
-    
-    # GLOBAL IGNORE LIST
-    IGNORED = [
-        "TBC", "External", "Coach", "Room", "Music Room", "Hall",
-        "Gym", "Pitch", "Court", "Pool", "Library", "PRE NURSERY", "PRE NUSERY", "Outside Prov.",
-        "**", "gate", "locked", "at", "8.30", "Mr", "1", "Calire", "?"
-    ]
-    if any(i.lower() in n.lower() for i in IGNORED):
-        return None
+clean_staff_name = StaffNameResolver(**MERGE_RULES).clean
 
-    import re
-    # Remove "K.", "Kun ", "K " prefixes
-    n = re.sub(r'^(k\.|kun\s|k\s)', '', n, flags=re.IGNORECASE).strip()
-    # Remove brackets and content e.g. "Charlotte (Thu)" -> "Charlotte"
-    n = n.split('(')[0].strip()
-    
-    # Common Mappings
-    nl = n.lower()
-    
-    # Fix Typos / Combine Duplicates
-    if "jactina" in nl: return "Jacinta"
-    if "nokkeaw" in nl: return "Nokkaew"
-    if "nick" in nl and ("c" in nl or nl == "nick"): return "Nick C" # Matches "Nick C", "Nick. C", "Nick"
-    
-    if nl == "darryl": return "Daryl"
-    if nl == "ginny": return "Jinny"
-    if nl == "jinny": return "Jinny" 
-    if nl == "janel": return "Janel"
-    
-    return n
+# Per-connection scratch table: old staff ID -> surviving staff ID (NULL = delete)
+MERGE_MAP = "staff_merge_map"
 
-def run_merge_in_session(db):
-    all_staff = db.query(Staff).all()
+def plan_merge(staff_rows):
+    """
+    Works out the merge from (id, name) rows, in ID order. Returns
+    (mapping, renames, logs): mapping is [(old_id, new_id)] with new_id None
+    for ignored staff, renames is [(id, canonical name)] for primaries.
+    """
+    mapping = []
+    renames = []
     logs = []
-    
     # 1. Group staff by canonical name
     by_canon = {}
-    for s in all_staff:
-        canon = clean_staff_name(s.name)
+    for staff_id, name in staff_rows:
+        canon = clean_staff_name(name)
         if not canon:
-            logs.append(f"Deleting ignored staff: {s.name}")
-            db.query(Schedule).filter(Schedule.staff_id == s.id).delete()
-            db.query(Absence).filter(Absence.staff_id == s.id).delete()
-            db.query(Cover).filter(Cover.covering_staff_id == s.id).delete()
-            db.delete(s)
+            logs.append(f"Deleting ignored staff: {name}")
+            mapping.append((staff_id, None))
             continue
-        
-        if canon not in by_canon:
-            by_canon[canon] = []
-        by_canon[canon].append(s)
+        by_canon.setdefault(canon, []).append((staff_id, name))
 
     # 2. Process each canonical group
     for canon, staff_list in by_canon.items():
-        # Pick primary: prefer one that already has the exact canonical name
-        primary = next((s for s in staff_list if s.name == canon), None)
-        
-        # If none match exactly, pick first and rename
-        if not primary:
-            primary = staff_list[0]
-            primary.name = canon
-            db.flush() # Ensure rename is applied before merging others
-            logs.append(f"Renamed {primary.id} to canonical {canon}")
-
-        # Merge others into primary
-        for s in staff_list:
-            if s.id == primary.id:
+        primary_id = next((sid for sid, name in staff_list if name == canon), None)
+        if primary_id is None:
+            primary_id = staff_list[0][0]
+            renames.append((primary_id, canon))
+            logs.append(f"Renamed {primary_id} to canonical {canon}")
+        for staff_id, name in staff_list:
+            if staff_id == primary_id:
                 continue
-            
-            logs.append(f"Merging: {s.name} (ID {s.id}) into {primary.name}")
-            db.query(Schedule).filter(Schedule.staff_id == s.id).update({Schedule.staff_id: primary.id})
-            db.query(Absence).filter(Absence.staff_id == s.id).update({Absence.staff_id: primary.id})
-            db.query(Cover).filter(Cover.covering_staff_id == s.id).update({Cover.covering_staff_id: primary.id})
-            db.delete(s)
-    
+            logs.append(f"Merging: {name} (ID {staff_id}) into {canon}")
+            mapping.append((staff_id, primary_id))
+    return mapping, renames, logs
+
+def run_merge_in_session(db):
+    """
+    Merges duplicate staff in one transaction with a fixed number of
+    set-based statements, however many aliases there are.
+    """
+    staff_rows = db.query(Staff.id, Staff.name).order_by(Staff.id).all()
+    mapping, renames, logs = plan_merge(staff_rows)
+    if not mapping and not renames:
+        db.commit()
+        return logs
+
+    db.execute(text(f"DROP TABLE IF EXISTS temp.{MERGE_MAP}"))
+    db.execute(text(f"CREATE TEMP TABLE {MERGE_MAP} (old_id INTEGER PRIMARY KEY, new_id INTEGER)"))
+    if mapping:
+        db.execute(
+            text(f"INSERT INTO {MERGE_MAP} (old_id, new_id) VALUES (:old_id, :new_id)"),
+            [{"old_id": old, "new_id": new} for old, new in mapping]
+        )
+
+    ignored = f"SELECT old_id FROM {MERGE_MAP} WHERE new_id IS NULL"
+    merged = f"SELECT old_id FROM {MERGE_MAP} WHERE new_id IS NOT NULL"
+    for table, column in (("schedules", "staff_id"), ("absences", "staff_id"), ("covers", "covering_staff_id")):
+        db.execute(text(f"DELETE FROM {table} WHERE {column} IN ({ignored})"))
+        db.execute(text(
+            f"UPDATE {table} SET {column} = "
+            f"(SELECT new_id FROM {MERGE_MAP} WHERE old_id = {table}.{column}) "
+            f"WHERE {column} IN ({merged})"
+        ))
+    # Drop the duplicates before renaming, so canonical names stay unique
+    db.execute(text(f"DELETE FROM staff WHERE id IN (SELECT old_id FROM {MERGE_MAP})"))
+    if renames:
+        db.execute(
+            text("UPDATE staff SET name = :name WHERE id = :id"),
+            [{"id": staff_id, "name": canon} for staff_id, canon in renames]
+        )
+    # Cover load of everyone whose covers moved or were deleted
+    refresh_cover_stats(db, {old for old, _ in mapping} | {new for _, new in mapping})
+    db.execute(text(f"DROP TABLE {MERGE_MAP}"))
+    # Staff rows changed: the availability index must drop old slots
+    bump_schedule_version(db)
     db.commit()
     return logs
 
 if __name__ == "__main__":
-    from .database import SessionLocal
+    from .database import SessionLocal, Base, engine
+    Base.metadata.create_all(bind=engine)
     db = SessionLocal()
     try:
         results = run_merge_in_session(db)
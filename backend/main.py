@@ -1,14 +1,22 @@
 import openpyxl
 import os
 from fastapi import FastAPI, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, aliased
 from sqlalchemy import func
 from . import database
 from .database import engine, SessionLocal, Staff, Schedule, Absence, Cover, Setting
 from .calendar_service import CalendarService
+from .availability_index import availability_index, bump_schedule_version, iter_slots, IDLE_ACTIVITIES
 import pandas as pd
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from .ai_agent import RotaAI
+from . import cover_solver
+from . import reporting
+from .cover_stats import refresh_cover_stats, covers_touched, ensure_cover_stats, week_loads
+from pydantic import BaseModel, ValidationError
+from typing import Optional
 import json
 
 app = FastAPI(title="Teacher Cover Rota API")
@@ -28,6 +36,12 @@ app.add_middleware(
 
 try:
     database.Base.metadata.create_all(bind=engine)
+    created = database.migrate_indexes(engine)
+    if created:
+        print(f"Added indexes: {', '.join(created)}")
+    with SessionLocal() as db:
+        if ensure_cover_stats(db):
+            print("Built cover_stats from existing covers")
 except Exception as e:
     print(f"Database sync error: {e}")
 
@@ -57,8 +71,8 @@ def get_stats(db: Session = Depends(get_db)):
 def trigger_normalize_legacy():
     try:
         from .normalize_legacy import normalize_legacy_absences
-        normalize_legacy_absences()
-        return {"status": "success", "message": "Legacy absences normalized."}
+        counts = normalize_legacy_absences()
+        return {"status": "success", "message": "Legacy absences normalized.", "counts": counts}
     except Exception as e:
         return {"status": "error", "message": str(e)}
 
@@ -106,78 +120,139 @@ def log_absence(staff_name: str, date: str, start_period: int, end_period: int,
     db.refresh(new_absence)
     return new_absence
 
-@app.get("/suggest-cover/{absence_id}")
-def suggest_cover(absence_id: int, day: str = "Monday", db: Session = Depends(get_db)):
+def build_cover_profiles(db, day, target_dt, exclude_ids=()):
+    """Profiles of active staff for the cover solver / AI, with calendar clashes applied."""
+    potential_staff = [s for s in db.query(Staff).filter(Staff.is_active == True).all() if s.id not in exclude_ids]
+    calendar_map, calendar_failures = CalendarService.get_busy_periods_many(
+        [s.calendar_url for s in potential_staff], target_dt
+    )
+    week_load = week_loads(db, target_dt)
+
+    available_profiles = []
+    for s in potential_staff:
+        free_periods = [sch.period for sch in s.schedules if sch.is_free and sch.day_of_week.lower() == day.lower()]
+        busy_periods = {sch.period: sch.activity for sch in s.schedules if not sch.is_free and sch.day_of_week.lower() == day.lower()}
+
+        calendar_events = {}
+        if s.calendar_url:
+            calendar_events = calendar_map.get(s.calendar_url, {})
+            free_periods = [p for p in free_periods if p not in calendar_events]
+
+        available_profiles.append({
+            "id": s.id,
+            "name": s.name,
+            "role": s.role,
+            "can_cover_periods": s.can_cover_periods,
+            "profile": s.profile,
+            "is_priority": s.is_priority,
+            "is_specialist": s.is_specialist,
+            "free_periods": free_periods,
+            "busy_periods": busy_periods,
+            "calendar_events": calendar_events,
+            "week_cover_periods": week_load.get(s.id, 0)
+        })
+    return available_profiles, calendar_failures
+
+def plan_absence_cover(db, absence_id, day, allow_teaching=False):
+    """Solver plan for one absence. Blocking DB work: the async endpoints run it in the threadpool."""
+    absence = db.query(Absence).filter(Absence.id == absence_id).first()
+    if not absence:
+        raise HTTPException(status_code=404, detail="Absence not found")
+    
+    absent_staff = db.query(Staff).filter(Staff.id == absence.staff_id).first()
+    absent_schedules = {sch.period: sch for sch in absent_staff.schedules if sch.day_of_week.lower() == day.lower()}
+    
+    all_range_periods = list(range(absence.start_period, absence.end_period + 1))
+    target_periods = [p for p in all_range_periods if p in absent_schedules and not absent_schedules[p].is_free]
+    
+    target_dt = pd.to_datetime(absence.date).date()
+    available_profiles, calendar_failures = build_cover_profiles(db, day, target_dt, exclude_ids={absent_staff.id})
+
+    plan = cover_solver.suggest_cover(
+        target_periods, available_profiles,
+        period_activities={p: absent_schedules[p].activity for p in target_periods},
+        allow_teaching=allow_teaching
+    )
+    return {
+        "absence_id": absence_id,
+        "absent_teacher": absent_staff.name,
+        "day": day,
+        "periods": target_periods,
+        "plan": plan,
+        "calendar_failures": calendar_failures
+    }
+
+async def run_db(db, fn, *args):
+    """
+    Runs blocking DB work in the threadpool and closes the session straight
+    after, so no pooled connection is held while a model call is awaited.
+    """
+    def work():
+        try:
+            return fn(db, *args)
+        finally:
+            db.close()
+    return await run_in_threadpool(work)
+
+def _sse(event, payload):
+    return f"event: {event}\ndata: {json.dumps(payload, default=str)}\n\n"
+
+async def _sse_stream(first_event, first_payload, chunks):
+    """Server-sent events: one data event, the model's text as "chunk" events, then "done"."""
+    yield _sse(first_event, first_payload)
     try:
-        absence = db.query(Absence).filter(Absence.id == absence_id).first()
-        if not absence:
-            raise HTTPException(status_code=404, detail="Absence not found")
-        
-        absent_staff = db.query(Staff).filter(Staff.id == absence.staff_id).first()
-        absent_schedules = {sch.period: sch for sch in absent_staff.schedules if sch.day_of_week.lower() == day.lower()}
-        
-        all_range_periods = list(range(absence.start_period, absence.end_period + 1))
-        target_periods = [p for p in all_range_periods if p in absent_schedules and not absent_schedules[p].is_free]
-        
-        potential_staff = db.query(Staff).filter(Staff.is_active == True).all()
-        available_profiles = []
-        
-        for s in potential_staff:
-            if s.id == absent_staff.id:
-                continue
-                
-            free_periods = [sch.period for sch in s.schedules if sch.is_free and sch.day_of_week.lower() == day.lower()]
-            busy_periods = {sch.period: sch.activity for sch in s.schedules if not sch.is_free and sch.day_of_week.lower() == day.lower()}
-
-            calendar_events = {}
-            if s.calendar_url:
-                try:
-                    target_dt = pd.to_datetime(absence.date).date()
-                    calendar_events = CalendarService.get_busy_periods(s.calendar_url, target_dt)
-                    free_periods = [p for p in free_periods if p not in calendar_events]
-                except Exception:
-                    pass
-
-            available_profiles.append({
-                "name": s.name,
-                "role": s.role,
-                "can_cover_periods": s.can_cover_periods,
-                "profile": s.profile,
-                "is_priority": s.is_priority,
-                "is_specialist": s.is_specialist,
-                "free_periods": free_periods,
-                "busy_periods": busy_periods,
-                "calendar_events": calendar_events
-            })
+        async for chunk in chunks:
+            yield _sse("chunk", {"text": chunk})
+    except Exception as e:
+        yield _sse("error", {"detail": str(e)})
+    yield _sse("done", {})
 
-        ai_response = ai_assistant.suggest_cover(
-            absent_staff=absent_staff.name,
-            day=day,
-            periods=target_periods,
-            available_staff_profiles=available_profiles
-        )
+@app.get("/suggest-cover/{absence_id}")
+async def suggest_cover(absence_id: int, day: str = "Monday", explain: bool = False, allow_teaching: bool = False, db: Session = Depends(get_db)):
+    try:
+        result = await run_db(db, plan_absence_cover, absence_id, day, allow_teaching)
+        if explain:
+            suggestions = await ai_assistant.explain_cover_async(result["absent_teacher"], day, result["plan"])
+        else:
+            suggestions = cover_solver.format_plan(result["absent_teacher"], day, result["plan"])
         
         return {
             "absence_id": absence_id,
-            "absent_teacher": absent_staff.name,
+            "absent_teacher": result["absent_teacher"],
             "day": day,
-            "periods": target_periods,
-            "suggestions": ai_response
+            "periods": result["periods"],
+            "suggestions": suggestions,
+            "plan": result["plan"],
+            "calendar_failures": result["calendar_failures"]
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/suggest-cover/{absence_id}/stream")
+async def stream_suggest_cover(absence_id: int, day: str = "Monday", allow_teaching: bool = False, db: Session = Depends(get_db)):
+    """
+    Streams the model's explanation as server-sent events. The solver's plan
+    arrives first as a "plan" event, so the page can render it at once.
+    """
+    try:
+        result = await run_db(db, plan_absence_cover, absence_id, day, allow_teaching)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    chunks = ai_assistant.stream_explain_cover(result["absent_teacher"], day, result["plan"])
+    return StreamingResponse(
+        _sse_stream("plan", result, chunks),
+        media_type="text/event-stream", headers={"Cache-Control": "no-cache"}
+    )
+
 @app.get("/availability")
 def check_availability(periods: str, day: str = "Monday", date: str = None, db: Session = Depends(get_db)):
     try:
         period_list = [int(p) for p in periods.split(',') if p]
         has_teaching_periods = any(1 <= p <= 8 for p in period_list)
-        
-        query = db.query(Staff).filter(Staff.is_active == True)
-        if has_teaching_periods:
-            query = query.filter(Staff.can_cover_periods == True)
-            
-        staff = query.all()
+
+        index = availability_index.ensure_fresh(db)
+        free_bits, busy_specialists = index.candidates(day, period_list, teaching=has_teaching_periods)
+        freed_bits = index.freed_bits(day, period_list)
         
         if date:
             target_dt = pd.to_datetime(date).date()
@@ -191,23 +266,25 @@ def check_availability(periods: str, day: str = "Monday", date: str = None, db:
                 cover_map[c.covering_staff_id] = {}
             cover_map[c.covering_staff_id][c.period] = c.absence.staff.name
 
+        slots = list(iter_slots(free_bits | busy_specialists))
+        calendar_map, _ = CalendarService.get_busy_periods_many(
+            [index.staff[slot]["calendar_url"] for slot in slots], target_dt
+        )
+
         results = []
-        for s in staff:
-            day_schedules = {sch.period: sch for sch in s.schedules if sch.day_of_week.lower() == day.lower()}
-            staff_covers = cover_map.get(s.id, {})
+        for slot in slots:
+            s = index.staff[slot]
+            timetable_free = bool(free_bits >> slot & 1)
+            staff_covers = cover_map.get(s["id"], {})
             
             calendar_busy = []
-            if s.calendar_url:
-                try:
-                    calendar_busy = CalendarService.get_busy_periods(s.calendar_url, target_dt)
-                except:
-                    pass
+            if s["calendar_url"]:
+                calendar_busy = calendar_map.get(s["calendar_url"], {})
             
             is_all_free = True
             first_busy_reason = None
 
             for p in period_list:
-                is_timetable_free = day_schedules.get(p) and day_schedules[p].is_free
                 who_covering = staff_covers.get(p)
                 is_calendar_busy = p in calendar_busy
                 
@@ -219,35 +296,38 @@ def check_availability(periods: str, day: str = "Monday", date: str = None, db:
                     is_all_free = False
                     first_busy_reason = calendar_busy[p]
                     break
-                elif not is_timetable_free:
-                    is_all_free = False
-                    first_busy_reason = day_schedules[p].activity if day_schedules.get(p) else "Busy"
-                    break
+                elif not timetable_free:
+                    entry = index.entry(day, p, slot)
+                    if not (entry and entry[1]):
+                        is_all_free = False
+                        first_busy_reason = entry[0] if entry else "Busy"
+                        break
             
             if is_all_free:
                 display_activity = "Free"
-                if not s.is_specialist:
+                if not s["is_specialist"] and freed_bits >> slot & 1:
                     reasons = []
                     for p in period_list:
-                        act = day_schedules[p].activity if day_schedules.get(p) else ""
-                        if act and act.lower() not in ['free', 'none', 'available', '']:
+                        entry = index.entry(day, p, slot)
+                        act = entry[0] if entry else ""
+                        if act and act.lower() not in IDLE_ACTIVITIES:
                             reasons.append(act)
                     if reasons:
                         display_activity = f"class doing {', '.join(reasons)}" if len(reasons) == 1 else "Various Activities"
 
                 results.append({
-                    "name": s.name, 
-                    "profile": s.profile, 
-                    "is_priority": s.is_priority,
-                    "is_specialist": s.is_specialist,
+                    "name": s["name"], 
+                    "profile": s["profile"], 
+                    "is_priority": s["is_priority"],
+                    "is_specialist": s["is_specialist"],
                     "is_free": True,
                     "activity": display_activity
                 })
-            elif s.is_specialist:
+            elif s["is_specialist"]:
                 results.append({
-                    "name": s.name, 
-                    "profile": s.profile, 
-                    "is_priority": s.is_priority,
+                    "name": s["name"], 
+                    "profile": s["profile"], 
+                    "is_priority": s["is_priority"],
                     "is_specialist": True,
                     "is_free": False,
                     "activity": first_busy_reason
@@ -263,21 +343,230 @@ def assign_cover(absence_id: int, staff_name: str, periods: str, db: Session = D
         if not staff:
             raise HTTPException(status_code=404, detail="Cover staff not found")
         period_list = [int(p) for p in periods.split(',') if p]
+        touched_staff = {staff.id}
         for p in period_list:
             existing = db.query(Cover).filter(Cover.absence_id == absence_id, Cover.period == p).first()
             if existing:
+                touched_staff.add(existing.covering_staff_id)
                 existing.covering_staff_id = staff.id
             else:
                 db.add(Cover(absence_id=absence_id, covering_staff_id=staff.id, period=p, status="confirmed"))
+        db.flush()
+        absence_date = db.query(Absence.date).filter(Absence.id == absence_id).scalar()
+        refresh_cover_stats(db, touched_staff, [absence_date])
         db.commit()
+        ai_assistant.cache.invalidate()
         return {"message": f"Assigned {staff_name} to periods {periods}"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/optimize-day")
+def optimize_day(date: str, allow_teaching: bool = False, db: Session = Depends(get_db)):
+    """
+    Plans cover for every uncovered period of every absence on a date in one
+    solve. Nobody is pulled from their own class unless allow_teaching is set.
+    """
+    try:
+        target_dt = pd.to_datetime(date).date()
+        day = target_dt.strftime('%A')
+        absences = db.query(Absence).filter(Absence.date == target_dt).all()
+        existing = db.query(Cover).join(Absence).filter(Absence.date == target_dt).all()
+
+        covered = {(c.absence_id, c.period) for c in existing}
+        # Periods each person is unavailable for: absent themselves, or already covering
+        blocked = {}
+        for a in absences:
+            blocked.setdefault(a.staff_id, set()).update(range(a.start_period, a.end_period + 1))
+        existing_load = {}
+        for c in existing:
+            blocked.setdefault(c.covering_staff_id, set()).add(c.period)
+
+        profiles, calendar_failures = build_cover_profiles(db, day, target_dt)
+        for prof in profiles:
+            taken = blocked.get(prof["id"], set())
+            prof["free_periods"] = [p for p in prof["free_periods"] if p not in taken]
+            prof["busy_periods"] = {p: act for p, act in prof["busy_periods"].items() if p not in taken}
+            prof["calendar_events"] = {p: ev for p, ev in prof["calendar_events"].items() if p not in taken}
+        names = {prof["id"]: prof["name"] for prof in profiles}
+        today_load = {}
+        for c in existing:
+            today_load[c.covering_staff_id] = today_load.get(c.covering_staff_id, 0) + 1
+            if c.covering_staff_id in names:
+                name = names[c.covering_staff_id]
+                existing_load[name] = existing_load.get(name, 0) + 1
+        # Today's covers are already in existing_load; the week figure keeps the other days
+        for prof in profiles:
+            prof["week_cover_periods"] = max(0, prof["week_cover_periods"] - today_load.get(prof["id"], 0))
+
+        slots = []
+        absence_info = {}
+        for a in absences:
+            absent_schedules = {sch.period: sch for sch in a.staff.schedules if sch.day_of_week.lower() == day.lower()}
+            absence_info[a.id] = a.staff.name
+            for p in range(a.start_period, a.end_period + 1):
+                if p in absent_schedules and not absent_schedules[p].is_free and (a.id, p) not in covered:
+                    slots.append({"key": (a.id, p), "period": p, "activity": absent_schedules[p].activity})
+
+        result = cover_solver.solve_slots(slots, profiles, existing_load=existing_load, allow_teaching=allow_teaching)
+
+        plan = []
+        for (absence_id, period), a in sorted(result["assignments"].items()):
+            plan.append({
+                "absence_id": absence_id,
+                "absent_teacher": absence_info[absence_id],
+                "period": period,
+                "staff_name": a["name"],
+                "score": a["score"],
+                "breakdown": a["breakdown"],
+                "notes": a["notes"]
+            })
+        return {
+            "date": str(target_dt),
+            "day": day,
+            "plan": plan,
+            "unassigned": [
+                {"absence_id": aid, "absent_teacher": absence_info[aid], "period": p, "notes": result["notes"].get((aid, p), [])}
+                for aid, p in result["unassigned"]
+            ],
+            "total_score": result["total_score"],
+            "calendar_failures": calendar_failures
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+class PlanItem(BaseModel):
+    """One assignment of a plan posted to /commit-plan (an /optimize-day plan entry)."""
+    absence_id: int
+    period: int
+    staff_name: str
+    score: Optional[int] = None
+    notes: list[str] = []
+
+def check_plan(db, plan, staff_ids):
+    """
+    Problems that would make a client-edited plan write inconsistent covers:
+    unknown absences, periods outside their absence, cover staff who are
+    absent themselves in that period, and anyone booked twice in one period,
+    within the plan or against covers already on record.
+    """
+    problems = []
+    absence_ids = {p.absence_id for p in plan}
+    absences = {a.id: a for a in db.query(Absence.id, Absence.staff_id, Absence.date, Absence.start_period, Absence.end_period)
+                .filter(Absence.id.in_(absence_ids)).all()}
+    unknown = sorted(absence_ids - absences.keys())
+    if unknown:
+        problems.append(f"absences not found: {', '.join(map(str, unknown))}")
+
+    # Absences of the cover staff themselves on the plan's dates
+    dates = {a.date for a in absences.values()}
+    away = {}  # (staff_id, date) -> [(start, end)]
+    if dates:
+        for staff_id, date, start, end in (
+            db.query(Absence.staff_id, Absence.date, Absence.start_period, Absence.end_period)
+            .filter(Absence.date.in_(dates), Absence.staff_id.in_(set(staff_ids.values()))).all()
+        ):
+            away.setdefault((staff_id, date), []).append((start, end))
+
+    slots = set()
+    booked = set()  # (staff_id, date, period)
+    for p in plan:
+        a = absences.get(p.absence_id)
+        if a is None:
+            continue
+        period = p.period
+        if not (a.start_period <= period <= a.end_period):
+            problems.append(f"period {period} is outside absence {a.id} (periods {a.start_period}-{a.end_period})")
+            continue
+        if (a.id, period) in slots:
+            problems.append(f"absence {a.id} period {period} appears twice")
+            continue
+        slots.add((a.id, period))
+        staff_id = staff_ids[p.staff_name.lower()]
+        if staff_id == a.staff_id:
+            problems.append(f"{p.staff_name} cannot cover their own absence {a.id}")
+            continue
+        if any(start <= period <= end for start, end in away.get((staff_id, a.date), [])):
+            problems.append(f"{p.staff_name} is absent in period {period} on {a.date}")
+            continue
+        key = (staff_id, a.date, period)
+        if key in booked:
+            problems.append(f"{p.staff_name} is booked twice in period {period} on {a.date}")
+        booked.add(key)
+
+    # Covers already on record that the plan does not overwrite
+    on_record = (
+        db.query(Cover.absence_id, Cover.period, Cover.covering_staff_id, Absence.date)
+        .join(Absence, Cover.absence_id == Absence.id)
+        .filter(Absence.date.in_(dates), Cover.covering_staff_id.in_(set(staff_ids.values())))
+        .all()
+    ) if dates else []
+    names = {staff_ids[p.staff_name.lower()]: p.staff_name for p in plan}
+    for absence_id, period, staff_id, date in on_record:
+        if (absence_id, period) in slots:
+            continue
+        if (staff_id, date, period) in booked:
+            problems.append(f"{names[staff_id]} already covers absence {absence_id} in period {period} on {date}")
+    return problems
+
+@app.post("/commit-plan")
+def commit_plan(plan: list[dict], db: Session = Depends(get_db)):
+    """Writes a plan from /optimize-day as confirmed covers in a single transaction."""
+    try:
+        try:
+            plan = [PlanItem.model_validate(p) for p in plan]
+        except ValidationError as e:
+            fields = "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())
+            raise HTTPException(status_code=400, detail=f"Invalid plan entry: {fields}")
+        names = {p.staff_name.lower() for p in plan}
+        staff_ids = {s.name.lower(): s.id for s in db.query(Staff).filter(func.lower(Staff.name).in_(names)).all()}
+        missing = names - staff_ids.keys()
+        if missing:
+            raise HTTPException(status_code=404, detail=f"Cover staff not found: {', '.join(sorted(missing))}")
+
+        problems = check_plan(db, plan, staff_ids)
+        if problems:
+            raise HTTPException(status_code=400, detail="Invalid plan: " + "; ".join(problems))
+
+        absence_ids = {p.absence_id for p in plan}
+        existing = {(c.absence_id, c.period): c for c in db.query(Cover).filter(Cover.absence_id.in_(absence_ids)).all()}
+        touched_staff = set(staff_ids.values()) | {c.covering_staff_id for c in existing.values()}
+        for p in plan:
+            reason = "; ".join(p.notes) or f"Optimised plan (score {p.score})"
+            cover = existing.get((p.absence_id, p.period))
+            if cover:
+                cover.covering_staff_id = staff_ids[p.staff_name.lower()]
+                cover.reason_for_selection = reason
+            else:
+                db.add(Cover(
+                    absence_id=p.absence_id,
+                    covering_staff_id=staff_ids[p.staff_name.lower()],
+                    period=p.period,
+                    reason_for_selection=reason,
+                    status="confirmed"
+                ))
+        db.flush()
+        dates = [d for (d,) in db.query(Absence.date).filter(Absence.id.in_(absence_ids)).all()]
+        refresh_cover_stats(db, touched_staff, dates)
+        db.commit()
+        ai_assistant.cache.invalidate()
+        return {"message": f"Committed {len(plan)} cover assignments"}
+    except HTTPException:
+        db.rollback()
+        raise
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.get("/covers/{absence_id}")
 def get_covers(absence_id: int, db: Session = Depends(get_db)):
-    covers = db.query(Cover).filter(Cover.absence_id == absence_id).all()
-    return [{"period": c.period, "staff_name": c.covering_staff.name} for c in covers]
+    rows = (
+        db.query(Cover.period, Staff.name)
+        .outerjoin(Staff, Cover.covering_staff_id == Staff.id)
+        .filter(Cover.absence_id == absence_id)
+        .order_by(Cover.period, Cover.id)
+        .all()
+    )
+    return [{"period": period, "staff_name": name} for period, name in rows]
 
 @app.get("/staff-schedule/{staff_name}")
 def get_staff_schedule(staff_name: str, day: str = None, db: Session = Depends(get_db)):
@@ -297,28 +586,63 @@ def get_staff_schedule(staff_name: str, day: str = None, db: Session = Depends(g
         "is_free": s.is_free
     } for s in schedules]
 
+@app.post("/update-schedule")
+def update_schedule(staff_id: int, day: str, period: int, activity: str, is_free: bool, db: Session = Depends(get_db)):
+    try:
+        schedule = db.query(Schedule).filter(
+            Schedule.staff_id == staff_id,
+            func.lower(Schedule.day_of_week) == day.lower(),
+            Schedule.period == period
+        ).first()
+        if schedule:
+            schedule.activity = activity
+            schedule.is_free = is_free
+        else:
+            db.add(Schedule(staff_id=staff_id, day_of_week=day, period=period, activity=activity, is_free=is_free))
+        bump_schedule_version(db)
+        db.commit()
+        ai_assistant.cache.invalidate()
+        return {"status": "success"}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.get("/daily-rota")
 def get_daily_rota(date: str, db: Session = Depends(get_db)):
     try:
         target_date = pd.to_datetime(date).date()
-        absences = db.query(Absence).filter(Absence.date == target_date).all()
-        
+        # One joined query: each absence with its covers and both staff names
+        covering = aliased(Staff)
+        rows = (
+            db.query(
+                Absence.id, Staff.name, Absence.start_period, Absence.end_period,
+                Cover.id, Cover.period, covering.name
+            )
+            .outerjoin(Staff, Absence.staff_id == Staff.id)
+            .outerjoin(Cover, Cover.absence_id == Absence.id)
+            .outerjoin(covering, Cover.covering_staff_id == covering.id)
+            .filter(Absence.date == target_date)
+            .order_by(Absence.id, Cover.period, Cover.id)
+            .all()
+        )
+
         results = []
-        for a in absences:
-            covers = []
-            for c in a.covers:
-                covers.append({
-                    "period": c.period,
-                    "covering_staff_name": c.covering_staff.name if c.covering_staff else "Unknown"
+        by_absence = {}
+        for absence_id, staff_name, start_period, end_period, cover_id, period, covering_name in rows:
+            entry = by_absence.get(absence_id)
+            if entry is None:
+                entry = by_absence[absence_id] = {
+                    "absence_id": absence_id,
+                    "staff_name": staff_name,
+                    "start_period": start_period,
+                    "end_period": end_period,
+                    "covers": []
+                }
+                results.append(entry)
+            if cover_id is not None:
+                entry["covers"].append({
+                    "period": period,
+                    "covering_staff_name": covering_name or "Unknown"
                 })
-            
-            results.append({
-                "absence_id": a.id,
-                "staff_name": a.staff.name,
-                "start_period": a.start_period,
-                "end_period": a.end_period,
-                "covers": covers
-            })
         return results
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -326,31 +650,43 @@ def get_daily_rota(date: str, db: Session = Depends(get_db)):
 @app.delete("/unassign-cover")
 def unassign_cover(absence_id: int, period: int, db: Session = Depends(get_db)):
     try:
+        removed = db.query(Cover).filter(Cover.absence_id == absence_id, Cover.period == period).all()
+        touched_staff, dates = covers_touched(db, removed)
         db.query(Cover).filter(Cover.absence_id == absence_id, Cover.period == period).delete()
+        refresh_cover_stats(db, touched_staff, dates)
         db.commit()
+        ai_assistant.cache.invalidate()
         return {"message": f"Unassigned period {period}"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/generate-report")
-def generate_report(query: str, db: Session = Depends(get_db)):
+async def generate_report(query: str, start: str = None, end: str = None, db: Session = Depends(get_db)):
+    """
+    Answers a question about absences and cover. The figures are exact SQL
+    aggregates over a date window (default: the year up to the latest
+    absence); the model only phrases the answer.
+    """
     try:
-        absences = db.query(Absence).all()
-        covers = db.query(Cover).all()
-        
-        data_summary = "Staff Absences:\n"
-        for a in absences[-1000:]:
-            data_summary += f"- Staff: {a.staff.name}, Date: {a.date}, Periods: {a.start_period}-{a.end_period}\n"
-        
-        data_summary += "\nCover Assignments:\n"
-        for c in covers[-1000:]:
-             data_summary += f"- Covering Staff: {c.covering_staff.name}, Covered For: {c.absence.staff.name}, Date: {c.absence.date}, Period: {c.period}\n"
-        
-        report = ai_assistant.generate_report(query, data_summary)
-        return {"report": report}
+        data = await run_db(db, reporting.build_report, start, end)
+        report = await ai_assistant.generate_report_async(query, reporting.format_report(data))
+        return {"report": report, "stats": data}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/generate-report/stream")
+async def stream_report(query: str, start: str = None, end: str = None, db: Session = Depends(get_db)):
+    """/generate-report as server-sent events: a "stats" event, then the report text in chunks."""
+    try:
+        data = await run_db(db, reporting.build_report, start, end)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    chunks = ai_assistant.stream_report(query, reporting.format_report(data))
+    return StreamingResponse(
+        _sse_stream("stats", data, chunks),
+        media_type="text/event-stream", headers={"Cache-Control": "no-cache"}
+    )
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("backend.main:app", host="0.0.0.0", port=8000, reload=True)
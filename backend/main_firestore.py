@@ -1,6 +1,7 @@
 from fastapi import FastAPI, Depends, HTTPException, Query, Request
-from .database_firestore import FirestoreDB
+from .database_firestore import FirestoreDB, cover_links
 from .calendar_service import CalendarService
+from . import cover_solver
 from datetime import datetime, date
 from dateutil import parser
 from fastapi.middleware.cors import CORSMiddleware
@@ -99,6 +100,7 @@ async def import_staff_bridge(request: Request):
     # Commit all operations at once
     try:
         batch.commit()
+        FirestoreDB.invalidate_cache("staff", "schedules")
         return {"imported": count, "status": "success"}
     except Exception as e:
         print(f"BATCH COMMIT FAILED: {e}")
@@ -145,7 +147,8 @@ async def import_absences_bridge(request: Request):
                     batch.set(cover_ref, {
                         "period": c["period"],
                         "staff_name": c["staff_name"],
-                        "covering_staff_id": str(c.get("covering_staff_id", ""))
+                        "covering_staff_id": str(c.get("covering_staff_id", "")),
+                        **cover_links(abs_id, {"date": a["date"], "staff_id": str(a["staff_id"])})
                     })
             
             count += 1
@@ -154,6 +157,7 @@ async def import_absences_bridge(request: Request):
 
     try:
         batch.commit()
+        FirestoreDB.invalidate_cache("absences")
         return {"imported_absences": count, "status": "success"}
     except Exception as e:
         print(f"ABSENCE BATCH FAILED: {e}")
@@ -169,17 +173,17 @@ def log_absence(staff_name: str, date: str, start_period: int, end_period: int):
     return {"id": absence_id, "status": "created"}
 
 @app.get("/api/suggest-cover/{absence_id}")
-def suggest_cover(absence_id: int, day: str = "Monday"):
+def suggest_cover(absence_id: int, day: str = "Monday", explain: bool = False, allow_teaching: bool = False):
     abs_id_str = str(absence_id)
     try:
-        absences = FirestoreDB.get_absences()
-        absence = next((a for a in absences if a["id"] == abs_id_str), None)
+        absence = FirestoreDB.get_absence(abs_id_str)
         if not absence:
             raise HTTPException(status_code=404, detail="Absence not found")
         
         absent_staff_id = absence["staff_id"]
         all_staff = FirestoreDB.get_staff()
-        absent_schedules = FirestoreDB.get_schedules(absent_staff_id, day=day)
+        all_schedules = FirestoreDB.get_all_schedules(day=day)
+        absent_schedules = all_schedules.get(absent_staff_id, [])
         absent_sched_map = {sch["period"]: sch for sch in absent_schedules if not sch["is_free"]}
         all_range_periods = list(range(absence["start_period"], absence["end_period"] + 1))
         target_periods = [p for p in all_range_periods if p in absent_sched_map]
@@ -187,24 +191,26 @@ def suggest_cover(absence_id: int, day: str = "Monday"):
         available_profiles = []
         for s in all_staff:
             if s["id"] == absent_staff_id: continue
-            s_schedules = FirestoreDB.get_schedules(s["id"], day=day)
+            s_schedules = all_schedules.get(s["id"], [])
             free_periods = [sch["period"] for sch in s_schedules if sch["is_free"]]
             busy_periods = {sch["period"]: sch["activity"] for sch in s_schedules if not sch["is_free"]}
             available_profiles.append({
                 "name": s["name"], "role": s.get("role", "Teacher"), "profile": s.get("profile"),
+                "can_cover_periods": s.get("can_cover_periods", True),
                 "is_priority": s.get("is_priority", False), "is_specialist": s.get("is_specialist", False),
                 "free_periods": free_periods, "busy_periods": busy_periods
             })
 
-        ai = get_ai()
-        if not ai:
-            return {"suggestions": "AI features are currently unavailable on this deployment."}
-
-        ai_response = ai.suggest_cover(
-            absent_staff=absence["staff_name"], day=day,
-            periods=target_periods, available_staff_profiles=available_profiles
+        plan = cover_solver.suggest_cover(
+            target_periods, available_profiles,
+            period_activities={p: absent_sched_map[p].get("activity") for p in target_periods},
+            allow_teaching=allow_teaching
         )
-        return {"suggestions": ai_response}
+        suggestions = cover_solver.format_plan(absence["staff_name"], day, plan)
+        ai = get_ai() if explain else None
+        if ai:
+            suggestions = ai.explain_cover(absence["staff_name"], day, plan)
+        return {"suggestions": suggestions, "plan": plan}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -3,542 +3,773 @@ import openpyxl
 import sys
 import os
 import re
+import json
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
 
 # Allow running directly as a script
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from backend.database import SessionLocal, Staff, Schedule, Setting, engine, Base
+from backend.database import SessionLocal, Staff, Schedule, Absence, Cover, Setting, engine, Base
+from backend.availability_index import bump_schedule_version
+from backend.cover_stats import refresh_cover_stats
+from backend.staff_names import StaffNameResolver, IMPORT_RULES
+from backend.sheet_layout import DAYS_LIST, staff_sheet_layout, find_duty_day_columns, find_day_pairs
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import and_, or_
 
 
 EXCEL_PATH = r"c:\Users\rob_b\Rota\temp_rota.xlsx"
 
-def clean_staff_name(name):
-    if not name: return ""
-    n = str(name).strip()
-    
-    # GLOBAL IGNORE LIST - Things that are definitely NOT staff
-    IGNORED = [
-        "TBC", "External", "Coach", "Room", "Music Room", "Hall",
-        "Gym", "Pitch", "Court", "Pool", "Library", "PRE NURSERY", "PRE NUSERY", "Outside Prov.",
-        "**", "gate", "locked", "at", "8.30", "1", "Calire", "?"
-    ]
-    # We check if the name is JUST an ignored string, or if it's one of the non-person identifiers
-    if n.lower() in [i.lower() for i in IGNORED]:
-        return None
-
-    # Remove title prefixes like "Mr", "Mrs", "Ms", "Miss", "K.", "Kun ", "K "
-    n = re.sub(r'^(mr|mrs|ms|miss|k\.|kun\s|k\s)\s*', '', n, flags=re.IGNORECASE).strip()
-    
-    # Remove brackets and content e.g. "Charlotte (Thu)" -> "Charlotte"
-    n = n.split('(')[0].strip()
-    
-    # Common Mappings
-    nl = n.lower()
-    
-    # Fix Typos / Combine Duplicates
-    if "jactina" in nl: return "Jacinta"
-    if "nokkeaw" in nl: return "Nokkaew"
-    if "nick" in nl and ("c" in nl or nl == "nick"): return "Nick C"
-    
-    if nl == "darryl": return "Daryl"
-    if "jinny" in nl or "ginny" in nl: return "Jinny"
-    if nl == "janel": return "Janel"
-    
-    # Final check: if it's still just "Mr" or something, ignore
-    if len(n) < 2: return None
-    
-    return n
-
-def normalize_data():
-    db = SessionLocal()
-    try:
-        # Clear existing data
-        db.query(Schedule).delete()
-        db.query(Staff).delete()
-        db.commit()
+# Name rules are shared with the other importers (backend/staff_names.py)
+clean_staff_name = StaffNameResolver(**IMPORT_RULES).clean
+
+# Staff timetables only use the top of the sheet: day headers in the first
+# 20 rows, period markers in the first 60, fallback rows within header + 30.
+STAFF_SHEET_ROWS = 60
+
+def read_grid(sheet, max_row=None):
+    """
+    Reads a worksheet once into a list of value tuples. Trailing empty rows
+    are dropped (read-only sheets often report a padded dimension).
+    """
+    rows = list(sheet.iter_rows(max_row=max_row, values_only=True))
+    while rows and all(c is None for c in rows[-1]):
+        rows.pop()
+    return rows
+
+TEACHER_PROFILES = {
+    "Daryl": "Music teacher",
+    "Jake": "Assistant that works throughout school",
+    "Becky": "Drama teacher who teaches whole school",
+    "Billy": "PE teacher who teaches whole school",
+    "Retno": "Pre-nursery teacher",
+    "Jacinta": "Nursery teacher",
+    "Faye": "Predominantly used for covering",
+    "Ginny": "Assistant who works with different classes and students",
+    "Claire": "Head (used for cover), tab is 'ME'",
+    "Ben": "Forest school teacher who teaches whole classes",
+    "Baitoey": "Teaching Assistant (Duty Only)",
+    "Nop": "Teaching Assistant (Duty Only)",
+    "Tum": "Teaching Assistant (Duty Only)",
+    "Nick C": "Qualified Teacher (Duty + Periods)",
+    "Kat": "Teaching Assistant (Duty Only)",
+    "Mr Ben": "Qualified Teacher (Periods + Duties)",
+    "Janel": "Teaching Assistant"
+}
+
+# Staff with full period cover capability (Qualified Teachers)
+DUTY_ONLY_STAFF = ["Baitoey", "Nop", "Tum", "Kat", "Janel"]
+
+# Identify specialists (non-form teachers)
+SPECIALISTS_LIST = [
+    "Daryl", "Becky", "Billy", "Jinny", "Ginny", "Ben", "Faye",
+    "Claire", "Jake", "Retno", "Jacinta", "Sunny", "Mr Ben", "Nick C"
+]
+
+IGNORED_SHEETS = [
+    'instructions', 'summary', 'record', 'absencerecord',
+    'sheet3', 'sheet1', 'cca', 'y56eal'
+]
+DUTY_SHEETS = ['TB1', 'EY']
+
+# Setting row holding {sheet_name: content hash} from the last import
+SHEET_HASHES_KEY = "timetable_sheet_hashes"
+
+# Parallel parsing: worker processes for phase one (1 = parse in-process)
+NORMALIZE_WORKERS = int(os.getenv("NORMALIZE_WORKERS", str(min(os.cpu_count() or 1, 4))))
+
+
+def parse_staff_sheet(grid, staff_name):
+    """
+    Parses one staff timetable grid into a plain record:
+    {"kind": "staff", "staff_name", "entries": [(day, period, activity, is_free)], "log"}.
+    """
+    log = [f"--- Normalizing: {staff_name} ---"]
+    entries = []
+    is_spec = (staff_name in SPECIALISTS_LIST)
+
+    # Day header and period marker rows ("1", "P1", "Period 1 (8:30)")
+    layout = staff_sheet_layout(grid)
+    day_cols = layout.day_cols
+    header_row_idx = layout.header_row_idx or 0
+
+    if not day_cols:
+        day_cols = {d: i+2 for i, d in enumerate(DAYS_LIST)}
+        header_row_idx = 1
+
+    log.append(f"  Day Columns: {day_cols} (Header Row: {header_row_idx})")
+
+    p_rows_map = {p_num: grid[r_idx] for p_num, r_idx in layout.period_rows.items()}
 
-        days_list = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday']
-        
-        print(f"Loading workbook: {EXCEL_PATH}...")
-        wb = openpyxl.load_workbook(EXCEL_PATH, data_only=True)
-        sheet_names = wb.sheetnames
-
-        teacher_profiles = {
-            "Daryl": "Music teacher",
-            "Jake": "Assistant that works throughout school",
-            "Becky": "Drama teacher who teaches whole school",
-            "Billy": "PE teacher who teaches whole school",
-            "Retno": "Pre-nursery teacher",
-            "Jacinta": "Nursery teacher",
-            "Faye": "Predominantly used for covering",
-            "Ginny": "Assistant who works with different classes and students",
-            "Claire": "Head (used for cover), tab is 'ME'",
-            "Ben": "Forest school teacher who teaches whole classes",
-            "Baitoey": "Teaching Assistant (Duty Only)",
-            "Nop": "Teaching Assistant (Duty Only)",
-            "Tum": "Teaching Assistant (Duty Only)",
-            "Nick C": "Qualified Teacher (Duty + Periods)",
-            "Kat": "Teaching Assistant (Duty Only)",
-            "Mr Ben": "Qualified Teacher (Periods + Duties)",
-            "Janel": "Teaching Assistant"
+    # Fallback rows: the 30 rows after the header, in order
+    rows_cached = grid[header_row_idx:header_row_idx + 30]
+    for p_num in range(1, 9):
+        row_data = p_rows_map.get(p_num)
+        if row_data is None:
+            row_data = rows_cached[p_num-1] if (p_num-1) < len(rows_cached) else [None]*50
+            log.append(f"    P{p_num} using fallback row")
+        else:
+            log.append(f"    P{p_num} found marker row")
+
+        for day, col in day_cols.items():
+            raw_val = row_data[col-1] if col <= len(row_data) else None
+            val = str(raw_val).strip() if raw_val is not None else ""
+
+            is_available = False
+            clean_val = val.lower().replace(" ", "")
+            free_keywords = ['none', 'nan', 'free', 'available', '0', '0.0', '']
+
+            # New Rules: Thai, Music, PE, PHSE free form teachers
+            specialist_subjects = ['thai', 'music', 'pe', 'p.e.', 'phse']
+            is_specialist_lesson = any(sub in val.lower() for sub in specialist_subjects)
+
+            if not clean_val or clean_val in free_keywords:
+                is_available = True
+            elif "assembly" in val.lower():
+                # Assembly is a free period for cover eligibility
+                is_available = True
+            elif not is_spec and is_specialist_lesson:
+                # If NOT a specialist teacher, but doing a specialist subject, they are free!
+                is_available = True
+
+            entries.append((day, p_num, val, is_available))
+
+    return {"kind": "staff", "staff_name": staff_name, "entries": entries, "log": log}
+
+
+def parse_duty_sheet(grid, sheet_name):
+    """
+    Parses a duty rota grid (TB1/EY) into a plain record:
+    {"kind": "duty", "entries": [(staff_name, day, period, activity)], "log"}.
+    """
+    log = [f"--- Processing Duties: {sheet_name} ---"]
+    entries = []
+
+    # Find Day Columns
+    # Expected Structure: [Desc] [Time] [Type] [Duration] [Mon] [Tue] [Wed] [Thu] [Fri]
+    # We look for the header row containing "Monday"
+    day_cols, header_row_idx = find_duty_day_columns(grid)
+
+    # Fallback if no header found (based on user snippet inference)
+    if not day_cols:
+        # Assuming Cols E, F, G, H, I (indices 5,6,7,8,9) -> Python 0-indexed: 4,5,6,7,8
+        # But openpyxl is 1-indexed for col numbers? No, iter_rows vals are tuple.
+        # Let's assume standard excel layout: A=1, B=2... E=5.
+        day_cols = {
+            'Monday': 5, 'Tuesday': 6, 'Wednesday': 7, 'Thursday': 8, 'Friday': 9
         }
+        header_row_idx = 1 # Guess
+        log.append("  Using fallback column indices for Duties (E-I)")
+
+    log.append(f"  Duty Day Columns: {day_cols}")
+
+    # Iterate rows
+    for r_idx, row in enumerate(grid[header_row_idx:]):
+        if not row or all(c is None for c in row): continue
+
+        # Determine Duty Period based on Time (Col B / idx 1) or Type (Col C / idx 2)
+        # Col A=0, B=1, C=2
+        time_val = str(row[1]).lower() if len(row) > 1 and row[1] else ""
+        type_val = str(row[2]).lower() if len(row) > 2 and row[2] else ""
+        desc_val = str(row[0]).lower() if len(row) > 0 and row[0] else ""
+
+        combined_marker = f"{time_val} {type_val} {desc_val}"
+
+        period_num = 9 # Default Lunch
+        duty_name = "Lunch Duty"
+
+        if "8." in combined_marker or "08" in combined_marker or "before" in combined_marker:
+            period_num = 0
+            duty_name = "Before School Duty"
+        elif "10." in combined_marker or "break" in combined_marker:
+            period_num = 11 # Break
+            duty_name = "Break Duty"
+        elif "12." in combined_marker or "1." in combined_marker or "lunch" in combined_marker:
+            period_num = 9 # Lunch
+            duty_name = "Lunch Duty"
+        elif "15." in combined_marker or "3." in combined_marker or "after" in combined_marker:
+            period_num = 10
+            duty_name = "After School Duty"
+
+        # Extract staff from day columns
+        for day, col_idx in day_cols.items():
+            if col_idx > len(row): continue
+
+            # col_idx is 1-based, the row tuple is 0-indexed
+            cell_val = row[col_idx-1]
+            if not cell_val: continue
+            val_str = str(cell_val).strip()
+            if val_str.lower() in ['none', 'nan', '']: continue
 
-        # Staff with full period cover capability (Qualified Teachers)
-        duty_only_staff = ["Baitoey", "Nop", "Tum", "Kat", "Janel"]
-        
-        # Identify specialists (non-form teachers)
-        specialists_list = [
-            "Daryl", "Becky", "Billy", "Jinny", "Ginny", "Ben", "Faye", 
-            "Claire", "Jake", "Retno", "Jacinta", "Sunny", "Mr Ben", "Nick C"
-        ]
-
-        for name in sheet_names:
-            name_lower = name.lower().replace(" ", "")
-
-            ignore_list = [
-                'instructions', 'summary', 'record', 'absencerecord', 
-                'sheet3', 'sheet1', 'cca', 'y56eal'
-            ]
-            if name_lower in ignore_list or name_lower.startswith('sheet') or name_lower in ['tb1', 'ey']:
+            # Logic for "Claire (Tue) + Faye (Mon)" type cells
+            # If the cell contains brackets with day names, we filter.
+            # Otherwise we assume it applies to THIS day column
+            target_staff_names = []
+
+            if "(" in val_str and any(d[:3].lower() in val_str.lower() for d in DAYS_LIST):
+                # Complex cell
+                # Check if CURRENT day is mentioned
+                if day.lower() in val_str.lower() or day[:3].lower() in val_str.lower():
+                    # Heuristic: Split by "+" or newline.
+                    # "Claire (Tuesday, Wednesday)" -> if today is Tuesday, add Claire.
+                    parts = re.split(r'[+\n]', val_str)
+                    for part in parts:
+                        part = part.strip()
+                        if not part: continue
+
+                        part_lower = part.lower()
+                        # Check if this part has ANY day mentioned
+                        # (Use full day names or 3-letter abbr)
+                        days_mentioned_in_part = False
+                        for d in DAYS_LIST:
+                            if d.lower() in part_lower or d[:3].lower() in part_lower:
+                                days_mentioned_in_part = True
+                                break
+
+                        # Condition to assign:
+                        # 1. The current day is explicitly mentioned in this part
+                        # 2. OR No days are mentioned in this part (implies generic assignment for this cell's column)
+                        current_day_match = (day.lower() in part_lower) or (day[:3].lower() in part_lower)
+
+                        if current_day_match or not days_mentioned_in_part:
+                            # Extract name from this part (remove brackets and content)
+                            name_part = part.split('(')[0].strip()
+                            if name_part:
+                                target_staff_names.append(name_part)
+
+            else:
+                # Simple cell (just names)
+                names = re.split(r'[+\n&,\s]', val_str) # Added space to splitters
+                for n in names:
+                    n = n.strip()
+                    if n: target_staff_names.append(n)
+
+            for raw_name in target_staff_names:
+                map_name = clean_staff_name(raw_name)
+                if not map_name: continue
+                entries.append((map_name, day, period_num, f"{duty_name}: {desc_val}"))
+
+    return {"kind": "duty", "entries": entries, "log": log}
+
+
+def parse_cca_sheet(grid):
+    """
+    Parses the CCA grid into a plain record:
+    {"kind": "cca", "entries": [(staff_name, day, cca_name)], "log"}.
+    """
+    log = ["--- Processing CCA (Smart Pairing) ---"]
+    entries = []
+
+    # 1. Identify Day Columns and Header Row
+    # User: "Club names appear in the columns first and the teachers second"
+    # so each day heads a pair: idx is the Activity and idx+1 is Staff.
+    day_cols_map, header_row_idx = find_day_pairs(grid)
+
+    if not day_cols_map:
+        log.append("  Could not find day headers in CCA tab.")
+        return {"kind": "cca", "entries": entries, "log": log}
+
+    log.append(f"  Detected CCA Mapping: {day_cols_map}")
+    # Iterate CCA data rows
+    for row_idx, row in enumerate(grid[header_row_idx:]):
+        if not any(row): continue
+
+        for day, col_cfg in day_cols_map.items():
+            a_idx = col_cfg['act_col']
+            s_idx = col_cfg['staff_col']
+
+            if s_idx >= len(row): continue
+
+            raw_cca = row[a_idx]
+            raw_staff = row[s_idx]
+
+            if not raw_staff or str(raw_staff).lower() in ['none', 'nan', '']:
                 continue
-            
-            staff_name = clean_staff_name(name)
-            if not staff_name: 
-                print(f"Skipping ignored sheet: {name}")
+
+            # Activity name comes from the first column of the pair
+            cca_name = str(raw_cca).strip() if raw_cca else "CCA"
+            staff_names_str = str(raw_staff).strip()
+
+            # Split multiple staff in a cell
+            raw_names = re.split(r'[+=\n&]', staff_names_str)
+
+            for raw_n in raw_names:
+                clean_name = clean_staff_name(raw_n)
+                if not clean_name: continue
+
+                # FILTER: Ignore Secondary
+                if "(sec)" in raw_n.lower(): continue
+
+                entries.append((clean_name, day, cca_name))
+
+    return {"kind": "cca", "entries": entries, "log": log}
+
+
+def plan_sheets(sheet_names):
+    """
+    Decides what to do with each sheet, in workbook order. Returns a list of
+    jobs (kind, sheet_name, staff_name) plus log lines for skipped sheets.
+    Staff tabs come first, then the duty rotas, then CCA, as in the original
+    serial import.
+    """
+    jobs = []
+    for name in sheet_names:
+        name_lower = name.lower().replace(" ", "")
+        if name_lower in IGNORED_SHEETS or name_lower.startswith('sheet') or name_lower in ['tb1', 'ey']:
+            continue
+
+        staff_name = clean_staff_name(name)
+        if not staff_name:
+            jobs.append(("skip", name, None))
+            continue
+
+        if name == "ME": staff_name = "Claire"
+        jobs.append(("staff", name, staff_name))
+
+    for duty_sheet in DUTY_SHEETS:
+        if duty_sheet in sheet_names:
+            jobs.append(("duty", duty_sheet, None))
+    if "CCA" in sheet_names:
+        jobs.append(("cca", "CCA", None))
+    return jobs
+
+
+def sheet_hash(grid):
+    """Content hash of a sheet's cell grid, used to skip unchanged sheets."""
+    return hashlib.sha1(repr(grid).encode("utf-8")).hexdigest()
+
+
+def _parse_sheets(path, jobs, known_hashes=None):
+    """
+    Phase one worker: opens the workbook once and parses a run of sheets.
+    Sheets whose hash matches known_hashes are not parsed; they come back as
+    {"unchanged": True} records.
+    """
+    known_hashes = known_hashes or {}
+    wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        records = []
+        for kind, sheet_name, staff_name in jobs:
+            if kind == "skip":
+                records.append({"kind": "skip", "log": [f"Skipping ignored sheet: {sheet_name}"]})
                 continue
 
-            if name == "ME": staff_name = "Claire"
-            
-            print(f"--- Normalizing: {staff_name} ---")
-            sheet = wb[name]
-            
-            is_spec = (staff_name in specialists_list)
-            can_cover = staff_name not in duty_only_staff
-
-            staff = db.query(Staff).filter(func.lower(Staff.name) == staff_name.lower()).first()
-            if not staff:
-                staff = Staff(
-                    name=staff_name,
-                    role="Teacher" if "Assistant" not in teacher_profiles.get(staff_name, "") and staff_name not in duty_only_staff else "TA",
-                    profile=teacher_profiles.get(staff_name, ""),
+            if kind == "staff":
+                grid = read_grid(wb[sheet_name], max_row=STAFF_SHEET_ROWS)
+            else:
+                grid = read_grid(wb[sheet_name])
+            digest = sheet_hash(grid)
+
+            if known_hashes.get(sheet_name) == digest:
+                record = {"kind": kind, "staff_name": staff_name, "unchanged": True, "log": []}
+            elif kind == "staff":
+                record = parse_staff_sheet(grid, staff_name)
+            elif kind == "duty":
+                record = parse_duty_sheet(grid, sheet_name)
+            else:
+                record = parse_cca_sheet(grid)
+            record["sheet"] = sheet_name
+            record["staff_name"] = staff_name
+            record["hash"] = digest
+            records.append(record)
+        return records
+    finally:
+        wb.close()
+
+
+def _run_jobs(path, jobs, workers, known_hashes=None):
+    workers = max(1, min(workers, len(jobs)))
+    if workers == 1:
+        return _parse_sheets(path, jobs, known_hashes)
+
+    size = -(-len(jobs) // workers)
+    chunks = [jobs[i:i + size] for i in range(0, len(jobs), size)]
+    try:
+        with ProcessPoolExecutor(max_workers=len(chunks)) as pool:
+            results = list(pool.map(_parse_sheets, [path] * len(chunks), chunks, [known_hashes] * len(chunks)))
+    except Exception as e:
+        print(f"Parallel parse failed ({e}), parsing serially")
+        return _parse_sheets(path, jobs, known_hashes)
+    return [record for chunk in results for record in chunk]
+
+
+def parse_workbook(path, workers=None, known_hashes=None):
+    """
+    Phase one: parses every staff, duty and CCA sheet into plain records.
+
+    Sheets are split into contiguous runs, one per worker process, and the
+    results are put back in job order, so the output is identical to the
+    serial path (workers=1). Falls back to serial parsing if the process
+    pool cannot be used.
+
+    With known_hashes ({sheet_name: hash}), sheets that have not changed are
+    returned as {"unchanged": True} records instead of being parsed.
+    """
+    workers = NORMALIZE_WORKERS if workers is None else workers
+    wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        jobs = plan_sheets(wb.sheetnames)
+    finally:
+        wb.close()
+    return _run_jobs(path, jobs, workers, known_hashes)
+
+
+def _sheet_group(kind, staff_name):
+    """
+    Sheets that write to the same Schedule rows form one group: a staff tab
+    owns that person's periods 1-8, TB1/EY own the duty periods, CCA owns
+    period 13. Groups are re-imported as a whole.
+    """
+    if kind == "staff":
+        return ("staff", staff_name.lower())
+    return (kind,)
+
+
+def _collect_rows(records, staff_by_name, add_staff):
+    """
+    Walks parsed records in order, resolving every name to a staff ID and
+    registering any staff that do not exist yet through add_staff.
+    Returns [(staff_id, day, period, activity, is_free), ...] in insert order.
+    """
+    pending = []
+    profiles_done = False
+    for record in records:
+        kind = record["kind"]
+        if kind != "staff" and kind != "skip" and not profiles_done:
+            profiles_done = True
+            _add_profile_staff(staff_by_name, add_staff)
+
+        for line in record["log"]:
+            print(line)
+
+        if kind == "staff":
+            staff_name = record["staff_name"]
+            staff_id = staff_by_name.get(staff_name.lower())
+            if not staff_id:
+                staff_id = add_staff(
+                    staff_name,
+                    role="Teacher" if "Assistant" not in TEACHER_PROFILES.get(staff_name, "") and staff_name not in DUTY_ONLY_STAFF else "TA",
+                    profile=TEACHER_PROFILES.get(staff_name, ""),
                     is_priority=(staff_name == "Claire"),
-                    is_specialist=is_spec,
-                    is_active=True,
-                    can_cover_periods=can_cover
+                    is_specialist=(staff_name in SPECIALISTS_LIST),
+                    can_cover_periods=staff_name not in DUTY_ONLY_STAFF
                 )
-                db.add(staff)
-                db.flush()
-
-
-            # Find day columns - scan first 20 rows
-            day_cols = {}
-            header_row_idx = 0
-            for r_idx, row in enumerate(sheet.iter_rows(max_row=20, values_only=True)):
-                found_in_row = False
-                for c_idx, val in enumerate(row):
-                    if not val: continue
-                    val_str = str(val).strip().lower()
-                    for d in days_list:
-                        if d.lower() == val_str: # Exact match
-                            day_cols[d] = c_idx + 1
-                            found_in_row = True
-                        elif d.lower() in val_str and len(val_str) < 15: # Partial match (e.g. "Monday 25th")
-                            day_cols[d] = c_idx + 1
-                            found_in_row = True
-                if found_in_row and len(day_cols) >= 3:
-                    header_row_idx = r_idx + 1
-                    break
-            
-            if not day_cols:
-                day_cols = {d: i+2 for i, d in enumerate(days_list)}
-                header_row_idx = 1
-            
-            print(f"  Day Columns: {day_cols} (Header Row: {header_row_idx})")
-
-            # Parse periods 1-8
-            p_rows_map = {}
-            for r_idx, row in enumerate(sheet.iter_rows(max_row=60, values_only=True)):
-                # Check first 5 columns for period markers
-                for c_idx, val in enumerate(row[:5]):
-                    if val is None: continue
-                    val_str = str(val).strip().lower()
-                    
-                    for p_num in range(1, 9):
-                        if p_num in p_rows_map: continue
-                        
-                        # Use Regex to find standalone period number, or P1, or Period 1
-                        # This matches "1", "P1", "Period 1", "P.1", "1 (8:30)", "Period 1 (8:30)"
-                        pattern = rf'(^|\b)(period\s*|p\.?\s*|){p_num}(\b|$)'
-                        if re.search(pattern, val_str):
-                            p_rows_map[p_num] = row
-                            break
-            
-            for p_num in range(1, 9):
-                row_data = p_rows_map.get(p_num)
-                if row_data is None:
-                    # Fallback
-                    rows_cached = list(sheet.iter_rows(min_row=header_row_idx + 1, max_row=header_row_idx + 30, values_only=True))
-                    row_data = rows_cached[p_num-1] if (p_num-1) < len(rows_cached) else [None]*50
-                    print(f"    P{p_num} using fallback row")
-                else:
-                    print(f"    P{p_num} found marker row")
-
-                for day, col in day_cols.items():
-                    raw_val = row_data[col-1] if col <= len(row_data) else None
-                    val = str(raw_val).strip() if raw_val is not None else ""
-                    
-                    is_available = False
-                    clean_val = val.lower().replace(" ", "")
-                    free_keywords = ['none', 'nan', 'free', 'available', '0', '0.0', '']
-                    
-                    # New Rules: Thai, Music, PE, PHSE free form teachers
-                    specialist_subjects = ['thai', 'music', 'pe', 'p.e.', 'phse']
-                    is_specialist_lesson = any(sub in val.lower() for sub in specialist_subjects)
-                    
-                    if not clean_val or clean_val in free_keywords:
-                        is_available = True
-                    elif "assembly" in val.lower():
-                        # Assembly is a free period for cover eligibility
-                        is_available = True
-                    elif not is_spec and is_specialist_lesson:
-                        # If NOT a specialist teacher, but doing a specialist subject, they are free!
-                        is_available = True
-                    
-                    db.add(Schedule(
-                        staff_id=staff.id,
-                        day_of_week=day,
-                        period=p_num,
-                        activity=val,
-                        is_free=is_available
-                    ))
-        
-        # Ensure all profile staff exist (for those without sheets)
-        for p_name, p_desc in teacher_profiles.items():
-             s_name = clean_staff_name(p_name)
-             if not s_name: continue
-             
-             existing = db.query(Staff).filter(func.lower(Staff.name) == s_name.lower()).first()
-             if not existing:
-                 can_cover = s_name not in duty_only_staff
-                 staff = Staff(
-                    name=s_name,
-                    role="TA" if "Assistant" in p_desc or s_name in duty_only_staff else "Teacher",
-                    profile=p_desc,
-                    is_priority=(s_name == "Claire"),
-                    is_specialist=(s_name in specialists_list),
-                    is_active=True,
-                    can_cover_periods=can_cover
-                 )
-                 db.add(staff)
-                 print(f"Added missing profile staff: {s_name}")
-        
-        db.commit()
+            for day, p_num, activity, is_free in record["entries"]:
+                pending.append((staff_id, day, p_num, activity, is_free))
+
+        elif kind == "duty":
+            for map_name, day, period_num, activity in record["entries"]:
+                staff_id = staff_by_name.get(map_name.lower())
+                if not staff_id:
+                    # New staff found in Duty
+                    is_qts = map_name in ["Mr Ben", "Nick C"]
+                    staff_id = add_staff(
+                        map_name,
+                        role="Teacher" if is_qts else "Duties Only",
+                        profile="Added from Duty Rota",
+                        is_specialist=False,
+                        can_cover_periods=is_qts # False for most duties
+                    )
+                    print(f"    New Staff from Duty: {map_name} (Teacher={is_qts})")
+                pending.append((staff_id, day, period_num, activity, False))
+
+        elif kind == "cca":
+            for clean_name, day, cca_name in record["entries"]:
+                staff_id = staff_by_name.get(clean_name.lower())
+                if not staff_id:
+                    # This is a new staff member found only in CCA
+                    staff_id = add_staff(
+                        clean_name,
+                        role="TA (from CCA)",
+                        profile="Added from CCA Rota",
+                        is_specialist=False,
+                        can_cover_periods=False
+                    )
+                    print(f"    New Staff from CCA: {clean_name}")
+                pending.append((staff_id, day, 13, f"CCA: {cca_name}", False)) # 13 = CCA Period
+                print(f"    Assigned {clean_name} -> {cca_name} ({day})")
+
+    if not profiles_done:
+        _add_profile_staff(staff_by_name, add_staff)
+    return pending
+
+
+class _StaffPlan:
+    """
+    Resolves staff names to IDs in memory. New staff get the IDs SQLite
+    would hand out (max(id) + 1 onwards) and are inserted in one statement.
+    """
+
+    def __init__(self, db, existing=True):
+        self.db = db
+        self.by_name = {}  # lower-case name -> staff ID
+        self.new_rows = []
+        next_id = 0
+        if existing:
+            for staff_id, name in db.query(Staff.id, Staff.name):
+                self.by_name[name.lower()] = staff_id
+                next_id = max(next_id, staff_id)
+        self.next_id = next_id + 1
+
+    def add(self, name, **fields):
+        staff_id = self.next_id
+        self.next_id += 1
+        self.new_rows.append({"id": staff_id, "name": name, "is_active": True, **fields})
+        self.by_name[name.lower()] = staff_id
+        return staff_id
+
+    def insert(self):
+        if self.new_rows:
+            self.db.bulk_insert_mappings(Staff, self.new_rows)
+        return len(self.new_rows)
+
+
+def _schedule_mappings(rows):
+    return [
+        {"staff_id": staff_id, "day_of_week": day, "period": p_num, "activity": activity, "is_free": is_free}
+        for staff_id, day, p_num, activity, is_free in rows
+    ]
+
+
+def write_records(db, records):
+    """
+    Phase two: replaces the timetable with the parsed records in the current
+    transaction. Staff are created in the same order as the serial import,
+    so IDs are stable between runs. Every staff name is resolved up front,
+    then each table gets a single bulk insert. The caller commits.
+    """
+    db.query(Schedule).delete()
+    db.query(Staff).delete()
+
+    plan = _StaffPlan(db, existing=False)
+    pending = _collect_rows(records, plan.by_name, plan.add)
+    plan.insert()
+    db.bulk_insert_mappings(Schedule, _schedule_mappings(pending))
+    return len(pending)
 
-        # Process Duty Sheets
-        for duty_sheet in ['TB1', 'EY']:
-            if duty_sheet not in wb.sheetnames:
-                continue
-            
-            print(f"--- Processing Duties: {duty_sheet} ---")
-            sheet = wb[duty_sheet]
-            
-            # Find Day Columns
-            # Expected Structure: [Desc] [Time] [Type] [Duration] [Mon] [Tue] [Wed] [Thu] [Fri]
-            # We look for the header row containing "Monday"
-            header_row_idx = None
-            day_cols = {}
-            for r_idx, row in enumerate(sheet.iter_rows(max_row=20, values_only=True)):
-                row_str = [str(c).lower() for c in row if c]
-                if "monday" in row_str:
-                    header_row_idx = r_idx + 1
-                    for c_idx, val in enumerate(row):
-                        if not val: continue
-                        val_str = str(val).strip().lower()
-                        for d in days_list:
-                            if d.lower() in val_str:
-                                day_cols[d] = c_idx + 1
-                    break
-            
-            # Fallback if no header found (based on user snippet inference)
-            if not day_cols:
-                # Assuming Cols E, F, G, H, I (indices 5,6,7,8,9) -> Python 0-indexed: 4,5,6,7,8
-                # But openpyxl is 1-indexed for col numbers? No, iter_rows vals are tuple.
-                # Let's assume standard excel layout: A=1, B=2... E=5.
-                day_cols = {
-                    'Monday': 5, 'Tuesday': 6, 'Wednesday': 7, 'Thursday': 8, 'Friday': 9
-                }
-                header_row_idx = 1 # Guess
-                print("  Using fallback column indices for Duties (E-I)")
-
-            print(f"  Duty Day Columns: {day_cols}")
-
-            # Iterate rows
-            for r_idx, row in enumerate(sheet.iter_rows(min_row=header_row_idx+1, values_only=True)):
-                if not row or all(c is None for c in row): continue
-                
-                # Determine Duty Period based on Time (Col B / idx 1) or Type (Col C / idx 2)
-                # Col A=0, B=1, C=2
-                time_val = str(row[1]).lower() if len(row) > 1 and row[1] else ""
-                type_val = str(row[2]).lower() if len(row) > 2 and row[2] else ""
-                desc_val = str(row[0]).lower() if len(row) > 0 and row[0] else ""
-                
-                combined_marker = f"{time_val} {type_val} {desc_val}"
-                
-                period_num = 9 # Default Lunch
-                duty_name = "Lunch Duty"
-                
-                if "8." in combined_marker or "08" in combined_marker or "before" in combined_marker:
-                    period_num = 0
-                    duty_name = "Before School Duty"
-                elif "10." in combined_marker or "break" in combined_marker:
-                    period_num = 11 # Break
-                    duty_name = "Break Duty"
-                elif "12." in combined_marker or "1." in combined_marker or "lunch" in combined_marker:
-                    period_num = 9 # Lunch
-                    duty_name = "Lunch Duty"
-                elif "15." in combined_marker or "3." in combined_marker or "after" in combined_marker:
-                    period_num = 10
-                    duty_name = "After School Duty"
-
-                # Extract staff from day columns
-                for day, col_idx in day_cols.items():
-                    if col_idx > len(row): continue
-                    
-                    # col_idx is 1-based from earlier logic? 
-                    # If I manually set 5, it means 5th column. row tuple is 0-indexed.
-                    # so row[col_idx-1]
-                    cell_val = row[col_idx-1]
-                    if not cell_val: continue
-                    val_str = str(cell_val).strip()
-                    if val_str.lower() in ['none', 'nan', '']: continue
-                    
-                    # Logic for "Claire (Tue) + Faye (Mon)" type cells
-                    # If the cell contains brackets with day names, we filter.
-                    # Otherwise we assume it applies to THIS day column (if in a grid)
-                    # OR if it's a merged cell spanning all, we check days?
-                    # The user snippet showed "Claire (Tuesday...)" inside a cell.
-                    
-                    target_staff_names = []
-                    
-                    # Split by newlines, "+", "&"
-                    import re
-                    # specific cleanup for "Claire (Tuesday...)" pattern
-                    # If specific days are mentioned in brackets, only assign if matches current 'day'
-                    
-                    if "(" in val_str and any(d[:3].lower() in val_str.lower() for d in days_list):
-                        # Complex cell
-                        # Check if CURRENT day is mentioned
-                        if day.lower() in val_str.lower() or day[:3].lower() in val_str.lower():
-                            # Who is associated with this day?
-                            # Regex: Name \((...)\)
-                            # This is hard to parse perfectly without more robust NLP, but let's try strict tokenizing
-                            # "Claire (Tuesday, Wednesday)" -> if today is Tuesday, add Claire.
-                            # We can just look for the name preceding the bracket containing the day?
-                            # Or simpler: Just look for names in the string.
-                            # If a name is found, blindly assign it? NO, wrong day.
-                            
-                            # Heuristic: Split by "+" or newline.
-                            parts = re.split(r'[+\n]', val_str)
-                            for part in parts:
-                                part = part.strip()
-                                if not part: continue
-                                
-                                part_lower = part.lower()
-                                # Check if this part has ANY day mentioned
-                                # (Use full day names or 3-letter abbr)
-                                days_mentioned_in_part = False
-                                for d in days_list:
-                                    if d.lower() in part_lower or d[:3].lower() in part_lower:
-                                        days_mentioned_in_part = True
-                                        break
-                                
-                                # Condition to assign:
-                                # 1. The current day is explicitly mentioned in this part
-                                # 2. OR No days are mentioned in this part (implies generic assignment for this cell's column)
-                                current_day_match = (day.lower() in part_lower) or (day[:3].lower() in part_lower)
-                                
-                                if current_day_match or not days_mentioned_in_part:
-                                    # Extract name from this part (remove brackets and content)
-                                    name_part = part.split('(')[0].strip()
-                                    if name_part:
-                                        target_staff_names.append(name_part)
-
-                    else:
-                        # Simple cell (just names)
-                        names = re.split(r'[+\n&,\s]', val_str) # Added space to splitters
-                        for n in names:
-                            n = n.strip()
-                            if n: target_staff_names.append(n)
-                    
-                    # Register Staff and Assignments
-                    for raw_name in target_staff_names:
-                        map_name = clean_staff_name(raw_name)
-                        if not map_name: continue
-                        
-                        # Find or Create
-                        staff_obj = db.query(Staff).filter(func.lower(Staff.name) == map_name.lower()).first()
-                        
-                        if not staff_obj:
-                             # New staff found in Duty
-                             is_qts = map_name in ["Mr Ben", "Nick C"]
-                             staff_obj = Staff(
-                                 name=map_name,
-                                 role="Teacher" if is_qts else "Duties Only",
-                                 profile="Added from Duty Rota",
-                                 is_active=True,
-                                 is_specialist=False,
-                                 can_cover_periods=is_qts # False for most duties
-                             )
-                             db.add(staff_obj)
-                             db.flush() # get ID
-                             print(f"    New Staff from Duty: {map_name} (Teacher={is_qts})")
-                        
-                        # Add Schedule
-                        db.add(Schedule(
-                            staff_id=staff_obj.id,
-                            day_of_week=day,
-                            period=period_num,
-                            activity=f"{duty_name}: {desc_val}",
-                            is_free=False
-                        ))
-        
-        db.commit()
 
-        # Process CCA Sheet
-        if "CCA" in wb.sheetnames:
-            print("--- Processing CCA (Smart Pairing) ---")
-            sheet = wb["CCA"]
-            
-            # 1. Identify Day Columns and Header Row
-            day_cols_map = {} # day -> { 'act_col': idx, 'staff_col': idx }
-            header_row_idx = None
-            
-            # Scan top 20 rows for "Monday", "Tuesday" etc.
-            for r_idx, row in enumerate(sheet.iter_rows(max_row=20, values_only=True)):
-                row_vals = [str(c).lower() if c else "" for c in row]
-                found_days = []
-                for d in days_list:
-                    if d.lower() in row_vals:
-                        found_days.append(d)
-                
-                if found_days:
-                    header_row_idx = r_idx + 1
-                    # Map Day name to the pair of columns
-                    # User: "Club names appear in the columns first and the teachers second"
-                    # We look for the day name. If it's found at idx, 
-                    # then idx is usually the Activity and idx+1 is Staff.
-                    for d in found_days:
-                        c_idx = row_vals.index(d.lower())
-                        day_cols_map[d] = {
-                            'act_col': c_idx,
-                            'staff_col': c_idx + 1
-                        }
-                    break
-            
-            if not day_cols_map:
-                 print("  Could not find day headers in CCA tab.")
+def _row_scope(staff_id, period):
+    if 1 <= period <= 8:
+        return ("staff", staff_id)
+    if period == 13:
+        return ("cca",)
+    return ("duty",)
+
+
+def sync_records(db, records, changed_groups):
+    """
+    Incremental phase two: brings only the Schedule rows owned by the changed
+    sheet groups in line with the parsed records. Rows that already match
+    are kept, rows for the same (staff, day, period) are updated in place,
+    the rest are inserted or deleted. Existing Staff rows (and their IDs)
+    are never removed here, so absences and covers keep pointing at them.
+    Returns (inserted, updated, deleted).
+    """
+    plan = _StaffPlan(db)
+    pending = _collect_rows(records, plan.by_name, plan.add)
+    plan.insert()
+
+    scopes = set()
+    for group in changed_groups:
+        if group[0] != "staff":
+            scopes.add(group)
+        elif group[1] in plan.by_name:
+            scopes.add(("staff", plan.by_name[group[1]]))
+
+    desired = {}  # scope -> [(staff_id, day, period, activity, is_free)]
+    for staff_id, day, p_num, activity, is_free in pending:
+        scope = _row_scope(staff_id, p_num)
+        if scope in scopes:
+            desired.setdefault(scope, []).append((staff_id, day, p_num, activity, bool(is_free)))
+
+    staff_ids = [scope[1] for scope in scopes if scope[0] == "staff"]
+    conditions = []
+    if staff_ids:
+        conditions.append(and_(Schedule.staff_id.in_(staff_ids), Schedule.period.between(1, 8)))
+    if ("duty",) in scopes:
+        conditions.append(and_(~Schedule.period.between(1, 8), Schedule.period != 13))
+    if ("cca",) in scopes:
+        conditions.append(Schedule.period == 13)
+
+    existing = {}  # scope -> [(id, staff_id, day, period, activity, is_free)]
+    if conditions:
+        rows = db.query(
+            Schedule.id, Schedule.staff_id, Schedule.day_of_week, Schedule.period, Schedule.activity, Schedule.is_free
+        ).filter(or_(*conditions)).order_by(Schedule.id)
+        for row in rows:
+            existing.setdefault(_row_scope(row.staff_id, row.period), []).append(tuple(row))
+
+    inserts, updates, deletes = [], [], []
+    for scope in scopes:
+        # 1. Keep rows that already match exactly
+        unmatched_rows = {}
+        for row_id, staff_id, day, p_num, activity, is_free in existing.get(scope, []):
+            key = (staff_id, day, p_num, activity, bool(is_free))
+            unmatched_rows.setdefault(key, []).append(row_id)
+        missing = []
+        for key in desired.get(scope, []):
+            if unmatched_rows.get(key):
+                unmatched_rows[key].pop(0)
             else:
-                 print(f"  Detected CCA Mapping: {day_cols_map}")
-                 # Iterate CCA data rows
-                 for row_idx, row in enumerate(sheet.iter_rows(min_row=header_row_idx+1, values_only=True)):
-                     if not any(row): continue
-                     
-                     for day, col_cfg in day_cols_map.items():
-                         a_idx = col_cfg['act_col']
-                         s_idx = col_cfg['staff_col']
-                         
-                         if s_idx >= len(row): continue
-                         
-                         raw_cca = row[a_idx]
-                         raw_staff = row[s_idx]
-                         
-                         if not raw_staff or str(raw_staff).lower() in ['none', 'nan', '']: 
-                             continue
-                         
-                         # Activity name comes from the first column of the pair
-                         cca_name = str(raw_cca).strip() if raw_cca else "CCA"
-                         staff_names_str = str(raw_staff).strip()
-                         
-                         # Split multiple staff in a cell
-                         raw_names = re.split(r'[+=\n&]', staff_names_str)
-                         
-                         for raw_n in raw_names:
-                             clean_name = clean_staff_name(raw_n)
-                             if not clean_name: continue
-                             
-                             # FILTER: Ignore Secondary
-                             if "(sec)" in raw_n.lower(): continue
-
-                             # FILTER: Explicit Ignore List (Now handled globally in clean_staff_name)
-                             # IGNORED_STAFF block removed
-                             
-                             # Find or Create
-                             staff_obj = db.query(Staff).filter(func.lower(Staff.name) == clean_name.lower()).first()
-                             
-                             if not staff_obj:
-                                 # This is a new staff member found only in CCA
-                                 staff_obj = Staff(
-                                     name=clean_name,
-                                     role="TA (from CCA)",
-                                     profile="Added from CCA Rota",
-                                     is_active=True,
-                                     is_specialist=False,
-                                     can_cover_periods=False
-                                 )
-                                 db.add(staff_obj)
-                                 db.flush()
-                                 print(f"    New Staff from CCA: {clean_name}")
-                             
-                             # Add the CCA to their schedule
-                             db.add(Schedule(
-                                 staff_id=staff_obj.id,
-                                 day_of_week=day,
-                                 period=13, # CCA Period
-                                 activity=f"CCA: {cca_name}",
-                                 is_free=False
-                             ))
-                             print(f"    Assigned {clean_name} -> {cca_name} ({day})")
-
-        # Final Deduplication Safety Net
-        print("--- Final Deduplication Check ---")
-        all_staff = db.query(Staff).all()
-        seen = {} # canonical_name -> staff_obj
-        for s in all_staff:
-            canon = clean_staff_name(s.name)
-            if not canon: 
-                print(f"Deleting ignored staff: {s.name}")
-                db.query(Schedule).filter(Schedule.staff_id == s.id).delete()
-                db.query(Absence).filter(Absence.staff_id == s.id).delete()
-                db.query(Cover).filter(Cover.covering_staff_id == s.id).delete()
-                db.delete(s)
-                continue
-            
-            if canon in seen:
-                # Duplicate! Merge schedules, absences, and covers
-                primary = seen[canon]
-                print(f"MERGING DUPLICATE: {s.name} into {primary.name}")
-                
-                # Update Schedules
-                db.query(Schedule).filter(Schedule.staff_id == s.id).update({Schedule.staff_id: primary.id})
-                
-                # Update Absences
-                db.query(Absence).filter(Absence.staff_id == s.id).update({Absence.staff_id: primary.id})
-                
-                # Update Covers
-                db.query(Cover).filter(Cover.covering_staff_id == s.id).update({Cover.covering_staff_id: primary.id})
-                
-                db.delete(s)
+                missing.append(key)
+
+        # 2. Update leftovers in the same slot, then insert/delete the rest
+        by_slot = {}
+        for key, row_ids in unmatched_rows.items():
+            by_slot.setdefault(key[:3], []).extend(row_ids)
+        for key in missing:
+            row_ids = by_slot.get(key[:3])
+            if row_ids:
+                updates.append({"id": row_ids.pop(0), "activity": key[3], "is_free": key[4]})
             else:
-                seen[canon] = s
-                # Ensure name is canonical
-                if s.name != canon:
-                    s.name = canon
+                inserts.append(key)
+        for row_ids in by_slot.values():
+            deletes.extend(row_ids)
+
+    if updates:
+        db.bulk_update_mappings(Schedule, updates)
+    if deletes:
+        db.query(Schedule).filter(Schedule.id.in_(deletes)).delete(synchronize_session=False)
+    if inserts:
+        db.bulk_insert_mappings(Schedule, _schedule_mappings(inserts))
+    return len(inserts), len(updates), len(deletes)
+
+
+def load_sheet_hashes(db):
+    setting = db.query(Setting).filter(Setting.key == SHEET_HASHES_KEY).first()
+    if not setting or not setting.value:
+        return {}
+    try:
+        return json.loads(setting.value)
+    except ValueError:
+        return {}
+
+
+def save_sheet_hashes(db, records):
+    """Stores {sheet_name: hash} for every parsed sheet. Caller commits."""
+    hashes = {r["sheet"]: r["hash"] for r in records if "hash" in r}
+    value = json.dumps(hashes, sort_keys=True)
+    setting = db.query(Setting).filter(Setting.key == SHEET_HASHES_KEY).first()
+    if setting:
+        setting.value = value
+    else:
+        db.add(Setting(key=SHEET_HASHES_KEY, value=value))
+
+
+def _add_profile_staff(staff_by_name, add_staff):
+    """Ensures all profile staff exist (for those without sheets)."""
+    for p_name, p_desc in TEACHER_PROFILES.items():
+        s_name = clean_staff_name(p_name)
+        if not s_name: continue
+
+        if s_name.lower() not in staff_by_name:
+            add_staff(
+                s_name,
+                role="TA" if "Assistant" in p_desc or s_name in DUTY_ONLY_STAFF else "Teacher",
+                profile=p_desc,
+                is_priority=(s_name == "Claire"),
+                is_specialist=(s_name in SPECIALISTS_LIST),
+                can_cover_periods=s_name not in DUTY_ONLY_STAFF
+            )
+            print(f"Added missing profile staff: {s_name}")
 
+
+def dedupe_staff(db):
+    """
+    Final deduplication safety net: merges staff whose names clean to the
+    same value. Returns the IDs whose covers were moved or deleted.
+    """
+    print("--- Final Deduplication Check ---")
+    all_staff = db.query(Staff).all()
+    seen = {} # canonical_name -> staff_obj
+    touched = set()
+    for s in all_staff:
+        canon = clean_staff_name(s.name)
+        if not canon:
+            print(f"Deleting ignored staff: {s.name}")
+            touched.add(s.id)
+            db.query(Schedule).filter(Schedule.staff_id == s.id).delete()
+            db.query(Absence).filter(Absence.staff_id == s.id).delete()
+            db.query(Cover).filter(Cover.covering_staff_id == s.id).delete()
+            db.delete(s)
+            continue
+
+        if canon in seen:
+            # Duplicate! Merge schedules, absences, and covers
+            primary = seen[canon]
+            print(f"MERGING DUPLICATE: {s.name} into {primary.name}")
+            touched.update((s.id, primary.id))
+
+            # Update Schedules
+            db.query(Schedule).filter(Schedule.staff_id == s.id).update({Schedule.staff_id: primary.id})
+
+            # Update Absences
+            db.query(Absence).filter(Absence.staff_id == s.id).update({Absence.staff_id: primary.id})
+
+            # Update Covers
+            db.query(Cover).filter(Cover.covering_staff_id == s.id).update({Cover.covering_staff_id: primary.id})
+
+            db.delete(s)
+        else:
+            seen[canon] = s
+            # Ensure name is canonical
+            if s.name != canon:
+                s.name = canon
+    return touched
+
+
+def normalize_data(workers=None, incremental=False):
+    """
+    Two-phase import: parse every sheet into plain records (in parallel),
+    then write them all in a single transaction.
+
+    incremental=True compares each sheet's content hash with the last import
+    and only re-parses and rewrites the sheet groups that changed, keeping
+    existing staff IDs. The full import wipes and rebuilds everything.
+    """
+    print(f"Loading workbook: {EXCEL_PATH}...")
+    db = SessionLocal()
+    try:
+        known_hashes = load_sheet_hashes(db) if incremental else None
+        records = parse_workbook(EXCEL_PATH, workers, known_hashes)
+
+        if not incremental:
+            write_records(db, records)
+        else:
+            sheets = [r for r in records if "hash" in r]
+            changed_groups = {_sheet_group(r["kind"], r["staff_name"]) for r in sheets if not r.get("unchanged")}
+            # Sheets removed since the last import clear the rows they owned
+            current = {r["sheet"] for r in sheets}
+            for kind, sheet_name, staff_name in plan_sheets([n for n in known_hashes if n not in current]):
+                if kind != "skip":
+                    changed_groups.add(_sheet_group(kind, staff_name))
+
+            if not changed_groups:
+                print("Timetable unchanged since last import.")
+                return
+
+            # Unchanged sheets that share a group with a changed one are re-parsed too
+            reparse = [(r["kind"], r["sheet"], r["staff_name"]) for r in sheets
+                       if r.get("unchanged") and _sheet_group(r["kind"], r["staff_name"]) in changed_groups]
+            if reparse:
+                reparsed = iter(_run_jobs(EXCEL_PATH, reparse, 1))
+                records = [next(reparsed) if r.get("unchanged") and _sheet_group(r["kind"], r["staff_name"]) in changed_groups else r
+                           for r in records]
+
+            changed = [r for r in records if "hash" in r and not r.get("unchanged")]
+            print(f"Incremental import: {len(changed)} of {len(sheets)} sheets changed")
+            inserted, updated, deleted = sync_records(db, changed, changed_groups)
+            print(f"  Schedules: {inserted} inserted, {updated} updated, {deleted} deleted")
+
+        merged = dedupe_staff(db)
+        if merged:
+            refresh_cover_stats(db, merged)
+        save_sheet_hashes(db, records)
+        bump_schedule_version(db)
         db.commit()
         print("Normalization complete.")
-        
+
     except Exception as e:
         print(f"Error during normalization: {e}")
         db.rollback()
@@ -548,4 +779,4 @@ def normalize_data():
 if __name__ == "__main__":
     # Ensure tables exist
     Base.metadata.create_all(bind=engine)
-    normalize_data()
+    normalize_data(incremental="--incremental" in sys.argv)
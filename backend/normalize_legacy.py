@@ -4,41 +4,13 @@ import re
 import pandas as pd
 from datetime import datetime
 from .database import SessionLocal, Staff, Absence, engine, Base
+from .staff_names import StaffNameResolver, LEGACY_RULES
 from sqlalchemy.orm import Session
 from sqlalchemy import func
 
 EXCEL_PATH = r"c:\Users\rob_b\Rota\temp_rota.xlsx"
 
-def clean_staff_name(name):
-    if not name: return None
-    n = str(name).strip().split('(')[0].strip()
-    
-    # Global ignore list from normalize.py
-    IGNORED = [
-        "TBC", "External", "Coach", "Room", "Music Room", "Hall",
-        "Gym", "Pitch", "Court", "Pool", "Library", "PRE NURSERY", "PRE NUSERY", "Outside Prov.",
-        "**", "gate", "locked", "at", "8.30", "Mr", "1", "Calire", "?", "pd", "consulate", "cons", "pl", "dl"
-    ]
-    
-    # Remove common suffixes/patterns
-    n = re.sub(r'(\d+\.\d+|pm|am|late|from|0\.5|half|\.|\?)', '', n, flags=re.IGNORECASE).strip()
-    
-    if not n or len(n) < 2: return None
-    
-    if any(i.lower() in n.lower() for i in IGNORED if len(i) > 2):
-        return None
-
-    # Common Mappings
-    nl = n.lower()
-    if "jactina" in nl: return "Jacinta"
-    if "nokkeaw" in nl: return "Nokkaew"
-    if "nick" in nl and ("c" in nl or nl == "nick"): return "Nick C"
-    if "soe" in nl and len(nl) < 6: return "Soe"
-    if nl == "darryl": return "Daryl"
-    if nl == "ginny": return "Jinny"
-    if nl == "anniina": return "Anniina"
-    
-    return n
+clean_staff_name = StaffNameResolver(**LEGACY_RULES).clean
 
 def parse_date(date_str):
     match = re.search(r'(\d+)/(\d+)', date_str)
@@ -49,19 +21,31 @@ def parse_date(date_str):
     except: return None
 
 def normalize_legacy_absences():
+    """
+    Imports the legacy "Absence Record" sheet. Absences already recorded for
+    the same (staff, date) are skipped, so it is safe to re-run.
+    Returns {"inserted": n, "skipped": n, "unresolved": n}.
+    """
     db = SessionLocal()
+    wb = None
+    counts = {"inserted": 0, "skipped": 0, "unresolved": 0}
     try:
-        if not os.path.exists(EXCEL_PATH): return
+        if not os.path.exists(EXCEL_PATH): return counts
 
-        wb = openpyxl.load_workbook(EXCEL_PATH, data_only=True)
+        wb = openpyxl.load_workbook(EXCEL_PATH, read_only=True, data_only=True)
         sheet_name = 'Absence Record'
         if sheet_name not in wb.sheetnames:
             matches = [s for s in wb.sheetnames if 'absence' in s.lower()]
-            if not matches: return
+            if not matches: return counts
             sheet_name = matches[0]
         
         sheet = wb[sheet_name]
         all_staff_names = {s.name.lower(): s.id for s in db.query(Staff).all()}
+        resolver = StaffNameResolver(staff=all_staff_names, **LEGACY_RULES)
+        # Every (staff_id, date) already recorded, plus the ones added below
+        seen = set(db.query(Absence.staff_id, Absence.date).all())
+        new_absences = []
+        unresolved = set()
         days_pattern = re.compile(r'(Monday|Tuesday|Wednesday|Thursday|Friday)', re.IGNORECASE)
         
         for row in sheet.iter_rows(values_only=True):
@@ -101,7 +85,7 @@ def normalize_legacy_absences():
                         for w in words:
                             if w.lower() in ["pm", "am", "late", "from", "consulate", "0.5"]: continue
                             test_name = (current_name + " " + w).strip()
-                            clean_w = clean_staff_name(w)
+                            clean_w = resolver.clean(w)
                             if clean_w and clean_w.lower() in all_staff_names and current_name:
                                 final_names.append(current_name)
                                 current_name = w
@@ -110,26 +94,45 @@ def normalize_legacy_absences():
 
                     processed_names = set()
                     for raw_n in final_names:
-                        cn = clean_staff_name(raw_n)
+                        cn = resolver.clean(raw_n)
                         if cn: processed_names.add(cn)
                     
                     for name in processed_names:
-                        staff_id = all_staff_names.get(name.lower())
+                        # Exact name, then trie/fuzzy match against known staff
+                        staff_id = resolver.resolve(name)
                         if not staff_id:
-                            match = [sid for sn, sid in all_staff_names.items() if sn in name.lower() or name.lower() in sn]
-                            if match: staff_id = match[0]
-                            else: continue
-                        
-                        exists = db.query(Absence).filter(Absence.staff_id == staff_id, Absence.date == target_date).first()
+                            counts["unresolved"] += 1
+                            unresolved.add(name)
+                            continue
                         
-                        if not exists:
-                            db.add(Absence(staff_id=staff_id, date=target_date, start_period=start_p, end_period=end_p, reason=f"Legacy: {s_orig[:50]}"))
+                        if (staff_id, target_date) in seen:
+                            counts["skipped"] += 1
+                            continue
+                        seen.add((staff_id, target_date))
+                        new_absences.append({
+                            "staff_id": staff_id,
+                            "date": target_date,
+                            "start_period": start_p,
+                            "end_period": end_p,
+                            "reason": f"Legacy: {s_orig[:50]}"
+                        })
+
+        if new_absences:
+            db.bulk_insert_mappings(Absence, new_absences)
         db.commit()
+        counts["inserted"] = len(new_absences)
+        print(f"Legacy absences: {counts['inserted']} inserted, {counts['skipped']} skipped (already recorded), "
+              f"{counts['unresolved']} unresolved names")
+        if unresolved:
+            print(f"  Unresolved: {', '.join(sorted(unresolved))}")
     except Exception as e:
         print(f"Error: {e}")
         db.rollback()
     finally:
+        if wb is not None:
+            wb.close()
         db.close()
+    return counts
 
 if __name__ == "__main__":
     normalize_legacy_absences()
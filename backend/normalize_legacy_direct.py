@@ -2,26 +2,18 @@ import openpyxl
 import os
 import re
 import sqlite3
+import sys
 from datetime import datetime
 
+# Allow running directly as a script
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.staff_names import StaffNameResolver, LEGACY_DIRECT_RULES
+
 EXCEL_PATH = r"c:\Users\rob_b\Rota\temp_rota.xlsx"
 DB_PATH = r"c:\Users\rob_b\Rota\rota.db"
 LOG_PATH = r"c:\Users\rob_b\Rota\backend\legacy_direct_log.txt"
 
-def clean_staff_name(name):
-    if not name: return None
-    n = str(name).strip().split('(')[0].strip()
-    n = re.sub(r'(\d+\.\d+|pm|am|late|from|0\.5|half|\.|\?)', '', n, flags=re.IGNORECASE).strip()
-    if not n or len(n) < 2: return None
-    
-    nl = n.lower()
-    if "jactina" in nl: return "Jacinta"
-    if "nokkeaw" in nl: return "Nokkaew"
-    if "nick" in nl and ("c" in nl or nl == "nick"): return "Nick C"
-    if "soe" in nl and len(nl) < 6: return "Soe"
-    if nl == "darryl": return "Daryl"
-    return n
-
 def parse_date(date_str):
     match = re.search(r'(\d+)/(\d+)', date_str)
     if not match: return None
@@ -40,6 +32,7 @@ def run_direct():
             # Get staff mapping
             cursor.execute("SELECT id, name FROM staff")
             staff_map = {row[1].lower(): row[0] for row in cursor.fetchall()}
+            resolver = StaffNameResolver(staff=staff_map, **LEGACY_DIRECT_RULES)
             log.write(f"Loaded {len(staff_map)} staff from DB.\n")
             
             wb = openpyxl.load_workbook(EXCEL_PATH, data_only=True)
@@ -75,15 +68,12 @@ def run_direct():
                         names = [n.strip() for n in re.split(r'[,\n]', s_clean)]
                         
                         for raw_n in names:
-                            cn = clean_staff_name(raw_n)
+                            cn = resolver.clean(raw_n)
                             if not cn: continue
                             
-                            sid = staff_map.get(cn.lower())
-                            if not sid:
-                                # Loose match
-                                match = [s_id for s_name, s_id in staff_map.items() if s_name in cn.lower() or cn.lower() in s_name]
-                                if match: sid = match[0]
-                                else: continue
+                            # Exact name, then loose (trie/fuzzy) match
+                            sid = resolver.resolve(cn)
+                            if not sid: continue
                             
                             cursor.execute("SELECT id FROM absences WHERE staff_id=? AND date=?", (sid, target_date))
                             if not cursor.fetchone():
@@ -0,0 +1,205 @@
+"""
+Exact report figures straight from SQL.
+
+/generate-report used to paste the last 1000 absences and covers into the
+prompt and let the model count. The common questions (who is off most,
+who covers most, which periods need cover, over what dates) are answered
+here with GROUP BY queries over a date window, so the model only receives
+a small table of exact numbers. Every query filters on absences.date
+(indexed), which bounds the work by the window rather than the history.
+"""
+
+import os
+import datetime
+import pandas as pd
+from sqlalchemy import func, distinct
+from sqlalchemy.orm import aliased
+
+from .database import Staff, Absence, Cover
+from .cover_stats import cover_loads, RECENT_WEEKS
+
+# Window used when the caller gives no start date, ending at the latest absence
+REPORT_DEFAULT_DAYS = int(os.getenv("REPORT_DEFAULT_DAYS", "365"))
+
+# Rough size limit for the tables sent to the model, at about 4 characters
+# per token. The per-staff tables grow with the staff list; past the budget
+# each keeps only its top rows.
+REPORT_TOKEN_BUDGET = int(os.getenv("REPORT_TOKEN_BUDGET", "1500"))
+CHARS_PER_TOKEN = 4
+
+# SQLite strftime('%w'): 0 = Sunday
+WEEKDAYS = {1: "Monday", 2: "Tuesday", 3: "Wednesday", 4: "Thursday", 5: "Friday", 6: "Saturday", 0: "Sunday"}
+
+
+def report_window(db, start=None, end=None):
+    """
+    (start, end) dates for a report. Missing ends default to the latest
+    absence on record and REPORT_DEFAULT_DAYS before it; (None, None) if
+    there are no absences at all.
+    """
+    end_dt = pd.to_datetime(end).date() if end else db.query(func.max(Absence.date)).scalar()
+    if end_dt is None:
+        return None, None
+    if isinstance(end_dt, str):
+        end_dt = pd.to_datetime(end_dt).date()
+    start_dt = pd.to_datetime(start).date() if start else end_dt - datetime.timedelta(days=REPORT_DEFAULT_DAYS - 1)
+    return start_dt, end_dt
+
+
+def _in_window(query, start, end):
+    return query.filter(Absence.date >= start, Absence.date <= end)
+
+
+def window_totals(db, start, end):
+    """Absences, absent periods, covers and distinct dates in the window."""
+    absences, periods, days, first, last = _in_window(db.query(
+        func.count(Absence.id),
+        func.coalesce(func.sum(Absence.end_period - Absence.start_period + 1), 0),
+        func.count(distinct(Absence.date)),
+        func.min(Absence.date),
+        func.max(Absence.date),
+    ), start, end).one()
+    covers = _in_window(db.query(func.count(Cover.id)).select_from(Cover).join(Absence, Cover.absence_id == Absence.id), start, end).scalar()
+    return {
+        "absences": absences,
+        "absent_periods": periods,
+        "covers": covers,
+        "days_with_absences": days,
+        "first_absence": str(first) if first else None,
+        "last_absence": str(last) if last else None,
+    }
+
+
+def absences_per_staff(db, start, end):
+    """[{name, absences, periods, first, last}], most absences first."""
+    count = func.count(Absence.id)
+    rows = _in_window(db.query(
+        Staff.name, count,
+        func.sum(Absence.end_period - Absence.start_period + 1),
+        func.min(Absence.date), func.max(Absence.date),
+    ).select_from(Absence).join(Staff, Absence.staff_id == Staff.id), start, end).group_by(Staff.id).order_by(count.desc(), Staff.name).all()
+    return [
+        {"name": name, "absences": n, "periods": periods, "first": str(first), "last": str(last)}
+        for name, n, periods, first, last in rows
+    ]
+
+
+def covers_per_staff(db, start, end):
+    """[{name, covers, colleagues}], most covers first. colleagues = distinct staff covered for."""
+    count = func.count(Cover.id)
+    rows = _in_window(db.query(
+        Staff.name, count, func.count(distinct(Absence.staff_id)),
+    ).select_from(Cover).join(Staff, Cover.covering_staff_id == Staff.id)
+     .join(Absence, Cover.absence_id == Absence.id), start, end).group_by(Staff.id).order_by(count.desc(), Staff.name).all()
+    return [{"name": name, "covers": n, "colleagues": colleagues} for name, n, colleagues in rows]
+
+
+def cover_pairs(db, start, end, limit=10):
+    """Most frequent (covering staff, absent staff) pairs."""
+    covering, absent = aliased(Staff), aliased(Staff)
+    count = func.count(Cover.id)
+    rows = _in_window(db.query(covering.name, absent.name, count).select_from(Cover)
+        .join(covering, Cover.covering_staff_id == covering.id)
+        .join(Absence, Cover.absence_id == Absence.id)
+        .join(absent, Absence.staff_id == absent.id), start, end) \
+        .group_by(covering.id, absent.id).order_by(count.desc(), covering.name, absent.name).limit(limit).all()
+    return [{"covering": c, "absent": a, "covers": n} for c, a, n in rows]
+
+
+def period_heatmap(db, start, end):
+    """{weekday: {period: covers}} for the window."""
+    weekday = func.strftime('%w', Absence.date)
+    rows = _in_window(db.query(weekday, Cover.period, func.count(Cover.id)).select_from(Cover)
+        .join(Absence, Cover.absence_id == Absence.id), start, end) \
+        .group_by(weekday, Cover.period).all()
+    heatmap = {}
+    for wd, period, n in rows:
+        day = WEEKDAYS.get(int(wd), wd) if wd is not None else "Unknown"
+        heatmap.setdefault(day, {})[period] = n
+    return heatmap
+
+
+def recent_cover_load(db, end, weeks=RECENT_WEEKS):
+    """
+    [{name, covers, periods, last_cover}] for the weeks up to end, read from
+    the materialised cover_stats rather than the cover history.
+    """
+    loads = cover_loads(db, end - datetime.timedelta(weeks=weeks - 1), end)
+    if not loads:
+        return []
+    names = dict(db.query(Staff.id, Staff.name).filter(Staff.id.in_(loads)).all())
+    rows = [
+        {"name": names[sid], "covers": l["covers"], "periods": l["periods"], "last_cover": str(l["last_cover_date"])}
+        for sid, l in loads.items() if sid in names
+    ]
+    return sorted(rows, key=lambda r: (-r["periods"], r["name"]))
+
+
+def build_report(db, start=None, end=None):
+    """All report figures for a window, as plain data."""
+    start_dt, end_dt = report_window(db, start, end)
+    if start_dt is None:
+        return {"start": None, "end": None, "totals": {}, "absences_per_staff": [],
+                "covers_per_staff": [], "cover_pairs": [], "period_heatmap": {}, "recent_cover_load": []}
+    return {
+        "start": str(start_dt),
+        "end": str(end_dt),
+        "totals": window_totals(db, start_dt, end_dt),
+        "absences_per_staff": absences_per_staff(db, start_dt, end_dt),
+        "covers_per_staff": covers_per_staff(db, start_dt, end_dt),
+        "cover_pairs": cover_pairs(db, start_dt, end_dt),
+        "period_heatmap": period_heatmap(db, start_dt, end_dt),
+        "recent_cover_load": recent_cover_load(db, end_dt),
+    }
+
+
+def format_report(data, budget=REPORT_TOKEN_BUDGET):
+    """
+    Compact pipe-separated tables for the model. When the text would exceed
+    budget tokens, the per-staff tables (already ranked, highest first) are
+    all cut to the largest common number of top rows that fits; the window,
+    totals, top pairs and heatmap are always sent whole.
+    """
+    if data["start"] is None:
+        return "No absences on record."
+    t = data["totals"]
+    head = [
+        f"Window: {data['start']} to {data['end']}",
+        f"Totals: absences {t['absences']}, absent periods {t['absent_periods']}, covers {t['covers']}, "
+        f"days with absences {t['days_with_absences']}",
+    ]
+
+    heatmap = data["period_heatmap"]
+    periods = sorted({p for row in heatmap.values() for p in row if p is not None})
+    days = [d for d in WEEKDAYS.values() if d in heatmap] + [d for d in heatmap if d not in WEEKDAYS.values()]
+
+    # (title, rows, cut to the budget?)
+    sections = [
+        ("Absences per staff (name | absences | periods | first | last):",
+         [f"{r['name']} | {r['absences']} | {r['periods']} | {r['first']} | {r['last']}" for r in data["absences_per_staff"]], True),
+        ("Covers per staff (name | covers | colleagues covered):",
+         [f"{r['name']} | {r['covers']} | {r['colleagues']}" for r in data["covers_per_staff"]], True),
+        ("Top cover pairs (covering | absent | covers):",
+         [f"{r['covering']} | {r['absent']} | {r['covers']}" for r in data["cover_pairs"]], False),
+        (f"Cover load, last {RECENT_WEEKS} weeks to {data['end']} (name | covers | periods | last cover):",
+         [f"{r['name']} | {r['covers']} | {r['periods']} | {r['last_cover']}" for r in data["recent_cover_load"]], True),
+        ("Covers by day and period (day | " + " | ".join(f"P{p}" for p in periods) + "):",
+         [f"{day} | " + " | ".join(str(heatmap[day].get(p, 0)) for p in periods) for day in days], False),
+    ]
+
+    def render(keep):
+        lines = list(head)
+        for title, rows, cut in sections:
+            shown = rows[:keep] if cut else rows
+            lines += ["", title] + shown
+            if len(shown) < len(rows):
+                lines.append(f"({len(rows) - len(shown)} more omitted; the totals include them)")
+        return "\n".join(lines)
+
+    # Deterministic: the same data and budget always give the same text
+    keep = max((len(rows) for _, rows, cut in sections if cut), default=0)
+    text = render(keep)
+    while keep > 0 and len(text) > budget * CHARS_PER_TOKEN:
+        keep -= 1
+        text = render(keep)
+    return text
@@ -0,0 +1,122 @@
+"""
+Header detection for the timetable workbook.
+
+Finds the day columns and period rows of a sheet with one precompiled
+regex per job and a single pass over each row.
+"""
+
+import re
+from collections import namedtuple
+
+DAYS_LIST = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday']
+_DAY_ORDER = {d.lower(): i for i, d in enumerate(DAYS_LIST)}
+
+DAY_RE = re.compile("|".join(d.lower() for d in DAYS_LIST))
+# Standalone period number, P1, P.1 or Period 1, e.g. "1", "Period 1 (8:30)"
+PERIOD_RE = re.compile(r'(?:^|\b)(?:period\s*|p\.?\s*|)([1-8])(?:\b|$)')
+
+# How far down the sheet headers are searched
+HEADER_ROWS = 20
+# Only the first few columns hold period labels
+PERIOD_COLS = 5
+
+StaffLayout = namedtuple("StaffLayout", ["day_cols", "header_row_idx", "period_rows"])
+
+
+def days_in(text):
+    """Day names contained in a lower-case string, in Monday..Friday order."""
+    found = set(DAY_RE.findall(text))
+    return sorted(found, key=_DAY_ORDER.get)
+
+
+def periods_in(text):
+    """Period numbers (1-8) a lower-case label refers to, ascending."""
+    return sorted({int(p) for p in PERIOD_RE.findall(text)})
+
+
+def find_day_columns(grid, max_rows=HEADER_ROWS, max_len=15, min_days=3):
+    """
+    Finds the day header of a timetable. Cells naming a day ("Monday",
+    "Monday 25th") map that day to their 1-based column; cells of max_len
+    characters or more are ignored (None disables the limit). Stops at the
+    first row that contains a day once min_days days have been seen.
+    Returns ({day: col}, header_row_idx), header_row_idx being the index
+    of the row after the header, or ({...}, None) if no row qualified.
+    """
+    day_cols = {}
+    for r_idx, row in enumerate(grid[:max_rows]):
+        found_in_row = False
+        for c_idx, val in enumerate(row):
+            if not val: continue
+            val_str = str(val).strip().lower()
+            if max_len is not None and len(val_str) >= max_len: continue
+            for d in days_in(val_str):
+                day_cols[d.capitalize()] = c_idx + 1
+                found_in_row = True
+        if found_in_row and len(day_cols) >= min_days:
+            return day_cols, r_idx + 1
+    return day_cols, None
+
+
+def find_period_rows(grid, max_cols=PERIOD_COLS):
+    """
+    Finds the row index labelled with each period 1-8 in the first max_cols
+    columns. A label naming several periods goes to the lowest one not yet
+    found, as in the original per-period scan.
+    """
+    period_rows = {}
+    for r_idx, row in enumerate(grid):
+        for val in row[:max_cols]:
+            if val is None: continue
+            for p_num in periods_in(str(val).strip().lower()):
+                if p_num not in period_rows:
+                    period_rows[p_num] = r_idx
+                    break
+        if len(period_rows) == 8:
+            break
+    return period_rows
+
+
+def find_duty_day_columns(grid, max_rows=HEADER_ROWS):
+    """
+    Duty rotas (TB1/EY): the header is the first row with a "Monday" cell.
+    Returns ({day: 1-based col}, header_row_idx) or ({}, None).
+    """
+    for r_idx, row in enumerate(grid[:max_rows]):
+        if "monday" not in [str(c).lower() for c in row if c]:
+            continue
+        day_cols = {}
+        for c_idx, val in enumerate(row):
+            if not val: continue
+            for d in days_in(str(val).strip().lower()):
+                day_cols[d.capitalize()] = c_idx + 1
+        return day_cols, r_idx + 1
+    return {}, None
+
+
+def find_day_pairs(grid, max_rows=HEADER_ROWS):
+    """
+    CCA tab: each day heads a pair of columns, club name then staff.
+    Returns ({day: {'act_col': idx, 'staff_col': idx + 1}}, header_row_idx)
+    with 0-based columns, or ({}, None).
+    """
+    for r_idx, row in enumerate(grid[:max_rows]):
+        row_vals = [str(c).lower() if c else "" for c in row]
+        pairs = {}
+        for d in DAYS_LIST:
+            if d.lower() in row_vals:
+                c_idx = row_vals.index(d.lower())
+                pairs[d] = {'act_col': c_idx, 'staff_col': c_idx + 1}
+        if pairs:
+            return pairs, r_idx + 1
+    return {}, None
+
+
+def staff_sheet_layout(grid):
+    """
+    Day columns and period rows of a staff timetable grid. Not cached: the
+    cells that would form a key are the timetable itself, so no two tabs
+    (or two imports of an edited tab) would ever share an entry.
+    """
+    day_cols, header_row_idx = find_day_columns(grid)
+    return StaffLayout(day_cols, header_row_idx, find_period_rows(grid))
@@ -0,0 +1,239 @@
+"""
+Canonical staff names.
+
+Every importer used to carry its own copy of clean_staff_name. The copies
+differ slightly (what counts as noise, which typos are folded), so each
+keeps its rules as a preset below, but they all run through one
+StaffNameResolver that precompiles those rules and memoises results.
+
+A resolver can also be loaded with the known staff, to map a cleaned name
+to a staff ID through an exact dict, a prefix trie over the words of every
+staff name, and a bounded fuzzy fallback.
+"""
+
+import re
+import difflib
+from functools import lru_cache
+
+# Things that are definitely NOT staff
+IGNORED_NAMES = [
+    "TBC", "External", "Coach", "Room", "Music Room", "Hall",
+    "Gym", "Pitch", "Court", "Pool", "Library", "PRE NURSERY", "PRE NUSERY", "Outside Prov.",
+    "**", "gate", "locked", "at", "8.30", "1", "Calire", "?"
+]
+
+# Title prefixes like "Mr", "Mrs", "Ms", "Miss", "K.", "Kun ", "K "
+TITLE_PREFIXES = r'^(mr|mrs|ms|miss|k\.|kun\s|k\s)\s*'
+THAI_PREFIXES = r'^(k\.|kun\s|k\s)'
+# Time/half-day notes in the absence record ("pm", "late", "0.5")
+ABSENCE_NOTES = r'(\d+\.\d+|pm|am|late|from|0\.5|half|\.|\?)'
+
+# Typos and duplicates: ("contains" | "equals", lower-case text, canonical name)
+# Rules apply in order, the first match wins.
+# A fourth element limits "contains" to names shorter than that.
+ALIASES = [
+    ("contains", "jactina", "Jacinta"),
+    ("contains", "nokkeaw", "Nokkaew"),
+    ("contains", "nick", "Nick C"),
+    ("equals", "darryl", "Daryl"),
+]
+
+# normalize.py: the timetable import
+IMPORT_RULES = dict(
+    ignored=IGNORED_NAMES,
+    prefixes=TITLE_PREFIXES,
+    aliases=ALIASES + [
+        ("contains", "jinny", "Jinny"),
+        ("contains", "ginny", "Jinny"),
+        ("equals", "janel", "Janel"),
+    ],
+    min_length=2,
+    empty="",
+)
+
+# normalize_legacy.py: the absence record, where cells carry notes
+LEGACY_RULES = dict(
+    ignored=[i for i in IGNORED_NAMES + ["Mr", "pd", "consulate", "cons", "pl", "dl"] if len(i) > 2],
+    ignore_match="substring",
+    ignore_after_cleanup=True,
+    strip=ABSENCE_NOTES,
+    aliases=ALIASES + [
+        ("contains", "soe", "Soe", 6),
+        ("equals", "ginny", "Jinny"),
+        ("equals", "anniina", "Anniina"),
+    ],
+    min_length=2,
+)
+
+# normalize_legacy_direct.py: same as LEGACY_RULES without the ignore list
+LEGACY_DIRECT_RULES = dict(
+    strip=ABSENCE_NOTES,
+    aliases=ALIASES + [("contains", "soe", "Soe", 6)],
+    min_length=2,
+)
+
+# fix_duplicates.py: merging staff rows already in the database
+MERGE_RULES = dict(
+    ignored=IGNORED_NAMES + ["Mr"],
+    ignore_match="substring",
+    prefixes=THAI_PREFIXES,
+    aliases=ALIASES + [
+        ("equals", "ginny", "Jinny"),
+        ("equals", "jinny", "Jinny"),
+        ("equals", "janel", "Janel"),
+    ],
+    empty="",
+)
+
+# target_update_p1.py: matching Firestore staff to workbook tabs
+SHEET_MATCH_RULES = dict(
+    prefixes=TITLE_PREFIXES,
+    aliases=[
+        ("contains", "jinny", "Jinny"),
+        ("contains", "ginny", "Jinny"),
+    ],
+    empty="",
+)
+
+# Unique fuzzy matches only, and only this close
+FUZZY_CUTOFF = 0.85
+CACHE_SIZE = 4096
+
+
+class StaffNameResolver:
+    """
+    Cleans raw names into canonical ones and resolves them to known staff.
+
+    Cleaning runs: strip -> ignore check on the raw text -> drop title prefix
+    -> drop "(...)" -> drop notes -> minimum length -> ignore check on the
+    cleaned text -> aliases. Each step is optional and set by the rules.
+    """
+
+    def __init__(self, ignored=(), ignore_match="exact", ignore_after_cleanup=False,
+                 prefixes=None, strip=None, aliases=(), min_length=None, empty=None, staff=None):
+        ignored = [i.lower() for i in ignored]
+        self._ignored_set = frozenset(ignored) if ignore_match == "exact" else None
+        self._ignored_re = None
+        if ignore_match == "substring" and ignored:
+            self._ignored_re = re.compile("|".join(re.escape(i) for i in ignored))
+        self._ignore_after_cleanup = ignore_after_cleanup
+        self._prefix_re = re.compile(prefixes, re.IGNORECASE) if prefixes else None
+        self._strip_re = re.compile(strip, re.IGNORECASE) if strip else None
+        self._min_length = min_length
+        self._empty = empty
+
+        self._aliases = tuple(aliases)
+        self._alias_equals = {}
+        for kind, text, target, *_ in aliases:
+            if kind == "equals":
+                self._alias_equals.setdefault(text, target)
+        contains = [re.escape(text) for kind, text, *_ in aliases if kind == "contains"]
+        self._alias_re = re.compile("|".join(contains)) if contains else None
+
+        self.clean = lru_cache(maxsize=CACHE_SIZE)(self._clean)
+        self.load_staff(staff or {})
+
+    def _is_ignored(self, n):
+        nl = n.lower()
+        if self._ignored_set is not None:
+            return nl in self._ignored_set
+        return bool(self._ignored_re and self._ignored_re.search(nl))
+
+    def _alias(self, nl):
+        # Cheap reject: no alias text appears at all
+        if nl not in self._alias_equals and not (self._alias_re and self._alias_re.search(nl)):
+            return None
+        for kind, text, target, *limit in self._aliases:
+            if kind == "equals":
+                if nl == text:
+                    return target
+            elif text in nl and (not limit or len(nl) < limit[0]):
+                return target
+        return None
+
+    def _clean(self, name):
+        if not name: return self._empty
+        n = str(name).strip()
+
+        if not self._ignore_after_cleanup and self._is_ignored(n):
+            return None
+
+        if self._prefix_re:
+            n = self._prefix_re.sub('', n, count=1).strip()
+        # Remove brackets and content e.g. "Charlotte (Thu)" -> "Charlotte"
+        n = n.split('(')[0].strip()
+        if self._strip_re:
+            n = self._strip_re.sub('', n).strip()
+
+        if self._min_length is not None and len(n) < self._min_length:
+            return None
+        if self._ignore_after_cleanup and self._is_ignored(n):
+            return None
+
+        alias = self._alias(n.lower())
+        return alias if alias is not None else n
+
+    def load_staff(self, staff):
+        """
+        Indexes the known staff ({name: staff_id}, earlier entries win ties)
+        for resolve(). Every word of a name starts a trie path, so "ben"
+        reaches both "Ben S" and "Mr Ben".
+        """
+        self._exact = {}
+        self._order = {}
+        self._trie = {}
+        for order, (name, staff_id) in enumerate(staff.items()):
+            key = name.lower()
+            if key in self._exact:
+                continue
+            self._exact[key] = staff_id
+            self._order[key] = order
+            for start in _word_starts(key):
+                node = self._trie
+                for ch in key[start:]:
+                    node = node.setdefault(ch, {})
+                    # Earliest name with a word starting along this path
+                    node.setdefault(_BEST, key)
+                if start == 0:
+                    node.setdefault(_NAME, key)
+        self._names = list(self._exact)
+        self.resolve = lru_cache(maxsize=CACHE_SIZE)(self._resolve)
+
+    def _resolve(self, name):
+        """Staff ID for a cleaned name, or None. Replaces the old O(n) substring scan."""
+        if not name: return None
+        key = name.lower()
+        if key in self._exact:
+            return self._exact[key]
+
+        candidates = []
+        for start in _word_starts(key):
+            node = self._trie
+            for ch in key[start:]:
+                node = node.get(ch)
+                if node is None:
+                    break
+                # A whole staff name sits inside the name ("faye late")
+                if _NAME in node:
+                    candidates.append(node[_NAME])
+            else:
+                # The name sits inside a staff name ("ben" -> "Mr Ben")
+                if start == 0:
+                    candidates.append(node[_BEST])
+        if candidates:
+            return self._exact[min(candidates, key=self._order.get)]
+
+        # Bounded fuzzy fallback: only a single close match is trusted
+        close = difflib.get_close_matches(key, self._names, n=2, cutoff=FUZZY_CUTOFF)
+        if len(close) == 1:
+            return self._exact[close[0]]
+        return None
+
+
+# Trie node markers (never valid characters)
+_BEST = None
+_NAME = 0
+
+
+def _word_starts(text):
+    return [0] + [m.end() for m in re.finditer(r'\s+', text)]
@@ -1,12 +1,17 @@
 
 import openpyxl
 import os
+from backend.sheet_layout import find_day_pairs
 
 def check_layout():
     wb = openpyxl.load_workbook(r"c:\Users\rob_b\Rota\temp_rota.xlsx", data_only=True)
     sheet = wb["CCA"]
-    for r_idx, row in enumerate(sheet.iter_rows(max_row=20, values_only=True)):
+    grid = list(sheet.iter_rows(max_row=20, values_only=True))
+    for r_idx, row in enumerate(grid):
         print(f"R{r_idx+1}: {row}")
 
+    pairs, header_row_idx = find_day_pairs(grid)
+    print(f"Detected CCA Mapping: {pairs} (Header Row: {header_row_idx})")
+
 if __name__ == "__main__":
     check_layout()
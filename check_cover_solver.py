@@ -0,0 +1,154 @@
+import os
+import sys
+import time
+import random
+import itertools
+
+# Ensure backend folder is in path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from backend.cover_solver import solve_slots, suggest_cover, score_candidate, LOAD_STEP
+
+ACTIVITIES = ["Year 4 Lesson", "Meeting with Head", "Planning", "Music", "6RG Maths"]
+SUBJECTS = ["Music teacher", "PE specialist", "Maths lead", "Year 2 teacher", None]
+
+
+def random_profile(rng, i, periods=range(1, 9)):
+    free, busy, calendar = [], {}, {}
+    for p in periods:
+        roll = rng.random()
+        if roll < 0.35:
+            free.append(p)
+            if rng.random() < 0.2:
+                calendar[p] = rng.choice(ACTIVITIES)
+        elif roll < 0.85:
+            busy[p] = rng.choice(ACTIVITIES)
+        elif rng.random() < 0.5:
+            calendar[p] = rng.choice(ACTIVITIES)
+    return {
+        "name": f"Staff {i}",
+        "profile": rng.choice(SUBJECTS),
+        "is_priority": rng.random() < 0.15,
+        "is_specialist": rng.random() < 0.25,
+        "can_cover_periods": rng.random() < 0.85,
+        "week_cover_periods": rng.choice([0, 0, 1, 3, 6]),
+        "free_periods": free,
+        "busy_periods": busy,
+        "calendar_events": calendar,
+    }
+
+
+def random_slots(rng, count):
+    # Several absences can need the same period, so keys are (absence, period)
+    return [
+        {"key": (a, p), "period": p, "activity": rng.choice(ACTIVITIES + [None])}
+        for a, p in rng.sample([(a, p) for a in range(3) for p in range(1, 9)], count)
+    ]
+
+
+def brute_force(slots, profiles, existing_load, allow_teaching):
+    """(slots covered, best total score) by trying every assignment."""
+    options = []
+    for slot in slots:
+        scored = [(pi, s[0]) for pi, prof in enumerate(profiles)
+                  if (s := score_candidate(prof, slot["period"], slot.get("activity")))
+                  and (allow_teaching or "busy_teaching" not in s[1])]
+        options.append([None] + scored)
+
+    best = None
+    for combo in itertools.product(*options):
+        taken = set()
+        load = {}
+        total = covered = 0
+        ok = True
+        for slot, choice in zip(slots, combo):
+            if choice is None:
+                continue
+            pi, score = choice
+            if (pi, slot["period"]) in taken:
+                ok = False
+                break
+            taken.add((pi, slot["period"]))
+            name = profiles[pi]["name"]
+            already = existing_load.get(name, 0) + load.get(name, 0)
+            total += score - LOAD_STEP * already
+            load[name] = load.get(name, 0) + 1
+            covered += 1
+        if ok and (best is None or (covered, total) > best):
+            best = (covered, total)
+    return best
+
+
+def check_plan_is_consistent(plan, slots, profiles, allow_teaching=False):
+    by_key = {s["key"]: s for s in slots}
+    seen = set()
+    for key, a in plan["assignments"].items():
+        assert allow_teaching or "busy_teaching" not in a["breakdown"], a
+        assert (a["name"], a["period"]) not in seen, f"{a['name']} booked twice in period {a['period']}"
+        seen.add((a["name"], a["period"]))
+        assert a["period"] == by_key[key]["period"]
+        profile = next(p for p in profiles if p["name"] == a["name"])
+        assert score_candidate(profile, a["period"], by_key[key].get("activity")) is not None
+    assert set(plan["assignments"]) | set(plan["unassigned"]) == set(by_key)
+    assert set(plan["notes"]) <= set(plan["unassigned"])
+
+
+def check_optimal_small_cases(cases=300):
+    rng = random.Random(20250310)
+    for case in range(cases):
+        profiles = [random_profile(rng, i) for i in range(rng.randint(1, 4))]
+        slots = random_slots(rng, rng.randint(1, 5))
+        existing_load = {p["name"]: rng.choice([0, 0, 1, 2]) for p in profiles}
+
+        for allow_teaching in (False, True):
+            plan = solve_slots(slots, profiles, existing_load, allow_teaching=allow_teaching)
+            check_plan_is_consistent(plan, slots, profiles, allow_teaching)
+            expected = brute_force(slots, profiles, existing_load, allow_teaching)
+            got = (len(plan["assignments"]), plan["total_score"])
+            assert got == expected, (case, allow_teaching, got, expected, slots, profiles, existing_load)
+
+
+def check_rules():
+    claire = {"name": "Claire", "is_priority": True, "free_periods": [1, 2]}
+    billy = {"name": "Billy", "is_specialist": True, "free_periods": [1, 2]}
+    ta = {"name": "Pat", "can_cover_periods": False, "free_periods": [1, 2, 9]}
+    teacher = {"name": "Faye", "busy_periods": {"2": "Year 4 Lesson"}}
+
+    # Priority outweighs the load step: Claire twice (140 + 125) beats Claire and Billy (140 + 120)
+    plan = suggest_cover([1, 2], [ta, billy, claire])
+    assert [a["name"] for _, a in sorted(plan["assignments"].items())] == ["Claire", "Claire"], plan
+    # Between equals the load step spreads the day
+    plan = suggest_cover([1, 2], [claire, {**claire, "name": "Jill"}])
+    assert sorted(a["name"] for a in plan["assignments"].values()) == ["Claire", "Jill"], plan
+    # TAs never take teaching periods. Nobody is pulled from their class by default:
+    # the slot stays unassigned and names who could be
+    plan = suggest_cover([2], [ta, teacher])
+    assert plan["unassigned"] == [2] and plan["notes"] == {2: ["only by pulling from class: Faye ('Year 4 Lesson')"]}, plan
+    plan = suggest_cover([2], [ta, teacher], allow_teaching=True)
+    assert plan["assignments"][2]["name"] == "Faye" and "busy_teaching" in plan["assignments"][2]["breakdown"]
+    assert plan["notes"] == {}
+    assert suggest_cover([1], [ta])["unassigned"] == [1]
+    assert suggest_cover([9], [ta])["assignments"][9]["name"] == "Pat"
+
+
+def check_large_instance():
+    rng = random.Random(7)
+    profiles = [random_profile(rng, i, periods=range(1, 13)) for i in range(150)]
+    slots = [{"key": (a, p), "period": p, "activity": rng.choice(ACTIVITIES)} for a in range(8) for p in range(1, 9)]
+    existing_load = {p["name"]: rng.choice([0, 0, 1]) for p in profiles}
+
+    started = time.perf_counter()
+    plan = solve_slots(slots, profiles, existing_load)
+    elapsed = time.perf_counter() - started
+    check_plan_is_consistent(plan, slots, profiles)
+    print(f"Large instance: {len(profiles)} staff, {len(slots)} slots, "
+          f"{len(plan['assignments'])} covered in {elapsed:.2f}s")
+    assert not plan["unassigned"], plan["unassigned"]
+    assert elapsed < 5, f"solver took {elapsed:.2f}s"
+
+
+if __name__ == "__main__":
+    check_rules()
+    check_optimal_small_cases()
+    check_large_instance()
+    print("OK: cover solver checks passed")
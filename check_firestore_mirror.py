@@ -0,0 +1,178 @@
+import os
+import sys
+import datetime
+from types import SimpleNamespace
+from zoneinfo import ZoneInfo
+
+# Ensure backend folder is in path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from backend import database_firestore
+from backend.database_firestore import FirestoreMirror, school_today
+
+TODAY = "2025-03-10"
+TOMORROW = "2025-03-11"
+
+
+class FakeRef:
+    """Document or collection reference: just an id and a parent."""
+    def __init__(self, id, parent=None):
+        self.id = id
+        self.parent = parent
+
+
+class FakeDoc:
+    def __init__(self, path, data):
+        # path like "staff/s1/schedules/m1": alternating collection/document ids
+        parts = path.split("/")
+        ref = None
+        for part in parts:
+            ref = FakeRef(part, ref)
+        self.id = parts[-1]
+        self.reference = ref
+        self._data = dict(data)
+
+    def to_dict(self):
+        return dict(self._data)
+
+
+def change(kind, path, data=None):
+    return SimpleNamespace(type=SimpleNamespace(name=kind), document=FakeDoc(path, data or {}))
+
+
+class FakeWatch:
+    def __init__(self, listeners, key, callback):
+        self.listeners, self.key, self.callback = listeners, key, callback
+        self.active = True
+
+    def unsubscribe(self):
+        self.active = False
+        self.listeners.remove(self)
+
+
+class FakeQuery:
+    def __init__(self, client, key):
+        self.client, self.key = client, key
+
+    def where(self, field, op, value):
+        return FakeQuery(self.client, self.key + ((field, op, value),))
+
+    def on_snapshot(self, callback):
+        watch = FakeWatch(self.client.listeners, self.key, callback)
+        self.client.listeners.append(watch)
+        return watch
+
+
+class FakeFirestore:
+    """Just enough of the client for FirestoreMirror: queries that can be watched."""
+    def __init__(self):
+        self.listeners = []
+
+    def collection(self, name):
+        return FakeQuery(self, ("collection", name))
+
+    def collection_group(self, name):
+        return FakeQuery(self, ("group", name))
+
+    def watches(self, kind, name, date=None):
+        key = (kind, name) + ((("date", "==", date),) if date else ())
+        return [w for w in self.listeners if w.key == key]
+
+    def push(self, kind, name, changes, date=None):
+        """Delivers a snapshot to every active listener on the query."""
+        watches = self.watches(kind, name, date)
+        assert watches, (kind, name, date, [w.key for w in self.listeners])
+        for watch in watches:
+            watch.callback(None, changes, None)
+
+
+def check_school_today():
+    # 22:00 UTC on 9 March is 05:00 on 10 March at school, the start of the absence rush
+    rush = datetime.datetime(2025, 3, 9, 22, 0, tzinfo=datetime.timezone.utc)
+    if "SCHOOL_TIMEZONE" not in os.environ:
+        assert database_firestore.SCHOOL_TIMEZONE == "Asia/Bangkok"
+    assert school_today(rush) == "2025-03-10"
+    assert school_today(rush - datetime.timedelta(hours=5, minutes=1)) == "2025-03-09"  # 23:59 local
+    # London (the old default) is still on the 9th, so the mirror would watch yesterday through the rush
+    assert rush.astimezone(ZoneInfo("Europe/London")).strftime('%Y-%m-%d') == "2025-03-09"
+
+
+def check_snapshots(client, mirror):
+    # Nothing is served until each listener's initial snapshot has arrived
+    assert mirror.read_staff() is None and mirror.read_absences(TODAY) is None
+
+    client.push("collection", "staff", [change("ADDED", "staff/s1", {"name": "Jill"}),
+                                        change("ADDED", "staff/s2", {"name": "Gaz"})])
+    client.push("group", "schedules", [change("ADDED", "staff/s1/schedules/m1", {"day_of_week": "Monday", "period": 1}),
+                                       change("ADDED", "staff/s1/schedules/t1", {"day_of_week": "Tuesday", "period": 1})])
+    client.push("collection", "absences", [change("ADDED", "absences/a1", {"staff_id": "s2", "date": TODAY})], TODAY)
+    assert mirror.read_absences(TODAY) is None, "covers not warm yet"
+    client.push("group", "covers", [change("ADDED", "absences/a1/covers/c1",
+                                           {"period": 2, "covering_staff_id": "s1", "absence_id": "a1", "date": TODAY})], TODAY)
+
+    assert sorted(s["name"] for s in mirror.read_staff()) == ["Gaz", "Jill"]
+    assert mirror.read_schedules("s1", "Monday") == [{"day_of_week": "Monday", "period": 1}]
+    # Link fields copied onto cover documents are stripped
+    assert mirror.read_absences(TODAY) == [
+        {"staff_id": "s2", "date": TODAY, "id": "a1", "covers": [{"period": 2, "covering_staff_id": "s1"}]}
+    ], mirror.read_absences(TODAY)
+
+    # Updates and removals
+    client.push("collection", "staff", [change("MODIFIED", "staff/s1", {"name": "Jill B"}), change("REMOVED", "staff/s2")])
+    client.push("group", "schedules", [change("REMOVED", "staff/s1/schedules/m1")])
+    client.push("group", "covers", [change("REMOVED", "absences/a1/covers/c1")], TODAY)
+    assert mirror.read_staff() == [{"name": "Jill B", "id": "s1"}]
+    assert mirror.read_schedules("s1", "Monday") == []
+    assert mirror.read_absence("a1")["covers"] == []
+
+    # Returned values are copies
+    mirror.read_staff()[0]["name"] = "changed"
+    assert mirror.read_staff()[0]["name"] == "Jill B"
+
+
+def check_rollover(client, mirror):
+    old_absences = client.watches("collection", "absences", TODAY)[0]
+    old_covers = client.watches("group", "covers", TODAY)[0]
+    # 05:00 at school on the 11th, still the 10th in UTC
+    rush = datetime.datetime(2025, 3, 10, 22, 0, tzinfo=datetime.timezone.utc)
+    database_firestore.school_today = lambda now=None: school_today(rush)
+
+    # The first read of the new day swaps the listeners and is not served until they are warm
+    assert mirror.read_absences(TOMORROW) is None
+    assert not old_absences.active and not old_covers.active
+    assert len(client.watches("collection", "absences", TOMORROW)) == 1
+    assert len(client.watches("group", "covers", TOMORROW)) == 1
+    assert mirror.absence_date == TOMORROW
+
+    # A late batch from yesterday's listener neither refills the maps nor warms them
+    old_absences.callback(None, [change("ADDED", "absences/a9", {"staff_id": "s1", "date": TODAY})], None)
+    old_covers.callback(None, [], None)
+    assert mirror.absences == {} and not mirror.is_warm("absences") and not mirror.is_warm("covers")
+
+    client.push("collection", "absences", [change("ADDED", "absences/a2", {"staff_id": "s1", "date": TOMORROW})], TOMORROW)
+    client.push("group", "covers", [], TOMORROW)
+    assert [a["id"] for a in mirror.read_absences(TOMORROW)] == ["a2"]
+    # Other dates still go to Firestore
+    assert mirror.read_absences(TODAY) is None
+
+    # Staff and schedule listeners are untouched by the rollover
+    assert len(client.watches("collection", "staff")) == 1
+    assert mirror.read_staff() == [{"name": "Jill B", "id": "s1"}]
+
+
+def check_stop(client, mirror):
+    mirror.stop()
+    assert client.listeners == [] and mirror.read_staff() is None
+
+
+if __name__ == "__main__":
+    # The checks use the school's zone whatever SCHOOL_TIMEZONE says here
+    database_firestore.SCHOOL_TZ = ZoneInfo("Asia/Bangkok")
+    check_school_today()
+    database_firestore.school_today = lambda now=None: TODAY
+    client = FakeFirestore()
+    mirror = FirestoreMirror(client).start()
+    check_snapshots(client, mirror)
+    check_rollover(client, mirror)
+    check_stop(client, mirror)
+    print("OK: firestore mirror checks passed")
@@ -0,0 +1,40 @@
+import os
+import sys
+
+# Ensure backend folder is in path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from backend.normalize import parse_workbook
+
+EXCEL_FILE = "GV cover and staff absence.xlsx"
+
+
+def check(path=EXCEL_FILE, workers=4):
+    """Parses the workbook serially and on a process pool and compares the records."""
+    if not os.path.exists(path):
+        print(f"{path} not found")
+        return False
+
+    serial = parse_workbook(path, workers=1)
+    parallel = parse_workbook(path, workers=workers)
+
+    if len(serial) != len(parallel):
+        print(f"FAIL: {len(serial)} serial records vs {len(parallel)} parallel records")
+        return False
+
+    ok = True
+    for i, (a, b) in enumerate(zip(serial, parallel)):
+        if a != b:
+            label = a.get("staff_name") or a["kind"]
+            print(f"FAIL: record {i} ({label}) differs")
+            ok = False
+
+    entries = sum(len(r.get("entries", [])) for r in serial)
+    if ok:
+        print(f"OK: {len(serial)} sheets, {entries} entries identical with {workers} workers")
+    return ok
+
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else EXCEL_FILE
+    sys.exit(0 if check(path) else 1)
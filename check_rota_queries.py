@@ -0,0 +1,232 @@
+import os
+import sys
+import datetime
+import tempfile
+
+# Ensure backend folder is in path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+# The backend opens ./rota.db, so work in a scratch directory
+os.chdir(tempfile.mkdtemp(prefix="rota_check_"))
+
+from sqlalchemy import event
+from fastapi.testclient import TestClient
+from backend.database import engine, SessionLocal, Staff, Schedule, Absence, Cover, CoverStat
+from backend.cover_stats import refresh_cover_stats, week_loads
+from backend import main, reporting
+
+DATE = datetime.date(2025, 3, 10)
+STAFF = ["Faye", "Claire", "Gaz", "Jill", "Ben S"]
+
+
+def seed():
+    db = SessionLocal()
+    try:
+        db.add_all([Staff(id=i + 1, name=name, role="Teacher") for i, name in enumerate(STAFF)])
+        db.add_all([
+            Absence(id=1, staff_id=1, date=DATE, start_period=1, end_period=4),
+            Absence(id=2, staff_id=2, date=DATE, start_period=5, end_period=8),
+            Absence(id=3, staff_id=3, date=DATE + datetime.timedelta(days=1), start_period=1, end_period=8),
+        ])
+        db.add_all([
+            Cover(absence_id=1, covering_staff_id=4, period=2),
+            Cover(absence_id=1, covering_staff_id=5, period=1),
+            # Covering staff since deleted
+            Cover(absence_id=1, covering_staff_id=99, period=3),
+            Cover(absence_id=3, covering_staff_id=4, period=6),
+        ])
+        db.flush()
+        refresh_cover_stats(db)
+        db.commit()
+    finally:
+        db.close()
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+        event.listen(engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, *args):
+        self.count += 1
+
+    def get(self, client, url):
+        self.count = 0
+        response = client.get(url)
+        assert response.status_code == 200, (url, response.status_code, response.text)
+        return response.json(), self.count
+
+
+def check_daily_rota(client, counter):
+    rota, queries = counter.get(client, f"/daily-rota?date={DATE}")
+    assert rota == [
+        {"absence_id": 1, "staff_name": "Faye", "start_period": 1, "end_period": 4, "covers": [
+            {"period": 1, "covering_staff_name": "Ben S"},
+            {"period": 2, "covering_staff_name": "Jill"},
+            {"period": 3, "covering_staff_name": "Unknown"},
+        ]},
+        {"absence_id": 2, "staff_name": "Claire", "start_period": 5, "end_period": 8, "covers": []},
+    ], rota
+    assert queries == 1, f"daily rota took {queries} queries"
+
+
+def check_covers(client, counter):
+    covers, queries = counter.get(client, "/covers/1")
+    assert covers == [
+        {"period": 1, "staff_name": "Ben S"},
+        {"period": 2, "staff_name": "Jill"},
+        {"period": 3, "staff_name": None},
+    ], covers
+    assert queries == 1, f"covers took {queries} queries"
+
+
+def check_report(client, counter):
+    summaries = []
+
+    async def fake_report(query, data_summary):
+        summaries.append(data_summary)
+        return "ok"
+    main.ai_assistant.generate_report_async = fake_report
+    report, queries = counter.get(client, "/generate-report?query=who")
+    assert report["report"] == "ok"
+    # Fixed number of aggregate queries, however long the history
+    assert queries == 9, f"report took {queries} queries"
+    stats = report["stats"]
+    assert (stats["start"], stats["end"]) == ("2024-03-12", "2025-03-11"), stats
+    assert stats["totals"]["absences"] == 3 and stats["totals"]["absent_periods"] == 16, stats["totals"]
+    assert stats["totals"]["covers"] == 4, stats["totals"]
+    assert stats["absences_per_staff"][0] == {"name": "Claire", "absences": 1, "periods": 4, "first": "2025-03-10", "last": "2025-03-10"}
+    assert stats["covers_per_staff"] == [
+        {"name": "Jill", "covers": 2, "colleagues": 2},
+        {"name": "Ben S", "covers": 1, "colleagues": 1},
+    ], stats["covers_per_staff"]
+    assert stats["period_heatmap"] == {"Monday": {"1": 1, "2": 1, "3": 1}, "Tuesday": {"6": 1}}, stats["period_heatmap"]
+    assert "Monday | 1 | 1 | 1 | 0" in summaries[0], summaries[0]
+    # Read from cover_stats; the cover by a deleted staff member has no name to report
+    assert stats["recent_cover_load"] == [
+        {"name": "Jill", "covers": 2, "periods": 2, "last_cover": "2025-03-11"},
+        {"name": "Ben S", "covers": 1, "periods": 1, "last_cover": "2025-03-10"},
+    ], stats["recent_cover_load"]
+
+    # An explicit window narrows every figure
+    report, _ = counter.get(client, f"/generate-report?query=who&start={DATE}&end={DATE}")
+    assert report["stats"]["totals"]["absences"] == 2 and report["stats"]["totals"]["covers"] == 3
+
+    # A long staff list is cut to each table's top rows to fit the budget
+    many = dict(stats, absences_per_staff=[{"name": f"Staff {i:03}", "absences": 200 - i, "periods": 3, "first": "2025-01-06", "last": "2025-03-10"} for i in range(200)])
+    full = reporting.format_report(many, budget=10**6)
+    cut = reporting.format_report(many, budget=400)
+    assert len(cut) <= 400 * reporting.CHARS_PER_TOKEN < len(full), (len(cut), len(full))
+    assert "Staff 000 | 200" in cut and "Staff 199" not in cut and "more omitted" in cut
+    assert "Jill | 2 | 2" in cut and "Monday | 1 | 1 | 1 | 0" in cut
+    assert cut == reporting.format_report(many, budget=400)
+    assert reporting.format_report(stats) == summaries[0]
+
+
+def stats_snapshot():
+    db = SessionLocal()
+    try:
+        return sorted(
+            (r.staff_id, str(r.week_start), r.covers, r.periods, str(r.last_cover_date))
+            for r in db.query(CoverStat).all()
+        )
+    finally:
+        db.close()
+
+
+def check_cover_stats(client):
+    """Incremental updates on assign/unassign match a full rebuild."""
+    for method, url in [
+        ("post", "/assign-cover?absence_id=2&staff_name=Gaz&periods=5,6"),
+        ("post", "/assign-cover?absence_id=1&staff_name=Jill&periods=1"),  # takes period 1 from Ben S
+        ("delete", "/unassign-cover?absence_id=1&period=2"),
+        ("post", "/commit-plan"),
+    ]:
+        if url == "/commit-plan":
+            response = client.post(url, json=[{"absence_id": 3, "period": 7, "staff_name": "Faye", "score": 100}])
+        else:
+            response = getattr(client, method)(url)
+        assert response.status_code == 200, (url, response.text)
+        incremental = stats_snapshot()
+        db = SessionLocal()
+        try:
+            refresh_cover_stats(db)
+            db.commit()
+        finally:
+            db.close()
+        assert incremental == stats_snapshot(), (url, incremental, stats_snapshot())
+
+    db = SessionLocal()
+    try:
+        # Jill: period 1 of absence 1 and absence 3 the next day; Faye: the committed plan; Ben S: none left
+        assert week_loads(db, DATE) == {4: 2, 3: 2, 99: 1, 1: 1}, week_loads(db, DATE)
+    finally:
+        db.close()
+
+
+def check_optimize_and_commit(client):
+    """/optimize-day counts today's covers once; /commit-plan rejects inconsistent plans."""
+    db = SessionLocal()
+    try:
+        # Ben S off for the morning, teaching in P2; Gaz (two covers today, none elsewhere this week) is free
+        db.add(Absence(id=4, staff_id=5, date=DATE, start_period=1, end_period=4))
+        db.add_all([
+            Schedule(staff_id=5, day_of_week="Monday", period=2, activity="Year 4 Lesson", is_free=False),
+            Schedule(staff_id=3, day_of_week="Monday", period=2, activity="Free", is_free=True),
+        ])
+        db.commit()
+    finally:
+        db.close()
+
+    response = client.get(f"/optimize-day?date={DATE}")
+    assert response.status_code == 200, response.text
+    plan = response.json()["plan"]
+    assert [(p["absence_id"], p["period"], p["staff_name"]) for p in plan] == [(4, 2, "Gaz")], plan
+    assert plan[0]["breakdown"] == {"free": 100, "load": -30}, plan[0]["breakdown"]
+
+    def cover_rows():
+        db = SessionLocal()
+        try:
+            return sorted((c.absence_id, c.period, c.covering_staff_id) for c in db.query(Cover).all())
+        finally:
+            db.close()
+    before = cover_rows()
+    for body, message in [
+        ([{"absence_id": 42, "period": 1, "staff_name": "Gaz"}], "absences not found: 42"),
+        ([{"absence_id": 1, "period": 6, "staff_name": "Gaz"}], "period 6 is outside absence 1"),
+        ([{"absence_id": 4, "period": 2, "staff_name": "Gaz"}, {"absence_id": 4, "period": 2, "staff_name": "Claire"}],
+         "absence 4 period 2 appears twice"),
+        ([{"absence_id": 1, "period": 2, "staff_name": "Claire"}, {"absence_id": 4, "period": 2, "staff_name": "Claire"}],
+         "Claire is booked twice in period 2"),
+        # Jill already covers absence 1 in period 1
+        ([{"absence_id": 4, "period": 1, "staff_name": "Jill"}], "Jill already covers absence 1 in period 1"),
+        ([{"absence_id": 4, "staff_name": "Jill"}], "Invalid plan entry"),
+        ([{"absence_id": 4, "period": "two", "staff_name": "Jill"}], "Invalid plan entry"),
+        ([{"absence_id": 4, "period": 2, "staff_name": 5}], "Invalid plan entry"),
+        ([{"absence_id": 4, "period": 2, "staff_name": "Ben S"}], "Ben S cannot cover their own absence 4"),
+        # Faye is off for periods 1-4 herself (absence 1)
+        ([{"absence_id": 4, "period": 2, "staff_name": "Faye"}], "Faye is absent in period 2"),
+    ]:
+        response = client.post("/commit-plan", json=body)
+        assert response.status_code == 400 and message in response.json()["detail"], (body, response.text)
+        assert cover_rows() == before
+
+    # Moving Jill off absence 1 in the same plan frees her for absence 4
+    response = client.post("/commit-plan", json=[
+        {"absence_id": 1, "period": 1, "staff_name": "Claire"},
+        {"absence_id": 4, "period": 1, "staff_name": "Jill"},
+    ])
+    assert response.status_code == 200, response.text
+    assert (1, 1, 2) in cover_rows() and (4, 1, 4) in cover_rows(), cover_rows()
+
+
+if __name__ == "__main__":
+    seed()
+    counter = QueryCounter()
+    with TestClient(main.app) as client:
+        check_daily_rota(client, counter)
+        check_covers(client, counter)
+        check_report(client, counter)
+        check_cover_stats(client)
+        check_optimize_and_commit(client)
+    print("OK: rota query checks passed")
@@ -0,0 +1,146 @@
+import os
+import sys
+import datetime
+
+# Ensure backend folder is in path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from backend.sheet_layout import (
+    find_day_columns, find_period_rows, find_duty_day_columns, find_day_pairs,
+    staff_sheet_layout, periods_in,
+)
+
+EXCEL_FILE = "GV cover and staff absence.xlsx"
+
+# Staff tab as seen by inspect_layout.py: name banner, day header on row 2,
+# times in column A and "Period n" labels in column B
+STAFF_GRID = [
+    ("Name: Darryl Room (unless otherwise stated): Primary Music Room", None, None, None, None, None, None),
+    (None, None, "Monday", "Tuesday", "Wednesday", "Thursday", "Friday"),
+    (None, None, None, None, None, None, None),
+    (datetime.time(8, 20), "Tutor", None, None, None, None, None),
+    (datetime.time(8, 40), "Period 1", None, None, None, None, None),
+    (datetime.time(9, 20), "Period 2", "4B", "1CDB", "3EL", 5, "4B"),
+    (datetime.time(10, 0), "Period 3", "2JM", "PRE-NURSERY", "3AS", "1CK", "4KG"),
+    (None, None, None, "(in EY building)", None, None, None),
+    (datetime.time(10, 40), "Break", None, None, None, None, None),
+    (datetime.time(11, 0), "P4", None, None, None, None, None),
+    (datetime.time(11, 40), "P.5", None, None, None, None, None),
+    (datetime.time(12, 20), "period 6", None, None, None, None, None),
+    (datetime.time(13, 0), "Lunch", None, None, None, None, None),
+    (datetime.time(13, 10), "7 (13:10)", None, None, None, None, None),
+    (datetime.time(13, 50), 8, None, None, None, None, None),
+]
+
+# CCA tab as seen by check_cca_layout.py: each day heads a (club, staff) pair
+CCA_GRID = [
+    (None,) * 8,
+    (None,) * 8,
+    (None,) * 8,
+    ("Monday", None, "Tuesday", None, "Wednesday", None, "Thursday", None),
+    ("U11 Basketball Y-5-6", "Gideon + K. Hannah", "U11 Football Y5-6", "Jill + Billy", "Golf Y3-6", "Ben P", "Circuit training Y5-6", "Gaz"),
+]
+
+# Duty rota (TB1/EY): [Area] [Time] [Designation] [Duration] [Mon..Fri]
+DUTY_GRID = [
+    (None,) * 9,
+    ("Area", "Time", "Designation", "Duration", "Monday", "Tuesday", "Wednesday", "Thursday", "Friday"),
+    ("Front Gate", "8.00-8.30", "Before School", "20mins", "Claire (Tuesday, Wednesday) + Faye (Monday, Friday)", None, None, None, None),
+]
+
+
+def check_staff_layout():
+    day_cols, header_row_idx = find_day_columns(STAFF_GRID)
+    assert day_cols == {"Monday": 3, "Tuesday": 4, "Wednesday": 5, "Thursday": 6, "Friday": 7}, day_cols
+    assert header_row_idx == 2, header_row_idx
+
+    period_rows = find_period_rows(STAFF_GRID)
+    assert period_rows == {1: 4, 2: 5, 3: 6, 4: 9, 5: 10, 6: 11, 7: 13, 8: 14}, period_rows
+
+    layout = staff_sheet_layout(STAFF_GRID)
+    assert layout.day_cols == day_cols and layout.period_rows == period_rows
+
+
+def check_labels():
+    assert periods_in("period 1 (8:30)") == [1, 8]
+    assert periods_in("p1") == [1]
+    assert periods_in("p.3") == [3]
+    assert periods_in("12") == []
+    assert periods_in("y5") == []
+    # A label naming two periods goes to the first one not yet taken
+    grid = [("1 (8:30)",), ("1 (8:30)",)]
+    assert find_period_rows(grid) == {1: 0, 8: 1}
+
+
+def check_day_rules():
+    # Partial matches like "Monday 25th" count, long text does not
+    grid = [("Monday 25th", "tuesday", "Wednesday 3rd", "Thursday is a long note")]
+    day_cols, header_row_idx = find_day_columns(grid)
+    assert day_cols == {"Monday": 1, "Tuesday": 2, "Wednesday": 3}, day_cols
+    assert header_row_idx == 1
+    # Fewer than three days: no header row, but the columns are still reported
+    day_cols, header_row_idx = find_day_columns([("Monday", "Tuesday")])
+    assert day_cols == {"Monday": 1, "Tuesday": 2} and header_row_idx is None
+    # target_update_p1 settings: first row with any day, no length limit
+    day_cols, header_row_idx = find_day_columns([(None,), ("Timetable for Monday onwards",)], max_rows=10, max_len=None, min_days=1)
+    assert day_cols == {"Monday": 1} and header_row_idx == 2
+
+
+def check_duty_and_cca():
+    day_cols, header_row_idx = find_duty_day_columns(DUTY_GRID)
+    assert day_cols == {"Monday": 5, "Tuesday": 6, "Wednesday": 7, "Thursday": 8, "Friday": 9}, day_cols
+    assert header_row_idx == 2
+    assert find_duty_day_columns(CCA_GRID[:3]) == ({}, None)
+
+    pairs, header_row_idx = find_day_pairs(CCA_GRID)
+    assert header_row_idx == 4
+    assert pairs == {
+        "Monday": {"act_col": 0, "staff_col": 1},
+        "Tuesday": {"act_col": 2, "staff_col": 3},
+        "Wednesday": {"act_col": 4, "staff_col": 5},
+        "Thursday": {"act_col": 6, "staff_col": 7},
+    }, pairs
+
+
+def check_edits():
+    # Editing a timetable cell inside the grid leaves the layout alone
+    edited = [list(row) for row in STAFF_GRID]
+    edited[5][2] = "Music"        # Monday P2
+    edited[9][4] = "6RG PE"       # Wednesday P4
+    assert staff_sheet_layout([tuple(row) for row in edited]) == staff_sheet_layout(STAFF_GRID)
+    # Callers get their own copy
+    first = staff_sheet_layout(STAFF_GRID)
+    first.day_cols["Saturday"] = 8
+    assert "Saturday" not in staff_sheet_layout(STAFF_GRID).day_cols
+
+
+def check_workbook(path=EXCEL_FILE):
+    """Every staff tab in the real workbook resolves to a full Mon-Fri, P1-P8 layout."""
+    if not os.path.exists(path):
+        print(f"{path} not found, skipping workbook check")
+        return
+    from backend.normalize import read_grid, plan_sheets, STAFF_SHEET_ROWS
+    import openpyxl
+
+    wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        for kind, sheet_name, _ in plan_sheets(wb.sheetnames):
+            if kind != "staff":
+                continue
+            layout = staff_sheet_layout(read_grid(wb[sheet_name], max_row=STAFF_SHEET_ROWS))
+            assert len(layout.day_cols) == 5, (sheet_name, layout.day_cols)
+            assert sorted(layout.period_rows) == list(range(1, 9)), (sheet_name, layout.period_rows)
+        pairs, _ = find_day_pairs(read_grid(wb["CCA"]))
+        assert len(pairs) == 4, pairs
+    finally:
+        wb.close()
+
+
+if __name__ == "__main__":
+    check_staff_layout()
+    check_labels()
+    check_day_rules()
+    check_duty_and_cca()
+    check_edits()
+    check_workbook(sys.argv[1] if len(sys.argv) > 1 else EXCEL_FILE)
+    print("OK: sheet layout checks passed")
@@ -1,6 +1,7 @@
 
 import openpyxl
 import os
+from backend.sheet_layout import find_day_pairs
 
 EXCEL_PATH = r"c:\Users\rob_b\Rota\temp_rota.xlsx"
 
@@ -18,8 +19,12 @@ def inspect_cca():
     print(f"Sheet: CCA")
     
     # Print first 20 rows and 15 columns
-    for r_idx, row in enumerate(sheet.iter_rows(max_row=20, max_col=15, values_only=True)):
+    grid = list(sheet.iter_rows(max_row=20, max_col=15, values_only=True))
+    for r_idx, row in enumerate(grid):
         print(f"Row {r_idx+1}: {row}")
 
+    pairs, header_row_idx = find_day_pairs(grid)
+    print(f"Detected CCA Mapping: {pairs} (Header Row: {header_row_idx})")
+
 if __name__ == "__main__":
     inspect_cca()
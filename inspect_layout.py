@@ -1,5 +1,6 @@
 import openpyxl
 import os
+from backend.sheet_layout import staff_sheet_layout
 
 file_path = r"c:\Users\rob_b\Rota\GV cover and staff absence.xlsx"
 
@@ -14,6 +15,10 @@ def inspect_layout():
             f.write(f"Inspecting Sheet: {sheet_name}\n")
             for r_idx, row in enumerate(sheet.iter_rows(max_row=20, max_col=15, values_only=True)):
                 f.write(f"Row {r_idx}: {row}\n")
+
+            layout = staff_sheet_layout(list(sheet.iter_rows(max_row=60, values_only=True)))
+            f.write(f"Day Columns: {layout.day_cols} (Header Row: {layout.header_row_idx})\n")
+            f.write(f"Period Rows: {layout.period_rows}\n")
         print("Layout debug saved to layout_debug.txt")
     except Exception as e:
         print(f"Error: {e}")
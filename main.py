@@ -19,6 +19,13 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.on_event("startup")
+def start_firestore_mirror():
+    # Optional: keep staff/schedules/today's rota mirrored via Firestore listeners
+    from backend.database_firestore import MIRROR_ENABLED, start_mirror
+    if MIRROR_ENABLED:
+        start_mirror()
+
 # 1. MIDDLEWARE FOR LOGGING
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
@@ -80,6 +87,11 @@ def get_staff():
         print(f"API ERROR: {str(e)}")
         return JSONResponse(status_code=500, content={"error": str(e)})
 
+@app.get("/api/cache-stats")
+def cache_stats():
+    from backend.database_firestore import FirestoreDB
+    return FirestoreDB.cache_stats()
+
 @app.get("/api/ping")
 def ping():
     return {"msg": "pong", "timestamp": str(os.urandom(4).hex())}
@@ -115,36 +127,37 @@ def log_absence(staff_name: str, date: str, start_period: int, end_period: int):
 
 # 5. COVER SYSTEM
 @app.get("/api/suggest-cover/{absence_id}")
-async def suggest_cover(absence_id: str, day: str = "Monday"):
+async def suggest_cover(absence_id: str, day: str = "Monday", explain: bool = False, allow_teaching: bool = False):
     try:
         from backend.database_firestore import FirestoreDB
-        from backend.ai_agent import RotaAI
-        absences = FirestoreDB.get_absences()
-        absence = next((a for a in absences if a["id"] == absence_id), None)
+        from backend import cover_solver
+        absence = FirestoreDB.get_absence(absence_id)
         if not absence: raise HTTPException(status_code=404, detail="Absence not found")
         
         all_staff = FirestoreDB.get_staff()
+        all_schedules = FirestoreDB.get_all_schedules(day=day)
         absent_staff_id = absence["staff_id"]
         
         available_profiles = []
         for s in all_staff:
             if s["id"] == absent_staff_id: continue
-            s_schedules = FirestoreDB.get_schedules(s["id"], day=day)
+            s_schedules = all_schedules.get(s["id"], [])
             available_profiles.append({
                 "name": s["name"], "role": s.get("role", "Teacher"),
+                "can_cover_periods": s.get("can_cover_periods", True),
                 "is_priority": s.get("is_priority", False),
                 "is_specialist": s.get("is_specialist", False),
                 "free_periods": [sch["period"] for sch in s_schedules if sch.get("is_free", False)],
                 "busy_periods": {sch["period"]: sch.get("activity", "Class") for sch in s_schedules if not sch.get("is_free", False)}
             })
 
-        ai = RotaAI()
-        ai_response = ai.suggest_cover(
-            absent_staff=absence["staff_name"], day=day,
-            periods=[absence["start_period"]],
-            available_staff_profiles=available_profiles
-        )
-        return {"suggestions": ai_response}
+        plan = cover_solver.suggest_cover([absence["start_period"]], available_profiles, allow_teaching=allow_teaching)
+        if explain:
+            from backend.ai_agent import RotaAI
+            suggestions = RotaAI().explain_cover(absence["staff_name"], day, plan)
+        else:
+            suggestions = cover_solver.format_plan(absence["staff_name"], day, plan)
+        return {"suggestions": suggestions, "plan": plan}
     except Exception as e:
         return JSONResponse(status_code=500, content={"error": str(e)})
 
@@ -191,11 +204,12 @@ def generate_report(query: str):
 def check_availability(periods: str, day: str = "Monday", date: str = None):
     from backend.database_firestore import FirestoreDB
     all_staff = FirestoreDB.get_staff()
+    all_schedules = FirestoreDB.get_all_schedules(day=day)
     plist = [int(p) for p in periods.split(',') if p]
     available = []
     for s in all_staff:
         if not s.get("is_active", True): continue
-        sches = FirestoreDB.get_schedules(s["id"], day=day)
+        sches = all_schedules.get(s["id"], [])
         free_p = [sch["period"] for sch in sches if sch.get("is_free", False)]
         if all(p in free_p for p in plist):
             available.append({"name": s["name"], "is_free": True})
@@ -0,0 +1,30 @@
+"""
+Backfills the link fields (absence_id, date, absent_staff_id) on cover
+documents so date-filtered reads find them with one collection-group query.
+
+Run this, and deploy the covers index (firebase deploy --only
+firestore:indexes), BEFORE deploying the code that reads covers that way.
+Until both are done, covers without link fields are missing from
+/api/daily-rota, and a missing index makes every read fall back to one
+covers query per absence.
+"""
+
+import os
+import sys
+
+# Ensure backend folder is in path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from backend.database_firestore import get_db, FirestoreDB
+
+def migrate():
+    """Adds absence_id/date/absent_staff_id to existing cover documents."""
+    if not get_db():
+        print("ERROR: Could not connect to Firestore!")
+        return
+    print("Backfilling cover link fields...")
+    updated = FirestoreDB.backfill_cover_links()
+    print(f"Done. Updated {updated} cover documents.")
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,24 @@
+import os
+import sys
+
+# Ensure backend folder is in path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from backend.database import engine, migrate_indexes, SQLITE_PRAGMAS
+
+def migrate():
+    try:
+        created = migrate_indexes(engine)
+        if created:
+            print(f"Created indexes: {', '.join(created)}")
+        else:
+            print("Indexes already exist.")
+
+        with engine.connect() as conn:
+            mode = conn.exec_driver_sql("PRAGMA journal_mode").scalar()
+        print(f"Journal mode: {mode} (configured: {SQLITE_PRAGMAS['journal_mode']})")
+    except Exception as e:
+        print(f"Migration error: {e}")
+
+if __name__ == "__main__":
+    migrate()
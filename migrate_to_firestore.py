@@ -70,7 +70,10 @@ def migrate():
                 "covering_staff_name": c.covering_staff.name,
                 "period": c.period,
                 "status": c.status,
-                "reason_for_selection": c.reason_for_selection
+                "reason_for_selection": c.reason_for_selection,
+                "absence_id": absence_id,
+                "date": a.date.isoformat(),
+                "absent_staff_id": str(a.staff_id)
             })
 
     print("Migration complete!")
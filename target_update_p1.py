@@ -1,6 +1,7 @@
 import os
-import re
 import openpyxl
+from backend.sheet_layout import find_day_columns, find_period_rows
+from backend.staff_names import StaffNameResolver, SHEET_MATCH_RULES
 import firebase_admin
 from firebase_admin import credentials, firestore
 
@@ -18,17 +19,7 @@ SPECIALISTS = [
 # Specialist subjects that make a FORM teacher free
 FREE_SUBJECTS = ['thai', 'music', 'pe', 'p.e.', 'phse']
 
-def clean_name(name):
-    if not name: return ""
-    n = str(name).strip()
-    # Remove title prefixes
-    n = re.sub(r'^(mr|mrs|ms|miss|k\.|kun\s|k\s)\s*', '', n, flags=re.IGNORECASE).strip()
-    # Remove brackets
-    n = n.split('(')[0].strip()
-    # Mappings
-    nl = n.lower()
-    if "jinny" in nl or "ginny" in nl: return "Jinny"
-    return n
+clean_name = StaffNameResolver(**SHEET_MATCH_RULES).clean
 
 def init_firestore():
     if not os.path.exists(CREDS_PATH):
@@ -82,35 +73,19 @@ def target_update_p1():
         print(f"Processing P1 for: {original_name} (Sheet: {target_sheet})")
         sheet = wb[target_sheet]
         
+        grid = list(sheet.iter_rows(max_row=60, values_only=True))
+
         # 1. Find columns
-        day_cols = {}
-        header_found = False
-        for row in sheet.iter_rows(max_row=10, values_only=True):
-            for i, cell in enumerate(row):
-                if cell:
-                    c_val = str(cell).strip().lower()
-                    for d in DAYS_LIST:
-                        if d.lower() in c_val:
-                            day_cols[d] = i
-                            header_found = True
-            if header_found: break
+        header, _ = find_day_columns(grid, max_rows=10, max_len=None, min_days=1)
+        day_cols = {d: col - 1 for d, col in header.items()}
         
         if not day_cols:
             # Fallback to standard Mon-Fri columns if header not detected
             day_cols = {d: i+1 for i, d in enumerate(DAYS_LIST)}
 
         # 2. Find P1 row
-        p1_row_data = None
-        for row in sheet.iter_rows(max_row=60, values_only=True):
-            # Check first 5 cols for P1 markers
-            for cell in row[:5]:
-                if cell:
-                    c_val = str(cell).strip().lower()
-                    # Regex for "Period 1" or standalone "1"
-                    if re.search(r'(^|\b)(period\s*|p\.?\s*|)1(\b|$)', c_val):
-                        p1_row_data = row
-                        break
-            if p1_row_data: break
+        p1_idx = find_period_rows(grid).get(1)
+        p1_row_data = grid[p1_idx] if p1_idx is not None else None
         
         if p1_row_data:
             batch = db.batch()
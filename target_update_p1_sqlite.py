@@ -1,6 +1,7 @@
 import os
-import re
 import openpyxl
+from backend.sheet_layout import find_day_columns, find_period_rows
+from backend.staff_names import StaffNameResolver, SHEET_MATCH_RULES
 import sqlite3
 
 # Configuration
@@ -15,14 +16,7 @@ SPECIALISTS = [
 ]
 FREE_SUBJECTS = ['thai', 'music', 'pe', 'p.e.', 'phse']
 
-def clean_name(name):
-    if not name: return ""
-    n = str(name).strip()
-    n = re.sub(r'^(mr|mrs|ms|miss|k\.|kun\s|k\s)\s*', '', n, flags=re.IGNORECASE).strip()
-    n = n.split('(')[0].strip()
-    nl = n.lower()
-    if "jinny" in nl or "ginny" in nl: return "Jinny"
-    return n
+clean_name = StaffNameResolver(**SHEET_MATCH_RULES).clean
 
 def target_update_p1_sqlite():
     if not os.path.exists(DB_PATH):
@@ -64,30 +58,16 @@ def target_update_p1_sqlite():
         print(f"Updating P1 for: {original_name}...")
         sheet = wb[target_sheet]
         
-        day_cols = {}
-        header_found = False
-        for row in sheet.iter_rows(max_row=10, values_only=True):
-            for i, cell in enumerate(row):
-                if cell:
-                    c_val = str(cell).strip().lower()
-                    for d in DAYS_LIST:
-                        if d.lower() in c_val:
-                            day_cols[d] = i
-                            header_found = True
-            if header_found: break
+        grid = list(sheet.iter_rows(max_row=60, values_only=True))
+
+        header, _ = find_day_columns(grid, max_rows=10, max_len=None, min_days=1)
+        day_cols = {d: col - 1 for d, col in header.items()}
         
         if not day_cols:
             day_cols = {d: i+4 for i, d in enumerate(DAYS_LIST)}
 
-        p1_row_data = None
-        for row in sheet.iter_rows(max_row=60, values_only=True):
-            for cell in row[:5]:
-                if cell:
-                    c_val = str(cell).strip().lower()
-                    if re.search(r'(^|\b)(period\s*|p\.?\s*|)1(\b|$)', c_val):
-                        p1_row_data = row
-                        break
-            if p1_row_data: break
+        p1_idx = find_period_rows(grid).get(1)
+        p1_row_data = grid[p1_idx] if p1_idx is not None else None
         
         if p1_row_data:
             for day, col_idx in day_cols.items():